@@ -0,0 +1,487 @@
+"""Lokalna atrapa REST API i bramki Discorda, na którą można skierować discord.py
+(DISCORD_API_BASE=http://127.0.0.1:<port>/api/v10).
+
+Obsługuje tylko to, czego używa bot: logowanie, bramkę (HELLO/IDENTIFY/READY,
+GUILD_CREATE, heartbeat, INTERACTION_CREATE, REQUEST_GUILD_MEMBERS - cały serwer
+w porcjach po 1000 albo wybrane `user_ids`), odpowiedzi na interakcje, followupy
+oraz tworzenie/edycję/pobieranie wiadomości. Trasy mają kubełki limitów
+(nagłówki X-RateLimit-*) i zwracają 429 jak Discord - z nagłówkiem `Via` i JSON-em
+z `retry_after`, więc discord.py ponawia zapytania tak samo jak na produkcji.
+Odpowiedź na interakcję później niż po 3 s kończy się błędem 10062.
+"""
+import asyncio
+import itertools
+import json
+import math
+import re
+import time
+from datetime import datetime, timezone
+
+from aiohttp import WSMsgType, web
+
+API_PREFIX = "/api/v10"
+ACK_DEADLINE_SECONDS = 3.0
+GLOBAL_LIMIT = (50, 1.0)
+# Serwer powyżej progu jest "duży": GUILD_CREATE niesie tylko bota, resztę trzeba pobrać (op 8).
+LARGE_THRESHOLD = 250
+MEMBER_CHUNK_SIZE = 1000
+
+# (metoda, wzorzec ścieżki, nazwa kubełka, limit, okno w sekundach); nazwa None = bez limitu.
+# Pierwsza grupa wzorca to parametr główny (kanał / token webhooka), jak w Discordzie.
+ROUTES = (
+    ("GET", r"/gateway/bot$", None, 0, 0),
+    ("GET", r"/users/@me$", None, 0, 0),
+    ("GET", r"/oauth2/applications/@me$", None, 0, 0),
+    ("PUT", r"/applications/(\d+)/commands$", "commands", 2, 60.0),
+    ("POST", r"/interactions/(\d+)/[^/]+/callback$", None, 0, 0),
+    ("POST", r"/webhooks/\d+/([^/]+)$", "followup", 5, 2.0),
+    ("PATCH", r"/webhooks/\d+/([^/]+)/messages/[^/]+$", "followup_edit", 5, 2.0),
+    ("GET", r"/webhooks/\d+/([^/]+)/messages/[^/]+$", "followup_get", 5, 2.0),
+    ("DELETE", r"/webhooks/\d+/([^/]+)/messages/[^/]+$", "followup_delete", 5, 2.0),
+    ("POST", r"/channels/(\d+)/messages$", "create_message", 5, 5.0),
+    ("PATCH", r"/channels/(\d+)/messages/\d+$", "edit_message", 5, 5.0),
+    ("GET", r"/channels/(\d+)/messages/\d+$", "get_message", 50, 1.0),
+    ("DELETE", r"/channels/(\d+)/messages/\d+$", "delete_message", 5, 1.0),
+)
+INTERACTION_ROUTES = ("/interactions/", "/webhooks/")
+
+_ids = itertools.count(int(time.time() * 1000 - 1420070400000) << 22)
+
+def snowflake() -> str:
+    return str(next(_ids))
+
+def iso_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def json_response(data, status: int = 200, headers: dict = None) -> web.Response:
+    """discord.py parsuje JSON tylko przy `Content-Type: application/json` bez charsetu."""
+    return web.Response(body=json.dumps(data).encode(), status=status, headers={**(headers or {}), "Content-Type": "application/json"})
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class Bucket:
+    """Okno stałe: `limit` zapytań na `per` sekund od pierwszego zapytania w oknie."""
+
+    __slots__ = ("name", "limit", "per", "remaining", "reset_at")
+
+    def __init__(self, name: str, limit: int, per: float):
+        self.name = name
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def take(self, now: float):
+        """Zwraca None, gdy zapytanie mieści się w limicie, inaczej czas do resetu."""
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining <= 0:
+            return self.reset_at - now
+        self.remaining -= 1
+        return None
+
+    def headers(self, now: float) -> dict:
+        reset_after = max(0.0, self.reset_at - now)
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": self.name,
+        }
+
+
+class FakeDiscord:
+    """Serwer atrapy. `guilds` to słowniki z `id`, `name`, `channels`
+    ({id: typ kanału}), `roles` (lista id) i `members` ({id: {"name", "display_name", "roles"}})."""
+
+    def __init__(self, guilds=(), messages=None, latency: float = 0.0):
+        self.guilds = list(guilds)
+        self.messages = dict(messages or {})
+        self.latency = latency
+        self.application_id = snowflake()
+        self.bot_user = {
+            "id": self.application_id, "username": "ReplayBot", "discriminator": "0000",
+            "global_name": None, "avatar": None, "bot": True, "flags": 0,
+        }
+        self.base_url = None
+        self.gateway_url = None
+        self.sessions = set()
+        self.ready = asyncio.Event()
+        self._buckets = {}
+        self._global = Bucket("global", *GLOBAL_LIMIT)
+        self._routes = [(method, re.compile(pattern), name, limit, per) for method, pattern, name, limit, per in ROUTES]
+        self._interactions = {}
+        self._pending_edits = {}
+        self.requests = {}
+        self.rate_limited = {}
+        self.ack_latency = {}
+        self.edit_latency = {}
+        self.expired = {}
+        self.dispatched = 0
+        self.acked = 0
+        self.member_requests = 0
+        self._runner = None
+        self.app = web.Application(middlewares=[self._rest_middleware])
+        self.app.router.add_get("/gateway", self.gateway)
+        self.app.router.add_route("*", API_PREFIX + "/{path:.*}", self.rest)
+
+    # --- uruchomienie ---
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        self.gateway_url = f"ws://{host}:{port}/gateway"
+        return self.base_url + API_PREFIX
+
+    async def stop(self):
+        for ws in list(self.sessions):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # --- bramka ---
+    async def gateway(self, request: web.Request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        ws.seq = 0
+        await ws.send_str(json.dumps({"op": 10, "d": {"heartbeat_interval": 41250}, "s": None, "t": None}))
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(msg.data)
+            op = payload.get("op")
+            if op == 1:
+                await ws.send_str(json.dumps({"op": 11, "d": None, "s": None, "t": None}))
+            elif op in (2, 6):
+                self.sessions.add(ws)
+                await self._identify(ws, payload["d"])
+            elif op == 8:
+                await self._send_members_chunk(ws, payload["d"])
+        self.sessions.discard(ws)
+        return ws
+
+    async def _send(self, ws, event: str, data: dict):
+        ws.seq += 1
+        await ws.send_str(json.dumps({"op": 0, "t": event, "s": ws.seq, "d": data}))
+
+    async def _identify(self, ws, data: dict):
+        shard = data.get("shard") or [0, 1]
+        guilds = [g for g in self.guilds if (int(g["id"]) >> 22) % shard[1] == shard[0]]
+        await self._send(ws, "READY", {
+            "v": 10,
+            "user": self.bot_user,
+            "guilds": [{"id": g["id"], "unavailable": True} for g in guilds],
+            "session_id": snowflake(),
+            "resume_gateway_url": self.gateway_url,
+            "application": {"id": self.application_id, "flags": 0},
+            "shard": shard,
+        })
+        for guild in guilds:
+            await self._send(ws, "GUILD_CREATE", self.guild_payload(guild))
+        self.ready.set()
+
+    async def _send_members_chunk(self, ws, data: dict):
+        guild = next((g for g in self.guilds if g["id"] == str(data["guild_id"])), None)
+        if guild is None:
+            return
+        self.member_requests += 1
+        not_found = []
+        if data.get("user_ids"):
+            wanted = [str(uid) for uid in data["user_ids"]]
+            user_ids = [uid for uid in wanted if uid in guild["members"]]
+            not_found = [uid for uid in wanted if uid not in guild["members"]]
+        else:
+            user_ids = list(guild["members"])
+        chunks = [user_ids[i:i + MEMBER_CHUNK_SIZE] for i in range(0, len(user_ids), MEMBER_CHUNK_SIZE)] or [[]]
+        for index, chunk in enumerate(chunks):
+            payload = {
+                "guild_id": guild["id"],
+                "members": [self.member_payload(guild, uid) for uid in chunk],
+                "chunk_index": index, "chunk_count": len(chunks), "nonce": data.get("nonce"),
+            }
+            if not_found and index == 0:
+                payload["not_found"] = not_found
+            await self._send(ws, "GUILD_MEMBERS_CHUNK", payload)
+
+    async def dispatch(self, event: str, data: dict):
+        for ws in list(self.sessions):
+            if not ws.closed:
+                await self._send(ws, event, data)
+
+    # --- ładunki ---
+    def member_payload(self, guild: dict, user_id: str) -> dict:
+        info = guild["members"][user_id]
+        return {
+            "user": {"id": user_id, "username": info["name"], "discriminator": "0", "global_name": info.get("display_name"), "avatar": None},
+            "nick": None, "roles": list(info.get("roles", ())), "joined_at": "2024-01-01T00:00:00+00:00",
+            "deaf": False, "mute": False, "flags": 0, "pending": False,
+        }
+
+    def guild_payload(self, guild: dict) -> dict:
+        roles = [{
+            "id": role_id, "name": "@everyone" if role_id == guild["id"] else f"rola-{role_id[-4:]}",
+            "color": 0, "hoist": False, "position": 0 if role_id == guild["id"] else 1,
+            "permissions": "0", "managed": False, "mentionable": True, "flags": 0,
+        } for role_id in [guild["id"], *guild["roles"]]]
+        channels = [{
+            "id": channel_id, "type": channel_type, "guild_id": guild["id"], "name": f"kanal-{channel_id[-4:]}",
+            "position": position, "permission_overwrites": [], "parent_id": None, "nsfw": False,
+            "bitrate": 64000, "user_limit": 0, "rtc_region": None, "topic": None, "rate_limit_per_user": 0,
+        } for position, (channel_id, channel_type) in enumerate(guild["channels"].items())]
+        large = len(guild["members"]) > LARGE_THRESHOLD
+        members = [] if large else [self.member_payload(guild, uid) for uid in guild["members"]]
+        members.append({"user": self.bot_user, "nick": None, "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0})
+        return {
+            "id": guild["id"], "name": guild.get("name", "Replay"), "owner_id": self.application_id,
+            "icon": None, "splash": None, "discovery_splash": None, "banner": None, "description": None,
+            "features": [], "emojis": [], "stickers": [], "roles": roles, "channels": channels, "threads": [],
+            "members": members, "member_count": len(guild["members"]) + 1, "large": large, "presences": [], "voice_states": [],
+            "stage_instances": [], "guild_scheduled_events": [], "soundboard_sounds": [],
+            "verification_level": 0, "default_message_notifications": 0, "explicit_content_filter": 0,
+            "mfa_level": 0, "nsfw_level": 0, "premium_tier": 0, "premium_subscription_count": 0,
+            "preferred_locale": "pl", "afk_timeout": 300, "afk_channel_id": None, "system_channel_id": None,
+            "system_channel_flags": 0, "rules_channel_id": None, "public_updates_channel_id": None,
+            "vanity_url_code": None, "application_id": None, "joined_at": "2024-01-01T00:00:00+00:00",
+            "unavailable": False,
+        }
+
+    def message_payload(self, message_id: str, channel_id: str, body: dict = None, **extra) -> dict:
+        body = body or {}
+        message = {
+            "id": message_id, "channel_id": channel_id, "author": self.bot_user, "type": 0,
+            "content": body.get("content") or "", "embeds": body.get("embeds") or [],
+            "components": body.get("components") or [], "attachments": [], "mentions": [],
+            "mention_roles": [], "mention_everyone": False, "pinned": False, "tts": False,
+            "timestamp": iso_now(), "edited_timestamp": None, "flags": body.get("flags") or 0,
+        }
+        message.update(extra)
+        return message
+
+    def interaction_payload(self, entry: dict) -> dict:
+        """INTERACTION_CREATE z nagranej linii JSONL (nowe id i token przy każdym odtworzeniu)."""
+        interaction_id = snowflake()
+        guild = next(g for g in self.guilds if g["id"] == entry["guild_id"])
+        payload = {
+            "id": interaction_id, "application_id": self.application_id, "type": entry["type"],
+            "token": f"replay-{interaction_id}", "version": 1, "data": entry["data"],
+            "guild_id": entry["guild_id"], "channel_id": entry["channel_id"],
+            "channel": {"id": entry["channel_id"], "type": 0, "guild_id": entry["guild_id"], "name": f"kanal-{entry['channel_id'][-4:]}"},
+            "member": dict(self.member_payload(guild, entry["user_id"]), permissions="0"),
+            "locale": "pl", "guild_locale": "pl", "app_permissions": "0", "entitlements": [], "attachment_size_limit": 10485760,
+            "authorizing_integration_owners": {"0": entry["guild_id"]}, "context": 0,
+        }
+        message_id = entry.get("message_id")
+        if message_id:
+            payload["message"] = self.messages.get(message_id) or self.message_payload(message_id, entry["channel_id"])
+        return payload
+
+    async def send_interaction(self, entry: dict) -> str:
+        payload = self.interaction_payload(entry)
+        now = time.perf_counter()
+        message_id = payload["message"]["id"] if payload.get("message") else None
+        self._interactions[payload["id"]] = {"name": entry["name"] or "?", "at": now, "acked": False, "message_id": message_id}
+        if message_id:
+            self._pending_edits.setdefault(message_id, []).append((entry["name"] or "?", now))
+        self.dispatched += 1
+        await self.dispatch("INTERACTION_CREATE", payload)
+        return payload["id"]
+
+    def pending_acks(self) -> int:
+        deadline = time.perf_counter() - ACK_DEADLINE_SECONDS
+        return sum(1 for i in self._interactions.values() if not i["acked"] and i["at"] > deadline)
+
+    # --- REST ---
+    @web.middleware
+    async def _rest_middleware(self, request: web.Request, handler):
+        if not request.path.startswith(API_PREFIX):
+            return await handler(request)
+        path = request.path[len(API_PREFIX):]
+        route = next(((name, limit, per, m) for method, pattern, name, limit, per in self._routes
+                      if method == request.method and (m := pattern.search(path))), None)
+        label = route[0] if route and route[0] else path.split("/")[1] if "/" in path else path
+        self.requests[label] = self.requests.get(label, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        now = time.monotonic()
+        if not path.startswith(INTERACTION_ROUTES):
+            retry_after = self._global.take(now)
+            if retry_after is not None:
+                return self._too_many(label, retry_after, is_global=True)
+        bucket = None
+        if route and route[0]:
+            name, limit, per, match = route
+            key = (name, match.group(1))
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = Bucket(name, limit, per)
+            retry_after = bucket.take(now)
+            if retry_after is not None:
+                return self._too_many(label, retry_after, bucket=bucket, now=now)
+
+        response = await handler(request)
+        if bucket is not None:
+            response.headers.update(bucket.headers(now))
+        return response
+
+    def _too_many(self, label: str, retry_after: float, is_global: bool = False, bucket: Bucket = None, now: float = 0.0):
+        key = "global" if is_global else label
+        self.rate_limited[key] = self.rate_limited.get(key, 0) + 1
+        headers = {"Via": "1.1 google", "Retry-After": str(math.ceil(retry_after)), "X-RateLimit-Scope": "global" if is_global else "user"}
+        if is_global:
+            headers["X-RateLimit-Global"] = "true"
+        elif bucket is not None:
+            headers.update(bucket.headers(now))
+        body = {"message": "You are being rate limited.", "retry_after": round(retry_after, 3), "global": is_global, "code": 0}
+        return json_response(body, status=429, headers=headers)
+
+    @staticmethod
+    def _error(status: int, code: int, message: str):
+        return json_response({"message": message, "code": code}, status=status)
+
+    async def _body(self, request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        if request.content_type.startswith("multipart/"):
+            form = await request.post()
+            return json.loads(form.get("payload_json") or "{}")
+        return {}
+
+    async def rest(self, request: web.Request):
+        path = "/" + request.match_info["path"]
+        method = request.method
+        if method == "GET" and path == "/gateway/bot":
+            return json_response({"url": self.gateway_url, "shards": 1, "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1}})
+        if method == "GET" and path == "/users/@me":
+            return json_response(self.bot_user)
+        if method == "GET" and path == "/oauth2/applications/@me":
+            return json_response({
+                "id": self.application_id, "name": "ReplayBot", "description": "", "icon": None,
+                "bot_public": False, "bot_require_code_grant": False, "verify_key": "0" * 64,
+                "owner": self.bot_user, "flags": 0,
+            })
+
+        parts = path.strip("/").split("/")
+        if method == "PUT" and parts[0] == "applications" and parts[-1] == "commands":
+            commands = await self._body(request)
+            return json_response([dict(cmd, id=snowflake(), application_id=self.application_id, version=snowflake()) for cmd in commands])
+        if parts[0] == "interactions" and len(parts) == 4:
+            return await self._interaction_callback(request, parts[1])
+        if parts[0] == "webhooks" and len(parts) >= 3:
+            return await self._webhook(request, parts)
+        if parts[0] == "channels" and len(parts) >= 3 and parts[2] == "messages":
+            return await self._channel_message(request, parts)
+        return self._error(404, 0, f"404: Not Found ({method} {path})")
+
+    async def _interaction_callback(self, request: web.Request, interaction_id: str):
+        body = await self._body(request)
+        state = self._interactions.get(interaction_id)
+        if state is None:
+            return self._error(404, 10062, "Unknown interaction")
+        if state["acked"]:
+            return self._error(400, 40060, "Interaction has already been acknowledged.")
+        elapsed = time.perf_counter() - state["at"]
+        if elapsed > ACK_DEADLINE_SECONDS:
+            self.expired[state["name"]] = self.expired.get(state["name"], 0) + 1
+            return self._error(404, 10062, "Unknown interaction")
+        state["acked"] = True
+        self.acked += 1
+        self.ack_latency.setdefault(state["name"], []).append(elapsed)
+
+        response_type = body.get("type")
+        data = body.get("data") or {}
+        result = {"interaction": {"id": interaction_id, "type": 3, "response_message_loading": response_type == 5,
+                                  "response_message_ephemeral": bool(data.get("flags", 0) & 64)},
+                  "resource": {"type": response_type}}
+        if response_type in (4, 5):
+            message_id = snowflake()
+            state["original"] = message_id
+            result["interaction"]["response_message_id"] = message_id
+            result["resource"]["message"] = self.message_payload(message_id, "0", data)
+        elif response_type == 7 and state["message_id"]:
+            self._note_edit(state["message_id"])
+        return json_response(result)
+
+    def _note_edit(self, message_id: str):
+        """Mierzy czas od interakcji do pierwszej edycji wiadomości, której dotyczyła."""
+        now = time.perf_counter()
+        for name, at in self._pending_edits.pop(message_id, ()):
+            self.edit_latency.setdefault(name, []).append(now - at)
+
+    async def _webhook(self, request: web.Request, parts):
+        token = parts[2]
+        interaction_id = token.removeprefix("replay-")
+        state = self._interactions.get(interaction_id, {})
+        if request.method == "DELETE":
+            return web.Response(status=204)
+        if request.method == "POST":
+            body = await self._body(request)
+            return json_response(self.message_payload(snowflake(), "0", body, webhook_id=self.application_id))
+        message_id = parts[4] if len(parts) > 4 else "@original"
+        if message_id == "@original":
+            message_id = state.get("original") or snowflake()
+        body = await self._body(request) if request.method == "PATCH" else {}
+        return json_response(self.message_payload(message_id, "0", body, webhook_id=self.application_id))
+
+    async def _channel_message(self, request: web.Request, parts):
+        channel_id = parts[1]
+        if request.method == "POST" and len(parts) == 3:
+            body = await self._body(request)
+            message = self.message_payload(snowflake(), channel_id, body)
+            self.messages[message["id"]] = message
+            return json_response(message)
+        if len(parts) != 4:
+            return self._error(404, 0, "404: Not Found")
+        message_id = parts[3]
+        if request.method == "DELETE":
+            self.messages.pop(message_id, None)
+            return web.Response(status=204)
+        if request.method == "GET":
+            message = self.messages.get(message_id)
+            if message is None:
+                return self._error(404, 10008, "Unknown Message")
+            return json_response(message)
+        body = await self._body(request)
+        message = self.messages.get(message_id) or self.message_payload(message_id, channel_id)
+        for key in ("content", "embeds", "components"):
+            if key in body:
+                message[key] = body[key]
+        message["edited_timestamp"] = iso_now()
+        self.messages[message_id] = message
+        self._note_edit(message_id)
+        return json_response(message)
+
+    # --- raport ---
+    def report(self) -> dict:
+        names = sorted(set(self.ack_latency) | set(self.expired) | set(self.edit_latency))
+        per_name = {}
+        for name in names:
+            acks = self.ack_latency.get(name, [])
+            edits = self.edit_latency.get(name, [])
+            per_name[name] = {
+                "acked": len(acks),
+                "expired": self.expired.get(name, 0),
+                "ack_p50_ms": round(percentile(acks, 0.50) * 1000, 1),
+                "ack_p99_ms": round(percentile(acks, 0.99) * 1000, 1),
+                "ack_max_ms": round(max(acks, default=0) * 1000, 1),
+                "edit_p50_ms": round(percentile(edits, 0.50) * 1000, 1),
+                "edit_p99_ms": round(percentile(edits, 0.99) * 1000, 1),
+            }
+        return {
+            "dispatched": self.dispatched,
+            "acked": self.acked,
+            "interactions": per_name,
+            "requests": dict(sorted(self.requests.items())),
+            "rate_limited": dict(sorted(self.rate_limited.items())),
+            "member_requests": self.member_requests,
+        }
@@ -0,0 +1,173 @@
+"""Lekkie atrapy obiektów discord.py dla benchmarków (bez sieci i bez bramki)."""
+import asyncio
+import itertools
+
+import discord
+
+_ids = itertools.count(10**17)
+
+def snowflake() -> int:
+    return next(_ids)
+
+
+class FakeMember:
+    __slots__ = ("id", "name", "display_name", "mention", "roles", "guild")
+
+    def __init__(self, member_id: int, display_name: str, roles=(), guild=None):
+        self.id = member_id
+        self.guild = guild
+        self.name = display_name.lower()
+        self.display_name = display_name
+        self.mention = f"<@{member_id}>"
+        self.roles = list(roles)
+
+    @property
+    def top_role(self):
+        return max(self.roles, key=lambda role: role.position, default=None)
+
+
+class FakeRole:
+    def __init__(self, role_id: int, name: str = "rola", position: int = 1):
+        self.id = role_id
+        self.name = name
+        self.position = position
+        self.mention = f"<@&{role_id}>"
+        self.members = []
+
+    def is_default(self) -> bool:
+        return False
+
+
+class FakeChannel:
+    def __init__(self, guild, channel_id: int = None, name: str = "kanal"):
+        self.id = channel_id or snowflake()
+        self.guild = guild
+        self.name = name
+        self.mention = f"<#{self.id}>"
+
+
+class FakeGuild:
+    def __init__(self, member_count: int, name_length: int = 24):
+        self.id = snowflake()
+        self.members = {}
+        self.get_member_calls = 0
+        for i in range(member_count):
+            member = FakeMember(snowflake(), f"Gracz_{i:05d}".ljust(name_length, "x"), guild=self)
+            self.members[member.id] = member
+        self.channel = FakeChannel(self)
+        self.voice = FakeChannel(self, name="glosowy")
+
+    def get_member(self, member_id: int):
+        self.get_member_calls += 1
+        return self.members.get(member_id)
+
+    def get_channel(self, channel_id: int):
+        for channel in (self.channel, self.voice):
+            if channel.id == channel_id:
+                return channel
+        return None
+
+
+class FakeMessage:
+    """Wiadomość, która zlicza edycje i symuluje czas zapytania REST."""
+
+    def __init__(self, guild: FakeGuild, rest_latency: float = 0.0):
+        self.id = snowflake()
+        self.guild = guild
+        self.channel = guild.channel
+        self.embeds = []
+        self.edits = 0
+        self.rest_latency = rest_latency
+
+    async def edit(self, **kwargs):
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        self.edits += 1
+        if "embed" in kwargs:
+            self.embeds = [kwargs["embed"]]
+        return self
+
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+
+    async def edit_message(self, **kwargs):
+        self._done = True
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+    async def edit_message(self, message_id, **kwargs):
+        self.sent += 1
+
+
+class FakeInteraction:
+    def __init__(self, guild: FakeGuild, user: FakeMember, message: FakeMessage = None):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = guild.channel
+        self.channel_id = guild.channel.id
+        self.user = user
+        self.message = message
+        self.extras = {}
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+
+class FakeHTTPResponse:
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+class FakeHTTP:
+    """`HTTPClient` z prawdziwymi kubełkami discord.py (`Ratelimit`) i atrapą limitu po stronie
+    Discorda: `limit` zapytań na `window` sekund na kubełek. Zlicza zapytania, które
+    dostałyby 429."""
+
+    def __init__(self, limit: int = 5, window: float = 5.0, latency: float = 0.01):
+        self._bucket_hashes = {}
+        self._buckets = {}
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.windows = {}
+        self.requests = 0
+        self.rate_limited = 0
+
+    async def request(self, route, **kwargs):
+        key = f"{route.key}:{route.major_parameters}"
+        ratelimit = self._buckets.get(key)
+        if ratelimit is None:
+            ratelimit = self._buckets[key] = discord.http.Ratelimit(None)
+        async with ratelimit:
+            await asyncio.sleep(self.latency)
+            now = asyncio.get_running_loop().time()
+            reset_at, used = self.windows.get(key, (0.0, 0))
+            if now >= reset_at:
+                reset_at, used = now + self.window, 0
+            used += 1
+            self.windows[key] = (reset_at, used)
+            self.requests += 1
+            if used > self.limit:
+                self.rate_limited += 1
+            ratelimit.update(FakeHTTPResponse({
+                "X-Ratelimit-Limit": str(self.limit),
+                "X-Ratelimit-Remaining": str(max(self.limit - used, 0)),
+                "X-Ratelimit-Reset-After": str(reset_at - now),
+            }))
+            return kwargs.get("json")
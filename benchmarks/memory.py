@@ -0,0 +1,144 @@
+"""Pamięć na jeden zapis: dawny układ (słownik + pełny `discord.Message`) kontra rekordy.
+
+Uruchomienie z katalogu repozytorium:
+
+    python -m benchmarks.memory                    # 2000 zapisów, po 10 uczestników
+    python -m benchmarks.memory -n 5000 --roster 40
+
+Dawny układ odtwarzany jest tak, jak wyglądał po `/create-capt` i `/airdrop`: słownik
+z polami ogłoszenia, listą i obiektem `discord.Message` zbudowanym z odpowiedzi
+REST (autor, embed, komponenty widoku). Po restarcie słownik trzymał `PartialMessage`,
+więc raport pokazuje oba warianty. Liczone bajty to różnica tracemalloc po zbudowaniu
+N zapisów, podzielona przez N (bez wspólnych obiektów: serwera, kanału, klienta).
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.fakes import snowflake  # noqa: E402
+
+GUILD_ID = snowflake()
+CHANNEL_ID = snowflake()
+VOICE_ID = snowflake()
+BOT_USER = {"id": str(snowflake()), "username": "bot", "discriminator": "0", "avatar": None, "bot": True}
+
+
+def message_payload(message_id: int, view: discord.ui.View, embed: discord.Embed) -> dict:
+    """Odpowiedź REST na wysłanie ogłoszenia (to, z czego discord.py buduje `Message`)."""
+    return {
+        "id": str(message_id),
+        "channel_id": str(CHANNEL_ID),
+        "guild_id": str(GUILD_ID),
+        "author": BOT_USER,
+        "content": "@everyone",
+        "timestamp": "2030-01-01T20:00:00.000000+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": True,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [embed.to_dict()],
+        "components": view.to_components(),
+        "pinned": False,
+        "type": 0,
+        "flags": 0,
+    }
+
+
+def announcement(i: int):
+    """Embed i widok ogłoszenia liczone raz na wzór (jak przy wysyłce), poza pomiarem."""
+    if i % 2:
+        view = main.CapturesView(0, "Admin", main.ZANCUDO_IMAGE_URL, int(time.time()) + 3600)
+        embed = discord.Embed(title="CAPTURES!", description="Kliknij przycisk, aby się zapisać!", color=0xFFFFFF)
+        embed.set_image(url=main.ZANCUDO_IMAGE_URL)
+    else:
+        view = main.AirdropView(0, "Zrzut", None, "Admin", int(time.time()) + 3600)
+        embed = discord.Embed(title="AirDrop!", description="Zrzut\n\n**Kanał głosowy:** <#1>", color=0xFFFFFF)
+    embed.add_field(name="Start:", value="<t:1893528000:R>")
+    embed.set_footer(text="Wystawione przez Admin")
+    return view, embed
+
+
+def legacy_entry(i: int, message_id: int, roster, full_message: bool, templates) -> dict:
+    view, embed = templates[i % 2]
+    channel = main.client.get_partial_messageable(CHANNEL_ID, guild_id=GUILD_ID)
+    if full_message:
+        message = discord.Message(state=main.client._connection, channel=channel, data=message_payload(message_id, view, embed))
+    else:
+        message = channel.get_partial_message(message_id)
+    data = {
+        "participants": main.Roster(roster),
+        "message": message,
+        "channel_id": CHANNEL_ID,
+        "author_name": "Admin",
+        "timestamp": int(time.time()) + 3600,
+        "started": False,
+        "guild_id": GUILD_ID,
+    }
+    if i % 2:
+        data["image_url"] = main.ZANCUDO_IMAGE_URL
+    else:
+        data.update(description="Zrzut", voice_channel_id=VOICE_ID)
+    return data
+
+
+def record_entry(i: int, message_id: int, roster, *_):
+    fields = {"author_name": "Admin", "timestamp": int(time.time()) + 3600}
+    if i % 2:
+        return main.CaptureRecord(message_id, GUILD_ID, CHANNEL_ID, roster, image_url=main.ZANCUDO_IMAGE_URL, **fields)
+    return main.AirdropRecord(message_id, GUILD_ID, CHANNEL_ID, roster, description="Zrzut", voice_channel_id=VOICE_ID, **fields)
+
+
+def measure(build, n: int, roster_size: int, *args) -> float:
+    rosters = [[snowflake() for _ in range(roster_size)] for _ in range(n)]
+    ids = [snowflake() for _ in range(n)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [build(i, ids[i], rosters[i], *args) for i in range(n)]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return total / n
+
+
+async def main_async(n: int, roster_size: int):
+    # Widoki discord.py wymagają działającej pętli zdarzeń.
+    templates = [announcement(0), announcement(1)]
+    layouts = (
+        ("słownik + discord.Message", legacy_entry, True, templates),
+        ("słownik + PartialMessage", legacy_entry, False, templates),
+        ("rekord (__slots__)", record_entry),
+    )
+    results = {}
+    print(f"{n} zapisów, po {roster_size} uczestników")
+    print(f"{'układ':30} {'B/zapis':>10}")
+    for name, build, *args in layouts:
+        results[name] = measure(build, n, roster_size, *args)
+        print(f"{name:30} {results[name]:>10.0f}")
+    base = results["słownik + discord.Message"]
+    current = results["rekord (__slots__)"]
+    print(f"\nRekordy: {base - current:.0f} B mniej na zapis ({1 - current / base:.0%}), "
+          f"{(base - current) * 1000 / 1024:.0f} KiB na 1000 zapisów.")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=2000, help="liczba zapisów (domyślnie 2000)")
+    parser.add_argument("--roster", type=int, default=10, help="uczestników na zapis (domyślnie 10)")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.n, args.roster))
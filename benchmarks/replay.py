@@ -0,0 +1,312 @@
+"""Odtwarzanie nagranych interakcji na lokalnej atrapie Discorda (bez sieci).
+
+Nagranie powstaje na żywym bocie z INTERACTION_TRACE=raid.jsonl. Odtworzenie
+uruchamia atrapę REST/bramki (benchmarks/fake_discord.py), zakłada bazę z zapisami,
+których dotyczą nagrane przyciski, startuje `main.py` jako osobny proces
+skierowany na atrapę i wysyła interakcje z zachowaniem odstępów (przyspieszonych):
+
+    python -m benchmarks.replay raid.jsonl --speed 10
+    python -m benchmarks.replay --synthetic 300 --spread 5     # sztuczny szturm capt_join
+    python -m benchmarks.replay raid.jsonl --speed 50 --json wynik.json
+    python -m benchmarks.replay --synthetic 300 --guild-members 50000 --member-cache both
+
+Raport: przepustowość, p50/p99 czasu do potwierdzenia (ack) i do edycji listy,
+interakcje wygasłe (10062), zapytania i odpowiedzi 429 per kubełek, a także czas
+startu bota i jego RSS. `--member-cache both` odtwarza dwa razy (MEMBER_CACHE=full
+i lazy) i zestawia start, RSS i liczbę członków w pamięci; `--guild-members`
+dopełnia serwer milczącymi członkami, żeby odwzorować duży serwer.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DISCORD_BOT_TOKEN", "replay")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aiohttp  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.fake_discord import FakeDiscord, snowflake  # noqa: E402
+
+MAX_SPEED = 50.0
+# Prefiks custom_id przycisku -> rodzaj zapisu w bazie.
+KINDS = (("capt_", "captures"), ("airdrop_", "airdrop"), ("manage_squad", "squad"))
+
+
+def load_trace(path: str):
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return sorted((e for e in entries if e.get("guild_id") and e.get("channel_id")), key=lambda e: e["ts"])
+
+
+def synthetic_trace(users: int, spread: float, leave_ratio: float, seed: int = 0):
+    """Szturm `capt_join` na jeden capt: `users` osób w ciągu `spread` sekund,
+    część z nich (`leave_ratio`) wypisuje się zaraz potem."""
+    rng = random.Random(seed)
+    guild_id, channel_id, message_id = snowflake(), snowflake(), snowflake()
+    entries = []
+    for n in range(users):
+        user_id = snowflake()
+        at = rng.uniform(0, spread)
+        entry = {
+            "type": 3, "user_id": user_id, "user_name": f"gracz{n}", "display_name": f"Gracz {n}", "roles": [],
+            "guild_id": guild_id, "channel_id": channel_id, "message_id": message_id,
+        }
+        entries.append(dict(entry, ts=at, name="capt_join", data={"custom_id": "capt_join", "component_type": 2}))
+        if rng.random() < leave_ratio:
+            leave_at = at + rng.uniform(0.5, 2.0)
+            entries.append(dict(entry, ts=leave_at, name="capt_leave", data={"custom_id": "capt_leave", "component_type": 2}))
+    return sorted(entries, key=lambda e: e["ts"])
+
+
+def build_world(entries):
+    """Serwery, kanały i członkowie widziani w nagraniu oraz rodzaj zapisu każdej wiadomości."""
+    guilds, enrollments = {}, {}
+    for entry in entries:
+        guild = guilds.setdefault(entry["guild_id"], {
+            "id": entry["guild_id"], "name": "Replay", "channels": {}, "roles": set(), "members": {},
+            "voice_channel_id": snowflake(),
+        })
+        guild["channels"][entry["channel_id"]] = 0
+        guild["roles"].update(entry.get("roles", ()))
+        guild["members"][entry["user_id"]] = {
+            "name": entry.get("user_name") or f"user{entry['user_id'][-4:]}",
+            "display_name": entry.get("display_name"),
+            "roles": entry.get("roles", []),
+        }
+        message_id = entry.get("message_id")
+        if message_id and entry["type"] == 3 and message_id not in enrollments:
+            kind = next((kind for prefix, kind in KINDS if (entry["name"] or "").startswith(prefix)), None)
+            if kind:
+                enrollments[message_id] = (kind, entry["guild_id"], entry["channel_id"])
+    for guild in guilds.values():
+        guild["channels"][guild["voice_channel_id"]] = 2
+        guild["roles"] = sorted(guild["roles"])
+    return list(guilds.values()), enrollments
+
+
+def seed_store(path: str, guilds, enrollments):
+    """Zakłada bazę bota z zapisami, których dotyczą nagrane przyciski (bez uczestników)."""
+    voice = {g["id"]: g["voice_channel_id"] for g in guilds}
+    starts_at = int(time.time()) + 3 * 3600
+    store = main.EnrollmentStore(path)
+    store.open()
+    for message_id, (kind, guild_id, channel_id) in enrollments.items():
+        data = {"channel_id": int(channel_id), "author_name": "Replay"}
+        if kind == "captures":
+            data.update(image_url=main.ZANCUDO_IMAGE_URL, timestamp=starts_at, started=False)
+        elif kind == "airdrop":
+            data.update(description="Odtworzenie", voice_channel_id=int(voice[guild_id]), timestamp=starts_at, started=False)
+        elif kind == "squad":
+            data.update(role_id=int(guilds[0]["roles"][0]) if guilds[0]["roles"] else int(guild_id), title="Replay Squad")
+        store.upsert(main.make_record(kind, int(message_id), int(guild_id), **data))
+    store.close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Bot zakończył działanie przed gotowością (kod {process.returncode}).")
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError("Bot nie zgłosił gotowości na czas.")
+
+
+async def scrape_metrics(url: str) -> dict:
+    """Wybrane liczniki z /metrics bota (strona bota: 429 widziane przez discord.py, edycje)."""
+    wanted = (
+        "bot_http_429_total", "bot_message_edits_total", "bot_message_edit_requests_total", "bot_interaction_expired_total",
+        "bot_rest_requests_total", "bot_startup_seconds", "bot_process_rss_bytes", "bot_member_cache",
+        "bot_member_queries_total",
+    )
+    values = {}
+    try:
+        async with aiohttp.ClientSession() as session, session.get(url) as response:
+            text = await response.text()
+    except aiohttp.ClientError:
+        return values
+    for line in text.splitlines():
+        if line.startswith(wanted):
+            name, _, value = line.rpartition(" ")
+            values[name] = float(value)
+    return values
+
+
+def pad_members(guilds, total: int):
+    """Dopełnia serwery milczącymi członkami (nie klikają, tylko zajmują pamięć przy pełnym pobraniu)."""
+    for guild in guilds:
+        for n in range(len(guild["members"]), total):
+            guild["members"][snowflake()] = {"name": f"czlonek{n}", "display_name": None, "roles": []}
+
+
+async def replay(entries, speed: float, max_gap: float, latency: float, drain: float, verbose: bool,
+                 member_cache: str = "full", guild_members: int = 0):
+    guilds, enrollments = build_world(entries)
+    pad_members(guilds, guild_members)
+    fake = FakeDiscord(guilds, latency=latency)
+    for message_id, (kind, guild_id, channel_id) in enrollments.items():
+        fake.messages[message_id] = fake.message_payload(message_id, channel_id)
+    api_base = await fake.start()
+
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    db_path = os.path.join(workdir, "zapisy.db")
+    seed_store(db_path, guilds, enrollments)
+    bot_port = free_port()
+    env = dict(os.environ, DISCORD_BOT_TOKEN="replay", DISCORD_API_BASE=api_base,
+               DISCORD_GATEWAY_URL=fake.gateway_url, DB_PATH=db_path, PORT=str(bot_port), MEMBER_CACHE=member_cache)
+    env.pop("INTERACTION_TRACE", None)
+    log_path = os.path.join(workdir, "bot.log")
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "main.py")], cwd=workdir, env=env,
+        stdout=None if verbose else log, stderr=subprocess.STDOUT,
+    )
+    try:
+        started_at = time.perf_counter()
+        await wait_ready(f"http://127.0.0.1:{bot_port}/ready", process)
+        startup = time.perf_counter() - started_at
+        print(f"Bot gotowy po {startup:.2f} s ({len(enrollments)} zapisów, {sum(len(g['members']) for g in guilds)} członków, "
+              f"MEMBER_CACHE={member_cache}).")
+        ready_metrics = await scrape_metrics(f"http://127.0.0.1:{bot_port}/metrics")
+
+        # Odstępy z nagrania, przyspieszone i z przyciętymi długimi przerwami.
+        offsets, offset, previous = [], 0.0, entries[0]["ts"]
+        for entry in entries:
+            offset += min(entry["ts"] - previous, max_gap) / speed
+            previous = entry["ts"]
+            offsets.append(offset)
+
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        for entry, at in zip(entries, offsets):
+            delay = t0 + at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await fake.send_interaction(entry)
+        replay_seconds = loop.time() - t0
+
+        # Dopuszczamy potwierdzenia do 3 s i ostatnie edycje z kolejki.
+        while fake.pending_acks():
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(drain)
+        bot_metrics = await scrape_metrics(f"http://127.0.0.1:{bot_port}/metrics")
+    finally:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+        await fake.stop()
+
+    report = fake.report()
+    report.update(
+        speed=speed,
+        member_cache=member_cache,
+        startup_seconds=round(startup, 3),
+        ready_metrics=ready_metrics,
+        replay_seconds=round(replay_seconds, 3),
+        throughput_per_second=round(fake.acked / replay_seconds, 1) if replay_seconds else None,
+        bot_metrics=bot_metrics,
+        bot_log=log_path,
+    )
+    return report
+
+
+def print_report(report: dict):
+    print(f"\nOdtworzono {report['dispatched']} interakcji w {report['replay_seconds']:.2f} s (x{report['speed']:g}), "
+          f"potwierdzono {report['acked']}, przepustowość {report['throughput_per_second']} /s.")
+    print(f"{'interakcja':<24} {'ack':>6} {'10062':>6} {'ack p50':>9} {'ack p99':>9} {'ack max':>9} {'edit p50':>9} {'edit p99':>9}")
+    for name, row in report["interactions"].items():
+        print(f"{name:<24} {row['acked']:>6} {row['expired']:>6} {row['ack_p50_ms']:>7.1f}ms {row['ack_p99_ms']:>7.1f}ms "
+              f"{row['ack_max_ms']:>7.1f}ms {row['edit_p50_ms']:>7.1f}ms {row['edit_p99_ms']:>7.1f}ms")
+    print("\nZapytania REST:", ", ".join(f"{k}={v}" for k, v in report["requests"].items()))
+    print("Odpowiedzi 429:", ", ".join(f"{k}={v}" for k, v in report["rate_limited"].items()) or "brak")
+    if report["bot_metrics"]:
+        print("Metryki bota:", ", ".join(f"{k}={v:g}" for k, v in report["bot_metrics"].items()))
+    print(f"Log bota: {report['bot_log']}")
+
+
+def metric(values: dict, prefix: str, default=0.0):
+    return next((value for name, value in values.items() if name.startswith(prefix)), default)
+
+
+def print_startup(reports):
+    """Zestawienie startu obu trybów pamięci członków (RSS tuż po gotowości i po odtworzeniu)."""
+    print(f"\n{'MEMBER_CACHE':<13} {'gotowy':>8} {'on_ready':>9} {'RSS start':>10} {'RSS koniec':>11} {'członkowie':>11} {'op 8':>6}")
+    for report in reports:
+        ready, end = report["ready_metrics"], report["bot_metrics"]
+        print(f"{report['member_cache']:<13} {report['startup_seconds']:>7.2f}s {metric(ready, 'bot_startup_seconds', -1):>8.2f}s "
+              f"{metric(ready, 'bot_process_rss_bytes') / 2**20:>7.1f}MiB {metric(end, 'bot_process_rss_bytes') / 2**20:>8.1f}MiB "
+              f"{metric(end, 'bot_member_cache'):>11.0f} {report['member_requests']:>6}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace", nargs="?", help="plik JSONL nagrany z INTERACTION_TRACE")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="zamiast nagrania: N osób klika capt_join")
+    parser.add_argument("--spread", type=float, default=10.0, help="okno sztucznego szturmu w sekundach (domyślnie 10)")
+    parser.add_argument("--leave", type=float, default=0.1, help="odsetek osób, które od razu się wypisują (domyślnie 0.1)")
+    parser.add_argument("--speed", type=float, default=1.0, help=f"przyspieszenie odtwarzania, 1-{MAX_SPEED:g} (domyślnie 1)")
+    parser.add_argument("--max-gap", type=float, default=30.0, help="najdłuższa przerwa z nagrania w sekundach (domyślnie 30)")
+    parser.add_argument("--latency", type=float, default=0.03, help="sztuczne opóźnienie odpowiedzi REST w sekundach (domyślnie 0.03)")
+    parser.add_argument("--drain", type=float, default=3.0, help="czas na ostatnie edycje po odtworzeniu (domyślnie 3 s)")
+    parser.add_argument("--member-cache", choices=("full", "lazy", "both"), default="full",
+                        help="tryb pamięci członków bota (MEMBER_CACHE); both = oba po kolei (domyślnie full)")
+    parser.add_argument("--guild-members", type=int, default=0, metavar="N",
+                        help="dopełnij każdy serwer do N członków (domyślnie tylko klikający)")
+    parser.add_argument("--json", metavar="PLIK", help="zapisz raport jako JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="pokaż log bota na bieżąco")
+    args = parser.parse_args(argv)
+    if not args.trace and not args.synthetic:
+        parser.error("podaj plik nagrania albo --synthetic N")
+    if not 1.0 <= args.speed <= MAX_SPEED:
+        parser.error(f"--speed musi być w zakresie 1-{MAX_SPEED:g}")
+    return args
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    entries = synthetic_trace(args.synthetic, args.spread, args.leave) if args.synthetic else load_trace(args.trace)
+    if not entries:
+        print("Brak interakcji do odtworzenia.")
+        return 1
+    modes = ("full", "lazy") if args.member_cache == "both" else (args.member_cache,)
+    reports = []
+    for mode in modes:
+        report = asyncio.run(replay(entries, args.speed, args.max_gap, args.latency, args.drain, args.verbose, mode, args.guild_members))
+        print_report(report)
+        reports.append(report)
+    print_startup(reports)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports[0] if len(reports) == 1 else {r["member_cache"]: r for r in reports}, f, indent=2, ensure_ascii=False)
+    expired = sum(row["expired"] for report in reports for row in report["interactions"].values())
+    return 1 if expired else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
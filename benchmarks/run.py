@@ -0,0 +1,428 @@
+"""Benchmarki gorących ścieżek zapisów (offline, na atrapach z benchmarks/fakes.py).
+
+Uruchomienie z katalogu repozytorium:
+
+    python -m benchmarks.run                                  # wszystkie scenariusze
+    python -m benchmarks.run -k join_storm                    # tylko pasujące nazwy
+    python -m benchmarks.run --save benchmarks/baseline.json  # zapis wyników bazowych
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Każdy scenariusz raportuje ops/s, p50/p99 pojedynczej operacji, liczbę edycji
+wiadomości i szczytowe zużycie pamięci (tracemalloc). Scenariusze idą w `--repeat`
+rundach (każda runda przechodzi przez wszystkie) i liczy się najlepsza runda danego
+scenariusza, mierzona bez tracemalloc (który sam spowalnia i rozrzuca wyniki); pamięć
+pochodzi z osobnego przebiegu pod tracemalloc. Wolniejsze okresy maszyny trwają po kilka
+sekund, więc powtórzenia jednego scenariusza pod rząd trafiały w ten sam okres, a ten
+sam kod różnił się między uruchomieniami o 30-40%.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+os.environ.setdefault("EDIT_COALESCE_SECONDS", "0.05")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from discord.http import Route  # noqa: E402
+from benchmarks.fakes import FakeGuild, FakeHTTP, FakeInteraction, FakeMessage, FakeRole, snowflake  # noqa: E402
+
+SIZES = (10, 100, 300, 1000)
+REGRESSION_THRESHOLD = 0.20
+
+# Rekordy nie trzymają wiadomości - `record.message` składa ją z id, więc w benchmarkach
+# podstawiamy atrapy z tego rejestru (liczą edycje).
+MESSAGES = {}
+main.partial_message = lambda record: MESSAGES[record.message_id]
+
+
+def fake_message(guild: FakeGuild) -> FakeMessage:
+    message = FakeMessage(guild)
+    MESSAGES[message.id] = message
+    return message
+
+
+def reset_state():
+    main.captures.clear()
+    main.airdrops.clear()
+    main.squads.clear()
+    for msgs in main.events.values():
+        msgs.clear()
+    MESSAGES.clear()
+    main.store._pending.clear()
+    main.member_lines.__init__()
+    on_missing = main.edit_coalescer.on_missing
+    main.edit_coalescer.__init__(main.edit_coalescer.window)
+    main.edit_coalescer.on_missing = on_missing
+
+
+async def drain_edits():
+    while main.edit_coalescer._tasks:
+        await asyncio.sleep(main.edit_coalescer.window)
+
+
+def new_capture(guild: FakeGuild, participants=()):
+    message = fake_message(guild)
+    record = main.CaptureRecord(
+        message.id, guild.id, guild.channel.id, participants,
+        author_name="Benchmark", image_url=main.ZANCUDO_IMAGE_URL, timestamp=int(time.time()) + 3600,
+    )
+    main.captures[message.id] = record
+    view = main.CapturesView(message.id, "Benchmark", main.ZANCUDO_IMAGE_URL, record.timestamp)
+    return message, view
+
+
+def new_airdrop(guild: FakeGuild, participants=()):
+    message = fake_message(guild)
+    record = main.AirdropRecord(
+        message.id, guild.id, guild.channel.id, participants,
+        author_name="Benchmark", description="Benchmark AirDrop", voice_channel_id=guild.voice.id,
+        timestamp=int(time.time()) + 3600,
+    )
+    main.airdrops[message.id] = record
+    view = main.AirdropView(message.id, "Benchmark AirDrop", guild.voice, "Benchmark", record.timestamp)
+    return message, view
+
+
+# --- Scenariusze: każdy zwraca (czasy pojedynczych operacji, liczba edycji) ---
+
+async def render_captures(n: int):
+    guild = FakeGuild(n + 1)
+    ids = list(guild.members)
+    message, view = new_capture(guild, ids[:n])
+    extra = ids[n]
+    roster = main.captures[message.id].participants
+    timings = []
+    for i in range(200):
+        started = time.perf_counter()
+        if i % 2:
+            roster.discard(extra)
+        else:
+            roster.add(extra)
+        view.make_embed(guild)
+        timings.append(time.perf_counter() - started)
+    return timings, 0
+
+
+async def join_storm(n: int):
+    guild = FakeGuild(n)
+    message, view = new_capture(guild)
+
+    async def click(member):
+        interaction = FakeInteraction(guild, member, message)
+        started = time.perf_counter()
+        await view.join_button.callback(interaction)
+        return time.perf_counter() - started
+
+    timings = await asyncio.gather(*(click(m) for m in guild.members.values()))
+    await drain_edits()
+    return list(timings), message.edits
+
+
+async def leave_storm(n: int):
+    guild = FakeGuild(n)
+    message, view = new_capture(guild, guild.members)
+
+    async def click(member):
+        interaction = FakeInteraction(guild, member, message)
+        started = time.perf_counter()
+        await view.leave_button.callback(interaction)
+        return time.perf_counter() - started
+
+    timings = await asyncio.gather(*(click(m) for m in guild.members.values()))
+    await drain_edits()
+    return list(timings), message.edits
+
+
+async def airdrop_join_storm(n: int):
+    guild = FakeGuild(n)
+    message, view = new_airdrop(guild)
+
+    async def click(member):
+        interaction = FakeInteraction(guild, member, message)
+        started = time.perf_counter()
+        await view.join.callback(interaction)
+        return time.perf_counter() - started
+
+    timings = await asyncio.gather(*(click(m) for m in guild.members.values()))
+    await drain_edits()
+    return list(timings), message.edits
+
+
+async def squad_embed(n: int):
+    guild = FakeGuild(n)
+    roster = main.Roster(guild.members)
+    timings = []
+    for _ in range(200):
+        started = time.perf_counter()
+        main.create_squad_embed(guild, "Benchmark", roster, "Main Squad")
+        timings.append(time.perf_counter() - started)
+    return timings, 0
+
+
+async def admin_bulk_add(n: int):
+    guild = FakeGuild(n + 1)
+    admin = guild.members[next(iter(guild.members))]
+    message, _ = new_capture(guild)
+    timings = []
+    for member in list(guild.members.values())[1:]:
+        started = time.perf_counter()
+        view = main.AddEnrollmentView(guild, [member.id])
+        select = next(item for item in view.children if isinstance(item, main.ui.Select))
+        select._values = [f"captures-{message.id}"]
+        await view.confirm_add.callback(FakeInteraction(guild, admin, FakeMessage(guild)))
+        timings.append(time.perf_counter() - started)
+    await drain_edits()
+    return timings, message.edits
+
+
+
+async def admin_group_add(n: int):
+    """To samo co admin_bulk_add, ale jedną komendą grupową z roli: jedna mutacja, jedna edycja."""
+    guild = FakeGuild(n + 1)
+    admin = guild.members[next(iter(guild.members))]
+    role = FakeRole(snowflake(), "Skład")
+    role.members = list(guild.members.values())[1:]
+    message, _ = new_capture(guild)
+    timings = []
+    for _ in range(2):  # drugi przebieg: wszyscy już zapisani - same pominięcia
+        started = time.perf_counter()
+        user_ids, _ = main.collect_user_ids(guild, rola=role)
+        view = main.AddEnrollmentView(guild, user_ids)
+        select = next(item for item in view.children if isinstance(item, main.ui.Select))
+        select._values = [f"captures-{message.id}"]
+        await view.confirm_add.callback(FakeInteraction(guild, admin, FakeMessage(guild)))
+        timings.append(time.perf_counter() - started)
+    await drain_edits()
+    return timings, message.edits
+
+async def enrollment_select(n: int):
+    guild = FakeGuild(10)
+    for _ in range(n):
+        new_capture(guild, guild.members)
+    timings = []
+    for _ in range(100):
+        started = time.perf_counter()
+        main.EnrollmentSelectMenu("add", guild)
+        timings.append(time.perf_counter() - started)
+    return timings, 0
+
+
+async def player_picker(n: int):
+    guild = FakeGuild(n)
+    roles = [FakeRole(snowflake(), f"Rola {i}", position=i) for i in range(5)]
+    for i, member in enumerate(guild.members.values()):
+        member.roles.append(roles[i % len(roles)])
+    message, _ = new_capture(guild, guild.members)
+    for _ in range(3):
+        new_capture(guild, list(guild.members)[::2])
+    roster = main.captures[message.id].participants
+    timings = []
+    started = time.perf_counter()
+    view = main.PickPlayersView(main.PickSession(message.id, guild))
+    timings.append(time.perf_counter() - started)
+    session = view.session
+    steps = (
+        lambda: session.apply_page(session.page_ids(), session.page_ids()[::3]),
+        lambda: setattr(session, "page", (session.page + 1) % session.page_count),
+        lambda: session.set_view(query="gracz_001"),
+        lambda: session.set_view(query=""),
+        lambda: session.set_view(sort=("name", "role", "attendance", "join")[len(timings) % 4]),
+        lambda: roster.add(snowflake()) if len(timings) % 50 == 0 else None,
+    )
+    for i in range(300):
+        started = time.perf_counter()
+        steps[i % len(steps)]()
+        view.build()
+        timings.append(time.perf_counter() - started)
+    return timings, 0
+
+
+async def autopick(n: int):
+    guild = FakeGuild(n)
+    roles = [FakeRole(snowflake(), f"Rola {i}", position=i) for i in range(5)]
+    log = main.AttendanceLog.__new__(main.AttendanceLog)
+    main.AttendanceLog.__init__(log, os.devnull)
+    now = int(time.time())
+    for i, member in enumerate(guild.members.values()):
+        member.roles.append(roles[i % len(roles)])
+        for past in range(i % 7):
+            log.record(main.AttendanceLog.JOIN, "captures", guild.id, past, member.id, ts=now - past * 86400)
+            log.record(main.AttendanceLog.PICK if (i + past) % 3 else main.AttendanceLog.PASS, "captures", guild.id, past, member.id, ts=now - past * 86400)
+    main.attendance.guilds[guild.id] = log.guilds[guild.id]
+    message, _ = new_capture(guild, guild.members)
+    roster = main.captures[message.id].participants
+    timings = []
+    for i in range(100):
+        if i % 10 == 0:
+            roster.add(snowflake())  # co 10. przebieg lista się zmienia - pełna przebudowa indeksu
+        started = time.perf_counter()
+        session = main.PickSession(message.id, guild) if i % 10 == 0 else session
+        session.autopick()
+        timings.append(time.perf_counter() - started)
+    del main.attendance.guilds[guild.id]
+    return timings, 0
+
+
+async def enrollment_autocomplete(n: int):
+    guild = FakeGuild(10)
+    now = int(time.time())
+    for i in range(n):
+        message = fake_message(guild)
+        fields = {"author_name": f"Admin {i % 7}", "timestamp": now + (i - n // 3) * 1800}
+        if i % 2:
+            main.captures[message.id] = main.CaptureRecord(message.id, guild.id, guild.channel.id, **fields)
+        else:
+            main.airdrops[message.id] = main.AirdropRecord(
+                message.id, guild.id, guild.channel.id,
+                description=f"Zrzut {i}", voice_channel_id=guild.voice.id, **fields,
+            )
+    queries = ("", "capt dziś", "airdrop 21:", "capt jutro 20", "kanal", "admin 3")
+    timings = []
+    for i in range(600):
+        started = time.perf_counter()
+        for entry in main.enrollment_index.search(guild, queries[i % len(queries)]):
+            main.enrollment_index.label(entry, guild)
+        timings.append(time.perf_counter() - started)
+    return timings, 0
+
+
+async def rest_priority(n: int):
+    """Edycje list (priorytet roster) zgłoszone za `n` kosmetycznymi edycjami tego samego
+    kanału (limit 5 na 0.1 s). Mierzony jest czas edycji listy od zgłoszenia do odpowiedzi;
+    kosmetyczne trafiają po kilka razy w te same wiadomości, więc część z nich jest
+    porzucana w kolejce. Każde 429 z atrapy przerywa scenariusz."""
+    http = FakeHTTP(limit=5, window=0.1, latency=0.005)
+    queue = main.RestQueue(concurrency=8, global_rate=10_000, max_delay=5.0)
+    queue.install(http, interactions=False)
+    channel_id = snowflake()
+    cosmetic_ids = [snowflake() for _ in range(max(n // 4, 1))]
+
+    async def edit(message_id: int, priority: int, payload: dict):
+        main.rest_priority.set(priority)
+        started = time.perf_counter()
+        try:
+            await http.request(Route("PATCH", main.MESSAGE_ROUTE, channel_id=channel_id, message_id=message_id), json=payload)
+        except main.EditSuperseded:
+            return None
+        return time.perf_counter() - started
+
+    cosmetic = [
+        asyncio.create_task(edit(cosmetic_ids[i % len(cosmetic_ids)], main.RestQueue.COSMETIC, {"embeds": [i]}))
+        for i in range(n)
+    ]
+    await asyncio.sleep(0)
+    roster = [asyncio.create_task(edit(snowflake(), main.RestQueue.ROSTER, {"embeds": [i]})) for i in range(20)]
+    timings = await asyncio.gather(*roster)
+    await asyncio.gather(*cosmetic)
+    assert http.rate_limited == 0, f"{http.rate_limited} zapytań dostałoby 429"
+    return timings, http.requests
+
+
+async def create_timestamp(_: int):
+    timings = []
+    for i in range(2000):
+        started = time.perf_counter()
+        main.create_timestamp(f"{i % 24}:{i % 60:02d}", "27.09.2030" if i % 2 else None)
+        timings.append(time.perf_counter() - started)
+    return timings, 0
+
+
+SCENARIOS = [
+    *((f"render_captures_{n}", render_captures, n) for n in SIZES),
+    *((f"join_storm_{n}", join_storm, n) for n in SIZES),
+    *((f"leave_storm_{n}", leave_storm, n) for n in SIZES),
+    *((f"airdrop_join_storm_{n}", airdrop_join_storm, n) for n in SIZES),
+    *((f"squad_embed_{n}", squad_embed, n) for n in SIZES),
+    *((f"admin_bulk_add_{n}", admin_bulk_add, n) for n in SIZES[:3]),
+    *((f"admin_group_add_{n}", admin_group_add, n) for n in SIZES[:3]),
+    *((f"enrollment_select_{n}", enrollment_select, n) for n in (10, 25)),
+    *((f"enrollment_autocomplete_{n}", enrollment_autocomplete, n) for n in SIZES[:3]),
+    *((f"player_picker_{n}", player_picker, n) for n in (25, 200, 1000)),
+    *((f"autopick_{n}", autopick, n) for n in (80, 300, 1000)),
+    *((f"rest_priority_{n}", rest_priority, n) for n in (20, 100)),
+    ("create_timestamp", create_timestamp, 0),
+]
+
+
+def percentile(ordered: list, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def measure(func, n: int) -> dict:
+    reset_state()
+    started = time.perf_counter()
+    timings, edits = await func(n)
+    elapsed = time.perf_counter() - started
+    ordered = sorted(timings)
+    return {
+        "ops": len(timings),
+        "ops_per_sec": round(len(timings) / sum(timings), 1) if sum(timings) else 0.0,
+        "p50_us": round(percentile(ordered, 0.50) * 1e6, 1),
+        "p99_us": round(percentile(ordered, 0.99) * 1e6, 1),
+        "wall_ms": round(elapsed * 1000, 1),
+        "message_edits": edits,
+    }
+
+
+async def measure_memory(func, n: int) -> float:
+    reset_state()
+    tracemalloc.start()
+    await func(n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def compare(results: dict, baseline: dict) -> list:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base["ops_per_sec"]:
+            continue
+        change = result["ops_per_sec"] / base["ops_per_sec"] - 1
+        marker = ""
+        if change < -REGRESSION_THRESHOLD:
+            marker = "  <-- REGRESJA"
+            regressions.append(name)
+        print(f"{name:28} {base['ops_per_sec']:>12} -> {result['ops_per_sec']:>12} ops/s ({change:+.0%}){marker}")
+    return regressions
+
+
+async def main_async(args) -> int:
+    results = {}
+    print(f"{'scenariusz':28} {'ops/s':>12} {'p50 µs':>10} {'p99 µs':>10} {'edycje':>7} {'pamięć KiB':>11}")
+    scenarios = [(name, func, n) for name, func, n in SCENARIOS if not args.k or args.k in name]
+    for _ in range(max(1, args.repeat)):
+        for name, func, n in scenarios:
+            result = await measure(func, n)
+            if name not in results or result["ops_per_sec"] > results[name]["ops_per_sec"]:
+                results[name] = result
+    for name, func, n in scenarios:
+        result = results[name]
+        result["peak_kib"] = await measure_memory(func, n)
+        print(f"{name:28} {result['ops_per_sec']:>12} {result['p50_us']:>10} {result['p99_us']:>10} {result['message_edits']:>7} {result['peak_kib']:>11}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Zapisano wyniki do {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", help="uruchom tylko scenariusze zawierające ten tekst")
+    parser.add_argument("--repeat", type=int, default=5, help="liczba rund, dla każdego scenariusza liczy się najlepsza (domyślnie 5)")
+    parser.add_argument("--save", help="zapisz wyniki jako JSON (np. benchmarks/baseline.json)")
+    parser.add_argument("--compare", help="porównaj z zapisanym plikiem JSON")
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
@@ -4,19 +4,32 @@ from discord.ext import tasks
 import os
 import sys
 import threading
-from flask import Flask
+import signal
+from aiohttp import web
+import yarl
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
 import re 
 import traceback 
 import time 
+import json
+import sqlite3
+import asyncio
+from collections import deque, OrderedDict
+from collections.abc import MutableMapping
+from array import array
+import heapq
+import struct
+import bisect
+import itertools
+import hashlib
+import functools
+import math
+import logging
+import contextvars
 
-# --- Flask ---
-app = Flask(__name__)
-
-@app.route("/")
-def home():
-    return "Bot działa!"
+# --- Chwila startu procesu (po imporcie bibliotek) - do raportu czasu gotowości ---
+PROCESS_STARTED = time.perf_counter()
 
 # --- Token ---
 load_dotenv()
@@ -25,15 +38,91 @@ if not token:
     print("Błąd: brak tokena Discord. Ustaw DISCORD_BOT_TOKEN w Render lub w .env")
     sys.exit(1)
 
-# --- Ustawienia ---
+# --- Ustawienia (role i obrazki to wartości domyślne; serwery nadpisują je w konfiguracji) ---
 PICK_ROLE_ID = 1413424476770664499 
-STATUS_ADMINS = [1184620388425138183, 1409225386998501480, 1007732573063098378, 364869132526551050] 
-ADMIN_ROLES = STATUS_ADMINS 
+STATUS_ADMINS = frozenset({1184620388425138183, 1409225386998501480, 1007732573063098378, 364869132526551050})
 BOT_ADMIN_ROLE_ID = 1413424476770664499
 ZANCUDO_IMAGE_URL = "https://cdn.discordapp.com/attachments/1224129510535069766/1414194392214011974/image.png"
 CAYO_IMAGE_URL = "https://cdn.discordapp.com/attachments/1224129510535069766/1414204332747915274/image.png"
 LOGO_URL = "https://cdn.discordapp.com/attachments/1184622314302754857/1420796249484824757/RInmPqb.webp?ex=68d6b31e&is=68d5619e&hm=0cdf3f7cbb269b12c9f47d7eb034e40a8d830ff502ca9ceacb3d7902d3819413&"
 
+# --- Trwały magazyn zapisów ---
+DB_PATH = os.getenv("DB_PATH", "zapisy.db")
+STORE_FLUSH_SECONDS = float(os.getenv("STORE_FLUSH_SECONDS", "2"))
+# Po tylu nieudanych zapisach z rzędu paczka idzie operacja po operacji, a te, które dalej
+# zawodzą, trafiają do store.dead_letters (i logu) zamiast blokować kolejne zapisy.
+STORE_MAX_RETRIES = int(os.getenv("STORE_MAX_RETRIES", "3"))
+
+# --- Historia obecności: binarny dziennik zdarzeń + migawka agregatów (plik .snap obok).
+# Przy shardach każdy proces prowadzi własny dziennik (tylko swoich serwerów). ---
+ATTENDANCE_LOG = os.getenv("ATTENDANCE_LOG") or "obecnosc{}.log"
+ATTENDANCE_COMPACT_BYTES = int(os.getenv("ATTENDANCE_COMPACT_BYTES", str(4 * 1024 * 1024)))
+ATTENDANCE_HISTORY = int(os.getenv("ATTENDANCE_HISTORY", "25"))
+
+# --- Pilnowanie 3-sekundowego terminu potwierdzenia interakcji ---
+ACK_DEADLINE_SECONDS = 3.0
+AUTO_DEFER_MARGIN = float(os.getenv("AUTO_DEFER_MARGIN", "0.8"))
+SLOW_CALLBACK_SECONDS = float(os.getenv("SLOW_CALLBACK_SECONDS", "2.0"))
+
+# --- Synchronizacja komend (1 = zawsze wysyłaj drzewo komend przy starcie) ---
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "0") == "1"
+
+# --- Sharding: SHARD_COUNT + SHARD_IDS (np. "0,1") uruchamia tylko wybrane shardy w tym procesie.
+# Puste = wszystkie shardy w jednym procesie, liczba z /gateway/bot. Procesy dzielą bazę DB_PATH. ---
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip()] or None
+if SHARD_IDS and not SHARD_COUNT:
+    print("Błąd: SHARD_IDS wymaga ustawienia SHARD_COUNT.")
+    sys.exit(1)
+
+def owns_guild(guild_id) -> bool:
+    """Czy serwer należy do shardów obsługiwanych przez ten proces (wzór shardu Discorda)."""
+    if SHARD_IDS is None:
+        return True
+    if guild_id is None:
+        return 0 in SHARD_IDS
+    return (int(guild_id) >> 22) % SHARD_COUNT in SHARD_IDS
+
+# --- Co ile sekund sprawdzać, czy inny proces zmienił konfigurację serwerów ---
+CONFIG_POLL_SECONDS = float(os.getenv("CONFIG_POLL_SECONDS", "30"))
+
+# --- Cykl życia zapisów: zamknięcie N godzin po starcie (eventy bez terminu - po utworzeniu),
+# po kolejnych M godzinach archiwizacja (tabela archive w bazie, wyłączone przyciski).
+# Domyślnie 0 = bez automatycznego zamykania (jak dotąd); np. 3 włącza zamykanie i archiwizację ---
+ENROLLMENT_CLOSE_HOURS = float(os.getenv("ENROLLMENT_CLOSE_HOURS", "0"))
+ENROLLMENT_RETENTION_HOURS = float(os.getenv("ENROLLMENT_RETENTION_HOURS", "24"))
+
+# --- Ile nicków pokazać w podsumowaniu grupowego wpisywania/wypisywania ---
+BULK_SUMMARY_NAMES = int(os.getenv("BULK_SUMMARY_NAMES", "30"))
+
+# --- Łączenie edycji embedów (okno w sekundach) ---
+EDIT_COALESCE_SECONDS = float(os.getenv("EDIT_COALESCE_SECONDS", "1.0"))
+
+# --- Kolejka zapytań REST: miejsca na zapytania w locie (odpowiedzi na interakcje też je zajmują),
+# własny limit globalny na sekundę (Discord: 50/s) i najdłuższe ustępowanie interakcjom ---
+REST_CONCURRENCY = int(os.getenv("REST_CONCURRENCY", "8"))
+REST_GLOBAL_RATE = int(os.getenv("REST_GLOBAL_RATE", "45"))
+REST_MAX_DELAY = float(os.getenv("REST_MAX_DELAY", "5"))
+
+# --- Pamięć członków: "full" = intencja members i pobranie wszystkich członków przy starcie (domyślnie),
+# "lazy" = bez intencji; w pamięci (LRU do MEMBER_CACHE_SIZE) tylko zapisani, członkowie składów i admini,
+# a braki dociągane partiami przez bramkę (zebrane w oknie MEMBER_FETCH_WINDOW s, max 100 id na zapytanie) ---
+MEMBER_CACHE = os.getenv("MEMBER_CACHE", "full").strip().lower()
+MEMBER_CACHE_SIZE = int(os.getenv("MEMBER_CACHE_SIZE", "5000"))
+MEMBER_FETCH_WINDOW = float(os.getenv("MEMBER_FETCH_WINDOW", "0.05"))
+if MEMBER_CACHE not in ("full", "lazy"):
+    print("Błąd: MEMBER_CACHE musi mieć wartość full albo lazy.")
+    sys.exit(1)
+
+# --- Nagrywanie interakcji (ścieżka JSONL) i adresy API/bramki (np. lokalna atrapa Discorda) ---
+INTERACTION_TRACE = os.getenv("INTERACTION_TRACE")
+DISCORD_API_BASE = os.getenv("DISCORD_API_BASE")
+DISCORD_GATEWAY_URL = os.getenv("DISCORD_GATEWAY_URL")
+if DISCORD_API_BASE:
+    discord.http.Route.BASE = DISCORD_API_BASE.rstrip("/")
+if DISCORD_GATEWAY_URL:
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(DISCORD_GATEWAY_URL)
+
 # --- Definicja strefy czasowej PL (UTC+2) ---
 POLAND_TZ = timezone(timedelta(hours=2))
 
@@ -74,8 +163,11 @@ def create_timestamp(czas_str: str, data_str: str = None) -> int:
 
 # --- Discord Client ---
 intents = discord.Intents.default()
-intents.members = True
-client = discord.Client(intents=intents)
+intents.members = MEMBER_CACHE == "full"
+# W trybie leniwym discord.py nie trzyma żadnych członków (także tych z GUILD_CREATE
+# i kanałów głosowych) - wszystkich, których bot potrzebuje, pilnuje `member_cache`.
+member_cache_flags = discord.MemberCacheFlags.from_intents(intents) if intents.members else discord.MemberCacheFlags.none()
+client = discord.AutoShardedClient(intents=intents, member_cache_flags=member_cache_flags, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
 tree = app_commands.CommandTree(client)
 
 # --- Globalna obsługa błędów ---
@@ -85,7 +177,9 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
     traceback.print_exc() 
     
     if isinstance(error, app_commands.CommandInvokeError) and isinstance(error.original, discord.NotFound) and "10062" in str(error.original):
-        print("Wykryto i pominięto błąd 10062 (Unknown interaction/Wygasła interakcja).")
+        name = interaction.extras.get("name", interaction.command.name)
+        metrics.expired_interactions.inc(name)
+        print(f"Błąd 10062 (Unknown interaction/Wygasła interakcja) w {name}; potwierdzenie: {interaction.extras.get('acked', 'brak')}.")
         return
         
     if isinstance(error, app_commands.CommandInvokeError) and isinstance(error.original, ValueError):
@@ -95,43 +189,2172 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
         response_content = f"❌ Wystąpił błąd w kodzie: `{error_name}`. Sprawdź logi bota! (Original: `{type(getattr(error, 'original', None)).__name__}`)"
             
     try:
-        if interaction.response.is_done():
-            await interaction.followup.send(response_content, ephemeral=True)
-        else:
-            await interaction.response.send_message(response_content, ephemeral=True)
-            
+        await respond(interaction, response_content, ephemeral=True)
     except discord.HTTPException:
         print("Nie udało się wysłać wiadomości o błędzie do użytkownika, interakcja wygasła (10062).")
 # --- KONIEC GLOBALNEJ OBSŁUGI BŁĘDÓW ---
 
-# --- Pamięć zapisów ---
-captures = {}   
-airdrops = {}   
-events = {"zancudo": {}, "cayo": {}} 
-squads = {}     
+# --- Pamięć członków (pełna albo leniwa) ---
+class MemberCache:
+    """Źródło obiektów `Member` dla list i podsumowań. W trybie pełnym to zwykłe
+    `guild.get_member` (cały serwer w pamięci discord.py). W trybie leniwym to LRU
+    do `size` pozycji: zapisani i członkowie składów (trafiają tu przy pierwszym
+    renderze listy) oraz admini (z interakcji). Brak zwraca `PENDING` i zleca
+    dociągnięcie - id z jednego serwera zebrane w oknie `window` idą jednym
+    `query_members` (po 100), a potem listy z tymi osobami są odświeżane."""
+
+    PENDING = object()
+    QUERY_LIMIT = 100
+    RECENT_SIZE = 1024
+
+    def __init__(self, lazy: bool, size: int, window: float):
+        self.lazy = lazy
+        self.size = size
+        self.window = window
+        self._members = OrderedDict()  # (guild_id, user_id) -> Member albo None (nie ma go na serwerze)
+        self._recent = OrderedDict()  # klikający z ostatnich interakcji, jeszcze bez miejsca w pamięci
+        self._queued = {}  # guild_id -> {user_id: None} do najbliższego zapytania
+        self._inflight = set()
+        self._tasks = {}
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        self.found = 0
+        self.not_found = 0
+        self.failures = 0
+
+    def count(self) -> int:
+        if not self.lazy:
+            return sum(len(guild.members) for guild in client.guilds)
+        return len(self._members)
+
+    def get(self, guild: discord.Guild, user_id: int):
+        """`Member`, None (nie ma go na serwerze) albo `PENDING` (dociągany)."""
+        if not self.lazy:
+            return guild.get_member(user_id)
+        key = (guild.id, user_id)
+        try:
+            member = self._members[key]
+        except KeyError:
+            pass
+        else:
+            self._members.move_to_end(key)
+            self.hits += 1
+            return member
+        member = self._recent.pop(key, None) or guild.get_member(user_id)
+        if member is not None:
+            self.hits += 1
+            self._store(key, member)
+            return member
+        self.misses += 1
+        self._request(guild, user_id)
+        return self.PENDING
+
+    def prefetch(self, guild: discord.Guild, user_ids):
+        """Zleca dociągnięcie nieznanych członków z wyprzedzeniem (przed renderem listy)."""
+        if not self.lazy:
+            return
+        for uid in user_ids:
+            key = (guild.id, uid)
+            if key not in self._members and key not in self._recent:
+                self._request(guild, uid)
+
+    def remember(self, member):
+        """Świeży `Member` z interakcji. Znanego członka aktualizuje (zmiana nicku unieważnia
+        jego linię), admina przyjmuje od razu, resztę odkłada na krótką listę ostatnich -
+        do pamięci trafią, gdy zaraz pojawią się na liście. Bez intencji members nie ma
+        zdarzeń `on_member_update`, więc zmiana ról unieważnia tu uprawnienia."""
+        if not self.lazy or not isinstance(member, discord.Member):
+            return
+        key = (member.guild.id, member.id)
+        before = self._members.get(key) or self._recent.get(key)
+        if before is None or before._roles != member._roles:
+            permissions.invalidate(member.guild.id, member.id)
+        if key in self._members:
+            self._store(key, member)
+            if before is None or before.display_name != member.display_name:
+                member_lines.invalidate(member.guild.id, member.id)
+        elif "admin" in permissions.of(member, member.guild.id):
+            self._recent.pop(key, None)
+            self._store(key, member)
+        else:
+            self._recent[key] = member
+            self._recent.move_to_end(key)
+            if len(self._recent) > self.RECENT_SIZE:
+                self._recent.popitem(last=False)
+
+    def role_members(self, role: discord.Role) -> list:
+        """Członkowie roli. W trybie leniwym tylko ci, których bot ma w pamięci."""
+        if not self.lazy:
+            return role.members
+        guild_id = role.guild.id
+        return [m for (gid, _), m in self._members.items() if gid == guild_id and m is not None and m.get_role(role.id)]
+
+    def sweep(self, guild_id: int):
+        """Usuwa z pamięci członków serwera, których nie ma już na żadnej liście (poza adminami)."""
+        if not self.lazy:
+            return
+        wanted = set()
+        for registry in (captures, airdrops, squads, *events.values()):
+            for record in registry.in_guild(guild_id).values():
+                wanted.update(record.participants)
+        stale = [
+            key for key, member in self._members.items()
+            if key[0] == guild_id and key[1] not in wanted and (member is None or "admin" not in permissions.of(member, guild_id))
+        ]
+        for key in stale:
+            del self._members[key]
+        member_lines.discard(guild_id, [uid for _, uid in stale])
+
+    def _store(self, key: tuple, member):
+        self._members[key] = member
+        self._members.move_to_end(key)
+        while len(self._members) > self.size:
+            self._members.popitem(last=False)
+
+    def _request(self, guild: discord.Guild, user_id: int):
+        key = (guild.id, user_id)
+        if key in self._inflight:
+            return
+        self._inflight.add(key)
+        self._queued.setdefault(guild.id, {})[user_id] = None
+        if guild.id not in self._tasks:
+            self._tasks[guild.id] = asyncio.create_task(self._fetch(guild))
+
+    async def _fetch(self, guild: discord.Guild):
+        try:
+            await asyncio.sleep(self.window)
+            while self._queued.get(guild.id):
+                queued = self._queued[guild.id]
+                batch = list(itertools.islice(queued, self.QUERY_LIMIT))
+                for uid in batch:
+                    del queued[uid]
+                await self._query(guild, batch)
+            self._queued.pop(guild.id, None)
+        finally:
+            self._tasks.pop(guild.id, None)
+
+    async def _query(self, guild: discord.Guild, user_ids: list):
+        self.queries += 1
+        try:
+            found = await guild.query_members(user_ids=user_ids, cache=False)
+        except (asyncio.TimeoutError, discord.ClientException, RuntimeError) as e:
+            # Bez odświeżenia: kolejny render listy (przy następnej zmianie) spróbuje ponownie.
+            self.failures += 1
+            print(f"Błąd pobierania {len(user_ids)} członków serwera {guild.id}: {e!r}")
+            return
+        finally:
+            self._inflight.difference_update((guild.id, uid) for uid in user_ids)
+        missing = set(user_ids)
+        for member in found:
+            missing.discard(member.id)
+            self._store((guild.id, member.id), member)
+        for uid in missing:
+            self._store((guild.id, uid), None)
+        self.found += len(found)
+        self.not_found += len(missing)
+        member_lines.touch(guild.id)
+        resolved = set(user_ids)
+        for registry in (captures, airdrops):
+            for record in registry.in_guild(guild.id).values():
+                if any(uid in record.participants for uid in resolved):
+                    refresh_enrollment_message(record, RestQueue.COSMETIC)
+
+member_cache = MemberCache(MEMBER_CACHE == "lazy", MEMBER_CACHE_SIZE, MEMBER_FETCH_WINDOW)
+
+# --- Pamięć podręczna linii uczestników ---
+class MemberLineCache:
+    """Wyrenderowane linie `mention | **nick**` per serwer, kluczowane id użytkownika.
+    `None` oznacza, że użytkownika nie ma na serwerze. Każda unieważniona pozycja
+    podbija generację serwera, po której listy poznają, że muszą się przeskładać.
+    Członek jeszcze dociągany (tryb leniwy) dostaje linię zastępczą, która nie jest
+    zapamiętywana - po dociągnięciu `touch` podbija generację."""
+
+    def __init__(self):
+        self._guilds = {}
+        self._generations = {}
+
+    def generation(self, guild_id: int) -> int:
+        return self._generations.get(guild_id, 0)
+
+    def get(self, guild: discord.Guild, user_id: int):
+        lines = self._guilds.setdefault(guild.id, {})
+        try:
+            return lines[user_id]
+        except KeyError:
+            pass
+        member = member_cache.get(guild, user_id)
+        if member is MemberCache.PENDING:
+            return f"<@{user_id}> (wczytywanie…)"
+        line = f"{member.mention} | **{member.display_name}**" if member else None
+        lines[user_id] = line
+        return line
+
+    def touch(self, guild_id: int):
+        self._generations[guild_id] = self.generation(guild_id) + 1
+
+    def discard(self, guild_id: int, user_ids):
+        """Zapomina linie osób spoza list (bez podbijania generacji - żadna lista ich nie pokazuje)."""
+        lines = self._guilds.get(guild_id)
+        if lines:
+            for uid in user_ids:
+                lines.pop(uid, None)
+
+    def invalidate(self, guild_id: int, user_id: int):
+        lines = self._guilds.get(guild_id)
+        if lines is not None and user_id in lines:
+            del lines[user_id]
+            self._generations[guild_id] = self.generation(guild_id) + 1
+
+    def invalidate_user(self, user_id: int):
+        for guild_id in list(self._guilds):
+            self.invalidate(guild_id, user_id)
+
+member_lines = MemberLineCache()
+
+def participant_line(guild: discord.Guild, user_id: int) -> str:
+    line = member_lines.get(guild, user_id)
+    if line is None:
+        return f"- <@{user_id}> (Użytkownik opuścił serwer)"
+    return f"- {line}"
+
+# --- Układ list w embedach (limity Discorda) ---
+EMBED_FIELD_LIMIT = 1024
+EMBED_TOTAL_LIMIT = 6000
+EMBED_MAX_FIELDS = 25
+# Zapas na tytuł strony / notkę o ukrytych osobach.
+EMBED_PAGE_RESERVE = 200
+
+def pack_lines(lines, limit: int = EMBED_FIELD_LIMIT, chunks: list = None) -> list:
+    """Pakuje linie (zachłannie) w bloki po max `limit` znaków. Gdy podano `chunks`,
+    dopisuje do nich - ostatni blok jest dopełniany, reszta zostaje nietknięta."""
+    chunks = [] if chunks is None else chunks
+    for line in lines:
+        line = line[:limit]
+        if chunks and len(chunks[-1]) + 1 + len(line) <= limit:
+            chunks[-1] = f"{chunks[-1]}\n{line}"
+        else:
+            chunks.append(line)
+    return chunks
+
+def paginate_chunks(chunks: list) -> list:
+    """Grupuje bloki w strony mieszczące się w jednym embedzie (6000 znaków, 25 pól)."""
+    pages = [[]]
+    size = 0
+    for chunk in chunks:
+        cost = len(chunk) + 1
+        if pages[-1] and (size + cost > EMBED_TOTAL_LIMIT - EMBED_PAGE_RESERVE or len(pages[-1]) >= EMBED_MAX_FIELDS):
+            pages.append([])
+            size = 0
+        pages[-1].append(chunk)
+        size += cost
+    return pages
+
+# Notka o ukrytych liniach; odsyłacz do przycisku 📄 tylko tam, gdzie widok go ma.
+HIDDEN_NOTE = "… i jeszcze **{hidden}** os."
+FULL_LIST_NOTE = HIDDEN_NOTE + " — pełna lista pod przyciskiem 📄"
+
+def add_list_fields(embed: discord.Embed, title: str, chunks: list, note: str = HIDDEN_NOTE) -> int:
+    """Dokłada bloki jako kolejne pola, dopóki mieści się budżet embeda. Gdy wszystko
+    się nie zmieści, dodaje notkę `note` z liczbą ukrytych linii (`{hidden}`). Zwraca
+    liczbę dodanych bloków."""
+    budget = EMBED_TOTAL_LIMIT - len(embed) - EMBED_PAGE_RESERVE
+    added = 0
+    for chunk in chunks:
+        name = title if added == 0 else "\u200b"
+        cost = len(name) + len(chunk)
+        if cost > budget or len(embed.fields) >= EMBED_MAX_FIELDS - 1:
+            break
+        embed.add_field(name=name, value=chunk, inline=False)
+        budget -= cost
+        added += 1
+    if added < len(chunks):
+        hidden = sum(chunk.count("\n") + 1 for chunk in chunks[added:])
+        embed.add_field(name="\u200b", value=note.format(hidden=hidden), inline=False)
+    return added
+
+# --- Lista uczestników ---
+class Roster:
+    """Uporządkowany zbiór id uczestników (kolejność zapisu), O(1) dla `in`, add i discard.
+    Id trzymane są w tablicy int64; usunięte sloty (0) są zwijane przy kompaktowaniu."""
+
+    __slots__ = ("_ids", "_index", "_holes", "_chunks", "_pages", "_render_key", "_rendered_upto", "version")
+
+    def __init__(self, user_ids=()):
+        self.version = 0  # podbijana przy każdej zmianie - po niej widoki poznają nieaktualny stan
+        self._ids = array("q")
+        self._index = {}
+        self._holes = 0
+        self._chunks = None
+        self._pages = None
+        self._render_key = None
+        self._rendered_upto = 0
+        for uid in user_ids:
+            self.add(uid)
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __iter__(self):
+        for uid in self._ids:
+            if uid:
+                yield uid
+
+    def __repr__(self) -> str:
+        return f"Roster({list(self)!r})"
+
+    def add(self, user_id: int) -> bool:
+        if user_id in self._index:
+            return False
+        self._index[user_id] = len(self._ids)
+        self._ids.append(user_id)
+        self.version += 1
+        return True
+
+    def discard(self, user_id: int) -> bool:
+        pos = self._index.pop(user_id, None)
+        if pos is None:
+            return False
+        self._ids[pos] = 0
+        self._holes += 1
+        self.version += 1
+        if pos < self._rendered_upto:
+            self._chunks = None
+        if self._holes > 32 and self._holes * 2 > len(self._ids):
+            self._compact()
+        return True
+
+    def replace(self, user_ids):
+        self.version += 1
+        self._ids = array("q")
+        self._index = {}
+        self._holes = 0
+        self._chunks = None
+        for uid in user_ids:
+            self.add(uid)
+
+    def _compact(self):
+        self._ids = array("q", (uid for uid in self._ids if uid))
+        self._index = {uid: pos for pos, uid in enumerate(self._ids)}
+        self._holes = 0
+        self._chunks = None
+
+    def chunks(self, guild: discord.Guild) -> list:
+        """Linie `- mention | **nick**` spakowane w bloki pól embeda, utrzymywane przyrostowo:
+        nowe zapisy dopełniają ostatni blok, a po wypisaniu lub zmianie nicku bloki
+        są składane od nowa z pamięci podręcznej linii."""
+        key = (guild.id, member_lines.generation(guild.id))
+        if self._chunks is None or self._render_key != key:
+            self._chunks = pack_lines(participant_line(guild, uid) for uid in self)
+            self._render_key = key
+            self._pages = None
+        elif self._rendered_upto < len(self._ids):
+            pack_lines((participant_line(guild, uid) for uid in self._ids[self._rendered_upto:] if uid), chunks=self._chunks)
+            self._pages = None
+        self._rendered_upto = len(self._ids)
+        return self._chunks
+
+    def pages(self, guild: discord.Guild) -> list:
+        chunks = self.chunks(guild)
+        if self._pages is None:
+            self._pages = paginate_chunks(chunks)
+        return self._pages
+
+# --- Indeks aktywnych zapisów (autouzupełnianie w wpisz/wypisz) ---
+DISCORD_EPOCH_MS = 1420070400000
+_FOLD = str.maketrans("ąćęłńóśźż", "acelnoszz")
+
+def snowflake_seconds(snowflake: int) -> int:
+    return ((snowflake >> 22) + DISCORD_EPOCH_MS) // 1000
+
+def fold(text: str) -> str:
+    """Małe litery bez polskich znaków - "Dziś" i "dzis" pasują do siebie."""
+    return text.lower().translate(_FOLD)
+
+class IndexEntry:
+    __slots__ = ("kind", "msg_id", "guild_id", "channel_id", "start", "day", "hhmm", "data", "words", "label_head")
+
+    def __init__(self, kind: str, msg_id: int, data: dict):
+        self.kind = kind
+        self.msg_id = msg_id
+        self.guild_id = data.guild_id
+        self.channel_id = data.channel_id
+        # Zapisy bez terminu (eventy) porządkujemy po czasie utworzenia wiadomości.
+        self.start = data.timestamp or snowflake_seconds(msg_id)
+        local = datetime.fromtimestamp(self.start, POLAND_TZ)
+        self.day = local.date().toordinal()
+        self.hhmm = local.strftime("%H:%M")
+        self.data = data
+        self.words = ()
+        self.label_head = None
+
+class _GuildIndex:
+    """Indeks jednego serwera: kolejność po starcie + słowa kluczowe -> id wiadomości."""
+
+    __slots__ = ("order", "entries", "by_word", "sorted_words", "unresolved")
+
+    def __init__(self):
+        self.order = []          # posortowane (start, msg_id)
+        self.entries = {}        # msg_id -> IndexEntry
+        self.by_word = {}        # słowo -> {msg_id}
+        self.sorted_words = []   # klucze by_word posortowane (wyszukiwanie prefiksów przez bisect)
+        self.unresolved = set()  # wpisy, których kanału nie było jeszcze w pamięci
+
+    def link_words(self, entry: IndexEntry, words):
+        for word in words:
+            ids = self.by_word.get(word)
+            if ids is None:
+                ids = self.by_word[word] = set()
+                bisect.insort(self.sorted_words, word)
+            ids.add(entry.msg_id)
+        entry.words += tuple(words)
+
+    def unlink_words(self, entry: IndexEntry):
+        for word in entry.words:
+            ids = self.by_word.get(word)
+            if ids is None:
+                continue
+            ids.discard(entry.msg_id)
+            if not ids:
+                del self.by_word[word]
+                del self.sorted_words[bisect.bisect_left(self.sorted_words, word)]
+
+    def prefix(self, word: str) -> set:
+        words, found = self.sorted_words, set()
+        i = bisect.bisect_left(words, word)
+        while i < len(words) and words[i].startswith(word):
+            found |= self.by_word[words[i]]
+            i += 1
+        return found
+
+class EnrollmentIndex:
+    """Aktywne zapisy (captures, airdrop, eventy) per serwer: kolejność po terminie startu
+    i odwrócony indeks słów (typ, kanał, tytuł/opis, autor, ID). Aktualizowany przy każdym
+    dodaniu/usunięciu w `GuildPartitioned`, więc zapytanie autouzupełniania tylko
+    przecina gotowe zbiory i przechodzi po kolejności.
+
+    Słowa zapytania (wszystkie muszą pasować): typ ("capt", "airdrop", "cayo"),
+    dzień ("dziś", "jutro", "wczoraj", "27.09"), godzina ("21:", "21:30"),
+    a pozostałe jako prefiks słów kanału, tytułu/opisu, autora albo ID wiadomości."""
+
+    KIND_NAMES = {"captures": "Captures", "airdrop": "AirDrop", "zancudo": "Zancudo", "cayo": "Cayo"}
+    KIND_KEYWORDS = {"captures": ("captures",), "airdrop": ("airdrop",), "zancudo": ("zancudo", "event"), "cayo": ("cayo", "event")}
+    DAY_WORDS = {"dzis": 0, "dzisiaj": 0, "jutro": 1, "wczoraj": -1}
+    TIME_RE = re.compile(r"\d{1,2}:\d{0,2}$")
+    DATE_RE = re.compile(r"(\d{1,2})\.(\d{1,2})\.?$")
+    SPLIT_RE = re.compile(r"[\s\-_#.,:]+")
+
+    def __init__(self):
+        self._guilds = {}
+
+    @classmethod
+    def _split(cls, *texts) -> list:
+        return [w for text in texts if text for w in cls.SPLIT_RE.split(fold(text)) if w]
+
+    def add(self, kind: str, msg_id: int, data: dict):
+        entry = IndexEntry(kind, msg_id, data)
+        self.discard(msg_id, entry.guild_id)
+        index = self._guilds.get(entry.guild_id)
+        if index is None:
+            index = self._guilds[entry.guild_id] = _GuildIndex()
+        index.entries[msg_id] = entry
+        bisect.insort(index.order, (entry.start, msg_id))
+        words = self._split(data.title, data.author_name)
+        index.link_words(entry, (*self.KIND_KEYWORDS[kind], *words, str(msg_id)))
+        if entry.channel_id:
+            index.unresolved.add(msg_id)
+
+    def discard(self, msg_id: int, guild_id: int):
+        index = self._guilds.get(guild_id)
+        if index is None or msg_id not in index.entries:
+            return
+        entry = index.entries.pop(msg_id)
+        index.unlink_words(entry)
+        index.unresolved.discard(msg_id)
+        i = bisect.bisect_left(index.order, (entry.start, msg_id))
+        if i < len(index.order) and index.order[i][1] == msg_id:
+            del index.order[i]
+        if not index.entries:
+            del self._guilds[guild_id]
+
+    def count(self, guild_id: int) -> int:
+        index = self._guilds.get(guild_id)
+        return len(index.entries) if index else 0
+
+    def _resolve_channels(self, index: _GuildIndex, guild):
+        """Nazwy kanałów dokładamy, gdy kanał jest już w pamięci (po starcie bota może go jeszcze nie być)."""
+        for msg_id in list(index.unresolved):
+            entry = index.entries[msg_id]
+            channel = guild.get_channel(entry.channel_id)
+            if channel is not None:
+                index.link_words(entry, self._split(channel.name))
+                index.unresolved.discard(msg_id)
+
+    def search(self, guild, query: str, limit: int = 25, now: float = None) -> list:
+        """Najlepsze dopasowania: najpierw nadchodzące (od najbliższego), potem starsze."""
+        index = self._guilds.get(guild.id if guild else None)
+        if index is None:
+            return []
+        if index.unresolved and guild is not None:
+            self._resolve_channels(index, guild)
+        now = time.time() if now is None else now
+        today = datetime.fromtimestamp(now, POLAND_TZ).date()
+        days, times, candidates = set(), [], None
+        for token in fold(query).split():
+            if token in self.DAY_WORDS:
+                days.add(today.toordinal() + self.DAY_WORDS[token])
+            elif self.TIME_RE.match(token):
+                hour, _, minute = token.partition(":")
+                times.append(f"{int(hour):02d}:{minute}")
+            elif (m := self.DATE_RE.match(token)):
+                try:
+                    days.add(today.replace(month=int(m.group(2)), day=int(m.group(1))).toordinal())
+                except ValueError:
+                    return []
+            else:
+                for word in self._split(token):
+                    found = index.prefix(word)
+                    candidates = found if candidates is None else candidates & found
+                    if not candidates:
+                        return []
+
+        # Od pierwszego wpisu, który jeszcze się nie zaczął (lub zaczął do 3 h temu), potem wstecz.
+        order, entries = index.order, index.entries
+        split = bisect.bisect_left(order, (int(now) - 3 * 3600, 0))
+        results = []
+        for _, msg_id in itertools.chain(order[split:], reversed(order[:split])):
+            if candidates is not None and msg_id not in candidates:
+                continue
+            entry = entries[msg_id]
+            if days and entry.day not in days:
+                continue
+            if times and not all(entry.hhmm.startswith(t) for t in times):
+                continue
+            results.append(entry)
+            if len(results) >= limit:
+                break
+        return results
+
+    def label(self, entry: IndexEntry, guild) -> str:
+        """Etykieta opcji (Discord: do 100 znaków); stała część liczona raz, dochodzi liczba osób."""
+        if entry.label_head is None:
+            channel = guild.get_channel(entry.channel_id) if guild and entry.channel_id else None
+            parts = [self.KIND_NAMES[entry.kind], datetime.fromtimestamp(entry.start, POLAND_TZ).strftime("%d.%m %H:%M")]
+            if channel:
+                parts.append(f"#{channel.name}")
+            title = entry.data.title or entry.data.author_name
+            if title:
+                parts.append(title)
+            head = " • ".join(parts)[:85]
+            if channel is None and entry.channel_id:
+                return f"{head} ({len(entry.data.participants)} os.)"
+            entry.label_head = head
+        return f"{entry.label_head} ({len(entry.data.participants)} os.)"
+
+enrollment_index = EnrollmentIndex()
+
+# --- Rekordy zapisów: same id, znaczniki czasu, tytuł i lista - bez obiektów API Discorda ---
+class MessageRecord:
+    """Wspólna część rekordów ogłoszeń. Wiadomość nie jest przechowywana: `message`
+    składa `PartialMessage` z id kanału i wiadomości przy każdym użyciu (wystarcza do
+    edycji i pobrania), zamiast trzymać pełny `discord.Message` z embedami i autorem.
+
+    `FIELDS` to pola zapisywane w kolumnie JSON bazy (z wartościami domyślnymi);
+    id, serwer, kanał i lista mają w bazie własne kolumny/tabelę."""
+
+    __slots__ = ("message_id", "guild_id", "channel_id", "participants", "author_name")
+
+    kind = None
+    FIELDS = {"author_name": None}
+
+    def __init__(self, message_id: int, guild_id: int, channel_id: int, participants=(), **fields):
+        self.message_id = message_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.participants = participants if isinstance(participants, Roster) else Roster(participants)
+        for field, default in self.FIELDS.items():
+            setattr(self, field, fields.get(field, default))
+
+    @property
+    def message(self):
+        return partial_message(self)
 
-def get_all_active_enrollments():
+    def payload(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.message_id}, guild={self.guild_id}, {len(self.participants)} os.)"
+
+class EnrollmentRecord(MessageRecord):
+    """Zapis z cyklem życia (open -> started -> closed; patrz `EnrollmentLifecycle`)."""
+
+    __slots__ = ("timestamp", "started", "closed_at")
+
+    FIELDS = {**MessageRecord.FIELDS, "timestamp": None, "started": False, "closed_at": None}
+    title = None
+
+class CaptureRecord(EnrollmentRecord):
+    __slots__ = ("image_url",)
+
+    kind = "captures"
+    FIELDS = {**EnrollmentRecord.FIELDS, "image_url": None}
+
+class AirdropRecord(EnrollmentRecord):
+    __slots__ = ("description", "voice_channel_id")
+
+    kind = "airdrop"
+    FIELDS = {**EnrollmentRecord.FIELDS, "description": "", "voice_channel_id": None}
+
+    @property
+    def title(self) -> str:
+        return self.description
+
+class EventRecord(EnrollmentRecord):
+    __slots__ = ("kind",)
+
+    def __init__(self, kind: str, message_id: int, guild_id: int, channel_id: int, participants=(), **fields):
+        self.kind = kind
+        super().__init__(message_id, guild_id, channel_id, participants, **fields)
+
+class SquadRecord(MessageRecord):
+    __slots__ = ("role_id", "title")
+
+    kind = "squad"
+    FIELDS = {**MessageRecord.FIELDS, "role_id": None, "title": None}
+
+def make_record(kind: str, message_id: int, guild_id: int, channel_id: int, participants=(), **fields) -> MessageRecord:
+    """Rekord odpowiedniego typu dla rodzaju z bazy ("captures", "airdrop", "squad", "zancudo", "cayo")."""
+    record_type = RECORD_TYPES.get(kind)
+    if record_type is None:
+        return EventRecord(kind, message_id, guild_id, channel_id, participants, **fields)
+    return record_type(message_id, guild_id, channel_id, participants, **fields)
+
+RECORD_TYPES = {"captures": CaptureRecord, "airdrop": AirdropRecord, "squad": SquadRecord}
+
+# --- Pamięć zapisów (podzielona na serwery) ---
+class GuildPartitioned(MutableMapping):
+    """Zapisy jednego rodzaju: id wiadomości -> rekord, z podziałem według `guild_id`.
+    Wyszukiwanie po id wiadomości zostaje O(1), a listy i skany idą przez
+    `in_guild(guild_id)`, więc serwer nigdy nie przegląda zapisów innego serwera."""
+
+    __slots__ = ("_all", "_guilds", "kind", "index")
+
+    def __init__(self, kind: str = None, index: EnrollmentIndex = None):
+        self._all = {}
+        self._guilds = {}
+        self.kind = kind
+        self.index = index
+
+    def __getitem__(self, msg_id):
+        return self._all[msg_id]
+
+    def get(self, msg_id, default=None):
+        return self._all.get(msg_id, default)
+
+    def __contains__(self, msg_id):
+        return msg_id in self._all
+
+    def __setitem__(self, msg_id, data):
+        old = self._all.get(msg_id)
+        if old is not None and old.guild_id != data.guild_id:
+            self._unlink(msg_id, old)
+        self._all[msg_id] = data
+        self._guilds.setdefault(data.guild_id, {})[msg_id] = data
+        if self.index is not None:
+            self.index.add(self.kind, msg_id, data)
+
+    def __delitem__(self, msg_id):
+        self._unlink(msg_id, self._all.pop(msg_id))
+
+    def _unlink(self, msg_id, data):
+        guild_id = data.guild_id
+        if self.index is not None:
+            self.index.discard(msg_id, guild_id)
+        partition = self._guilds.get(guild_id)
+        if partition is not None:
+            partition.pop(msg_id, None)
+            if not partition:
+                del self._guilds[guild_id]
+
+    def __iter__(self):
+        return iter(self._all)
+
+    def __len__(self):
+        return len(self._all)
+
+    def items(self):
+        return self._all.items()
+
+    def values(self):
+        return self._all.values()
+
+    def clear(self):
+        for msg_id, data in list(self._all.items()):
+            self._unlink(msg_id, data)
+        self._all.clear()
+        self._guilds.clear()
+
+    def in_guild(self, guild_id) -> dict:
+        """Zapisy jednego serwera (tylko do odczytu - zmiany przez ten obiekt)."""
+        return self._guilds.get(guild_id) or {}
+
+captures = GuildPartitioned("captures", enrollment_index)
+airdrops = GuildPartitioned("airdrop", enrollment_index)
+events = {"zancudo": GuildPartitioned("zancudo", enrollment_index), "cayo": GuildPartitioned("cayo", enrollment_index)}
+squads = GuildPartitioned()
+ENROLLMENT_KINDS = {"captures": captures, "airdrop": airdrops, **events}
+
+# =====================
+#       TRWAŁY MAGAZYN (SQLite, write-behind)
+# =====================
+class EnrollmentStore:
+    """Zapisy w SQLite (WAL). Mutacje trafiają do kolejki i są zapisywane paczkami
+    w wątku roboczym, więc kliknięcia nigdy nie czekają na dysk. Nieudana paczka wraca
+    na początek kolejki (w wątku pętli); po STORE_MAX_RETRIES porażkach z rzędu jest
+    zapisywana pojedynczo, a operacje, które nadal zawodzą, lądują w `dead_letters`."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS enrollments (
+            message_id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            data TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS participants (
+            message_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (message_id, user_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS participants_order ON participants (message_id, position);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS guild_config (
+            guild_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS archive (
+            message_id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            data TEXT NOT NULL,
+            participants TEXT NOT NULL,
+            archived_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._position = 0
+        self._failures = 0
+        self.dead_letters = []
+
+    def open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")  # procesy shardów dzielą ten plik
+        conn.executescript(self.SCHEMA)
+        self._conn = conn
+        self._position = conn.execute("SELECT COALESCE(MAX(position), 0) FROM participants").fetchone()[0]
+
+    def close(self):
+        self.flush_sync()
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    # --- API mutacji (tylko kolejkowanie, bez I/O) ---
+    def upsert(self, record: MessageRecord):
+        self._pending.append((
+            "upsert", record.message_id, record.kind, record.guild_id, record.channel_id,
+            json.dumps(record.payload()), time.time(),
+        ))
+
+    def add_participant(self, message_id: int, user_id: int):
+        self._position += 1
+        self._pending.append(("add", message_id, user_id, self._position))
+
+    def remove_participant(self, message_id: int, user_id: int):
+        self._pending.append(("remove", message_id, user_id))
+
+    def set_participants(self, message_id: int, user_ids):
+        rows = []
+        for uid in user_ids:
+            self._position += 1
+            rows.append((message_id, uid, self._position))
+        self._pending.append(("replace", message_id, rows))
+
+    def delete(self, message_id: int):
+        self._pending.append(("delete", message_id))
+
+    def archive(self, record: MessageRecord):
+        """Przenosi zapis (z listą uczestników) do tabeli archive w jednej transakcji."""
+        self._pending.append((
+            "archive", record.message_id, record.kind, record.guild_id, record.channel_id,
+            json.dumps(record.payload()), json.dumps(list(record.participants)), time.time(),
+        ))
+
+    # --- Zapis paczek ---
+    async def flush(self):
+        if not self._pending or not self._conn:
+            return 0
+        batch, self._pending = self._pending, []
+        if self._failures >= STORE_MAX_RETRIES:
+            failed = await asyncio.to_thread(self._apply_each, batch)
+            return self._isolated(batch, failed)
+        try:
+            await asyncio.to_thread(self._apply, batch)
+        except Exception:
+            self._requeue(batch)
+            raise
+        self._failures = 0
+        return len(batch)
+
+    def flush_sync(self):
+        if not self._pending or not self._conn:
+            return 0
+        batch, self._pending = self._pending, []
+        if self._failures >= STORE_MAX_RETRIES:
+            return self._isolated(batch, self._apply_each(batch))
+        try:
+            self._apply(batch)
+        except Exception:
+            self._requeue(batch)
+            raise
+        self._failures = 0
+        return len(batch)
+
+    def _requeue(self, batch):
+        # Nie gubimy paczki - wraca na początek kolejki (przed mutacje dopisane w trakcie zapisu).
+        self._pending[:0] = batch
+        self._failures += 1
+
+    def _isolated(self, batch, failed) -> int:
+        self._failures = 0
+        for op, error in failed:
+            print(f"Błąd zapisu do bazy, pomijam operację {op!r}: {error}")
+            self.dead_letters.append(op)
+        return len(batch) - len(failed)
+
+    def _apply(self, batch):
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                for op in batch:
+                    self._execute(cur, op)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def _apply_each(self, batch) -> list:
+        """Każda operacja we własnej transakcji; zwraca [(operacja, błąd)] tych, które zawiodły."""
+        failed = []
+        with self._lock:
+            cur = self._conn.cursor()
+            for op in batch:
+                cur.execute("BEGIN")
+                try:
+                    self._execute(cur, op)
+                    cur.execute("COMMIT")
+                except Exception as e:
+                    cur.execute("ROLLBACK")
+                    failed.append((op, e))
+        return failed
+
+    @staticmethod
+    def _execute(cur, op):
+        kind = op[0]
+        if kind == "add":
+            cur.execute("INSERT OR IGNORE INTO participants VALUES (?, ?, ?)", op[1:])
+        elif kind == "remove":
+            cur.execute("DELETE FROM participants WHERE message_id = ? AND user_id = ?", op[1:])
+        elif kind == "upsert":
+            cur.execute(
+                "INSERT INTO enrollments VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(message_id) DO UPDATE SET kind = excluded.kind, "
+                "guild_id = COALESCE(excluded.guild_id, guild_id), "
+                "channel_id = COALESCE(excluded.channel_id, channel_id), data = excluded.data",
+                op[1:],
+            )
+        elif kind == "replace":
+            cur.execute("DELETE FROM participants WHERE message_id = ?", (op[1],))
+            cur.executemany("INSERT OR IGNORE INTO participants VALUES (?, ?, ?)", op[2])
+        elif kind == "delete":
+            cur.execute("DELETE FROM participants WHERE message_id = ?", (op[1],))
+            cur.execute("DELETE FROM enrollments WHERE message_id = ?", (op[1],))
+        elif kind == "archive":
+            cur.execute("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?, ?, ?)", op[1:])
+            cur.execute("DELETE FROM participants WHERE message_id = ?", (op[1],))
+            cur.execute("DELETE FROM enrollments WHERE message_id = ?", (op[1],))
+
+    # --- Metadane (odczyt/zapis bezpośredni, poza kolejką) ---
+    def get_meta(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    # --- Konfiguracja serwerów (rzadkie zmiany, zapis od razu) ---
+    def load_guild_configs(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT guild_id, data FROM guild_config").fetchall()
+        return {guild_id: json.loads(data) for guild_id, data in rows}
+
+    def save_guild_config(self, guild_id: int, data: dict, version: str):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("INSERT OR REPLACE INTO guild_config VALUES (?, ?, ?)", (guild_id, json.dumps(data), time.time()))
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('guild_config_version', ?)", (version,))
+            self._conn.execute("COMMIT")
+
+    # --- Odczyt przy starcie ---
+    def load_all(self):
+        """Jeden odczyt zbiorczy: wszystkie zapisy wraz z uczestnikami (w kolejności zapisu)."""
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            rows = cur.execute("SELECT message_id, kind, guild_id, channel_id, data FROM enrollments").fetchall()
+            members = cur.execute("SELECT message_id, user_id FROM participants ORDER BY message_id, position").fetchall()
+            cur.execute("COMMIT")
+        by_message = {}
+        for message_id, user_id in members:
+            by_message.setdefault(message_id, []).append(user_id)
+        return [
+            (kind, message_id, guild_id, channel_id, json.loads(data), by_message.get(message_id, []))
+            for message_id, kind, guild_id, channel_id, data in rows
+        ]
+
+store = EnrollmentStore(DB_PATH)
+
+def load_enrollments_from_store():
+    restored = skipped = 0
+    for kind, msg_id, guild_id, channel_id, data, user_ids in store.load_all():
+        if not owns_guild(guild_id):
+            skipped += 1
+            continue
+        enrollments = squads if kind == "squad" else ENROLLMENT_KINDS.get(kind)
+        if enrollments is None:
+            continue
+        enrollments[msg_id] = make_record(kind, msg_id, guild_id, channel_id, user_ids, **data)
+        restored += 1
+    print(f"✅ Wczytano {restored} zapisów z bazy ({store.path}).")
+    if skipped:
+        print(f"⏭️ Pominięto {skipped} zapisów serwerów z innych shardów (SHARD_IDS={SHARD_IDS}).")
+
+# =====================
+#       HISTORIA OBECNOŚCI
+# =====================
+class MemberStats:
+    """Bieżące agregaty jednego członka na jednym serwerze (+ ostatnie zdarzenia)."""
+
+    __slots__ = ("signups", "leaves", "picks", "passes", "no_shows", "streak", "best_streak", "last_ts", "last_pick", "history")
+
+    FIELDS = ("signups", "leaves", "picks", "passes", "no_shows", "streak", "best_streak", "last_ts", "last_pick")
+
+    def __init__(self, values=(), history=()):
+        for field, value in itertools.zip_longest(self.FIELDS, values, fillvalue=0):
+            setattr(self, field, value)
+        self.history = deque((tuple(item) for item in history), maxlen=ATTENDANCE_HISTORY)
+
+    def dump(self) -> list:
+        return [[getattr(self, field) for field in self.FIELDS], list(self.history)]
+
+class AttendanceLog:
+    """Dziennik zapisów/wypisów/picków w pliku tylko do dopisywania (rekordy po 30 B)
+    z agregatami liczonymi przyrostowo przy każdym zdarzeniu - `/stats` czyta tylko agregaty.
+
+    Kompaktowanie: gdy dziennik przekroczy `ATTENDANCE_COMPACT_BYTES`, agregaty trafiają
+    do migawki z numerem generacji, a dziennik zaczyna się od nowa z tym numerem w nagłówku.
+    Przy starcie: migawka + zdarzenia dziennika tej samej generacji (starszy dziennik
+    oznacza awarię w trakcie kompaktowania - jego zdarzenia są już w migawce).
+
+    Pick: wybrani dostają +1 do picków i serii, zapisani, ale niewybrani - `PASS` (seria
+    od zera). Wypis po picku to no-show. Zamknięcie zapisu zapomina jego stan."""
+
+    RECORD = struct.Struct("<IBBQQQ")  # czas, akcja, rodzaj zapisu, serwer, wiadomość, użytkownik
+    HEADER = struct.Struct("<8sQ")     # magia, generacja
+    MAGIC = b"OBECNOSC"
+    JOIN, LEAVE, PICK, PASS, CLOSE = 1, 2, 3, 4, 5
+    KINDS = ("captures", "airdrop", "zancudo", "cayo")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.snapshot_path = path + ".snap"
+        self.generation = 0
+        self.log_bytes = 0
+        self.guilds = {}      # guild_id -> {user_id: MemberStats}
+        self.decided = {}     # msg_id -> {user_id: PICK/PASS} dla zapisów jeszcze otwartych
+        self._buffer = bytearray()
+        self._file = None
+        self._lock = threading.Lock()
+
+    # --- Start / zamknięcie ---
+    def open(self):
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            snapshot = {"generation": 0, "guilds": {}, "decided": {}}
+        self.generation = snapshot["generation"]
+        self.guilds = {
+            int(gid): {int(uid): MemberStats(*item) for uid, item in members.items()}
+            for gid, members in snapshot["guilds"].items()
+        }
+        self.decided = {int(mid): {int(uid): action for uid, action in users.items()} for mid, users in snapshot["decided"].items()}
+
+        replayed = 0
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(self.HEADER.size)
+                magic, generation = self.HEADER.unpack(header) if len(header) == self.HEADER.size else (None, None)
+                if magic == self.MAGIC and generation == self.generation:
+                    body = f.read()
+                    usable = len(body) - len(body) % self.RECORD.size  # urwany ostatni rekord po awarii
+                    for record in self.RECORD.iter_unpack(body[:usable]):
+                        self._apply(*record)
+                        replayed += 1
+                    self.log_bytes = self.HEADER.size + usable
+        except FileNotFoundError:
+            pass
+        if not self.log_bytes:
+            self._rewrite_log(self.generation)
+        self._file = open(self.path, "r+b")
+        self._file.truncate(self.log_bytes)
+        self._file.seek(self.log_bytes)
+        members = sum(len(m) for m in self.guilds.values())
+        print(f"✅ Historia obecności: {members} członków, {replayed} zdarzeń z dziennika ({self.path}).")
+
+    def close(self):
+        self.flush_sync()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    # --- Zdarzenia (bez I/O - trafiają do bufora) ---
+    def record(self, action: int, kind: str, guild_id: int, msg_id: int, user_id: int, ts: int = None):
+        if not guild_id:
+            return
+        record = (int(time.time()) if ts is None else ts, action, self.KINDS.index(kind) if kind in self.KINDS else 255, guild_id, msg_id, user_id)
+        if self._apply(*record):
+            self._buffer += self.RECORD.pack(*record)
+
+    def record_pick(self, guild_id: int, msg_id: int, picked_ids, signed_up_ids):
+        picked = set(picked_ids)
+        for uid in picked:
+            self.record(self.PICK, "captures", guild_id, msg_id, uid)
+        for uid in signed_up_ids:
+            if uid not in picked:
+                self.record(self.PASS, "captures", guild_id, msg_id, uid)
+
+    def close_enrollment(self, guild_id: int, msg_id: int):
+        if msg_id in self.decided:
+            self.record(self.CLOSE, None, guild_id, msg_id, 0)
+
+    def _apply(self, ts, action, kind, guild_id, msg_id, user_id) -> bool:
+        """Nakłada zdarzenie na agregaty; False = zdarzenie bez skutku (nie trafia do dziennika)."""
+        if action == self.CLOSE:
+            return self.decided.pop(msg_id, None) is not None
+        decided = self.decided.get(msg_id, {})
+        if action in (self.PICK, self.PASS) and user_id in decided:
+            return False  # ponowne potwierdzenie picku liczy tylko nowe osoby
+        members = self.guilds.setdefault(guild_id, {})
+        stats = members.get(user_id)
+        if stats is None:
+            stats = members[user_id] = MemberStats()
+        if action == self.JOIN:
+            stats.signups += 1
+        elif action == self.LEAVE:
+            stats.leaves += 1
+            if decided.get(user_id) == self.PICK:
+                stats.no_shows += 1
+                stats.streak = 0
+                action = -self.PICK  # w historii jako no-show
+        elif action == self.PICK:
+            stats.picks += 1
+            stats.last_pick = ts
+            stats.streak += 1
+            stats.best_streak = max(stats.best_streak, stats.streak)
+            self.decided.setdefault(msg_id, {})[user_id] = action
+        elif action == self.PASS:
+            stats.passes += 1
+            stats.streak = 0
+            self.decided.setdefault(msg_id, {})[user_id] = action
+        stats.last_ts = ts
+        stats.history.append((ts, action, kind, msg_id))
+        return True
+
+    # --- Odczyt dla /stats ---
+    def member(self, guild_id: int, user_id: int):
+        return self.guilds.get(guild_id, {}).get(user_id)
+
+    def leaderboard(self, guild_id: int, field: str, limit: int = 10) -> list:
+        members = self.guilds.get(guild_id, {})
+        return heapq.nlargest(limit, members.items(), key=lambda item: (getattr(item[1], field), item[1].last_ts))
+
+    # --- Zapis na dysk ---
+    async def flush(self):
+        if self._file is None:
+            return
+        if self.log_bytes + len(self._buffer) >= ATTENDANCE_COMPACT_BYTES:
+            # Migawka i wyczyszczenie bufora w jednym kroku pętli: zdarzenia z bufora są już w migawce.
+            snapshot = self._snapshot(self.generation + 1)
+            self._buffer = bytearray()
+            await asyncio.to_thread(self._compact, snapshot)
+        elif self._buffer:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            await asyncio.to_thread(self._append, data)
+
+    def flush_sync(self):
+        if self._file is not None and self._buffer:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            self._append(data)
+
+    def _append(self, data: bytes):
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            self.log_bytes += len(data)
+
+    def _snapshot(self, generation: int) -> dict:
+        return {
+            "generation": generation,
+            "guilds": {gid: {uid: stats.dump() for uid, stats in members.items()} for gid, members in self.guilds.items()},
+            "decided": {mid: dict(users) for mid, users in self.decided.items()},
+        }
+
+    def _compact(self, snapshot: dict):
+        with self._lock:
+            tmp = self.snapshot_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            self._file.close()
+            self._rewrite_log(snapshot["generation"])
+            self._file = open(self.path, "r+b")
+            self._file.seek(self.log_bytes)
+        print(f"🗜️ Skompaktowano historię obecności (generacja {self.generation}).")
+
+    def _rewrite_log(self, generation: int):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.generation = generation
+        self.log_bytes = self.HEADER.size
+
+attendance = AttendanceLog(ATTENDANCE_LOG.format("-" + "-".join(map(str, SHARD_IDS)) if SHARD_IDS else ""))
+
+@tasks.loop(seconds=STORE_FLUSH_SECONDS)
+async def flush_store():
+    try:
+        await store.flush()
+        await attendance.flush()
+    except Exception as e:
+        print(f"Błąd zapisu do bazy: {e}")
+        traceback.print_exc()
+
+def get_all_active_enrollments(guild_id: int):
     all_enrollments = []
-    for msg_id, data in captures.items():
+    for msg_id, data in captures.in_guild(guild_id).items():
         all_enrollments.append(("Captures", msg_id, data))
-    for msg_id, data in airdrops.items():
+    for msg_id, data in airdrops.in_guild(guild_id).items():
         all_enrollments.append(("AirDrop", msg_id, data))
     for etype, msgs in events.items():
-        for msg_id, data in msgs.items():
+        for msg_id, data in msgs.in_guild(guild_id).items():
             all_enrollments.append((etype.capitalize(), msg_id, data))
     return all_enrollments
 
+# =====================
+#       KONFIGURACJA SERWERÓW I UPRAWNIENIA
+# =====================
+class PickPolicy:
+    """Wagi auto-picku. Każda cecha jest sprowadzana do 0..1 (1 = lepiej):
+    zapis - wcześniej zapisani, obecnosc - picki minus podwójne no-show,
+    przerwa - dawno (albo nigdy) niepickowani, rola - wyższa rola na serwerze."""
+
+    FEATURES = {"join": "zapis", "attendance": "obecnosc", "rest": "przerwa", "role": "rola"}
+    REST_WINDOW = 7 * 24 * 3600  # po tym czasie od ostatniego picku "przerwa" daje pełne 1.0
+
+    @classmethod
+    def parse(cls, text: str) -> dict:
+        """"zapis=1 obecnosc=2 przerwa=0.5" -> wagi; pominięte cechy mają wagę 0."""
+        by_label = {label: key for key, label in cls.FEATURES.items()}
+        weights = dict.fromkeys(cls.FEATURES, 0.0)
+        pairs = re.findall(r"(\w+)\s*[=:]\s*(-?\d+(?:[.,]\d+)?)", fold(text))
+        if not pairs:
+            raise ValueError("Podaj wagi jako `zapis=1 obecnosc=2 przerwa=1 rola=0.5`.")
+        for label, weight in pairs:
+            if label not in by_label:
+                raise ValueError(f"Nieznana cecha `{label}` (dostępne: {', '.join(by_label)}).")
+            weights[by_label[label]] = float(weight.replace(",", "."))
+        return weights
+
+    @classmethod
+    def describe(cls, weights: dict) -> str:
+        return " ".join(f"{label}={weights.get(key, 0):g}" for key, label in cls.FEATURES.items())
+
+class GuildConfig:
+    """Ustawienia jednego serwera: wartości domyślne nadpisane tym, co zapisano w bazie."""
+
+    __slots__ = ("overrides", "admin_role_ids", "pick_role_ids", "admin_user_ids", "zancudo_image_url", "cayo_image_url", "logo_url", "autopick_weights", "autopick_size")
+
+    ID_FIELDS = ("admin_role_ids", "pick_role_ids", "admin_user_ids")
+    DEFAULTS = {
+        "admin_role_ids": [BOT_ADMIN_ROLE_ID],
+        "pick_role_ids": [PICK_ROLE_ID],
+        "admin_user_ids": [],
+        "zancudo_image_url": ZANCUDO_IMAGE_URL,
+        "cayo_image_url": CAYO_IMAGE_URL,
+        "logo_url": LOGO_URL,
+        "autopick_weights": {"join": 1.0, "attendance": 1.0, "rest": 1.0, "role": 0.5},
+        "autopick_size": 25,
+    }
+
+    def __init__(self, overrides: dict = None):
+        self.overrides = {k: v for k, v in (overrides or {}).items() if k in self.DEFAULTS}
+        for field, default in self.DEFAULTS.items():
+            value = self.overrides.get(field, default)
+            setattr(self, field, frozenset(int(v) for v in value) if field in self.ID_FIELDS else value)
+        self.autopick_weights = {**self.DEFAULTS["autopick_weights"], **self.autopick_weights}
+
+class GuildConfigRegistry:
+    """Konfiguracje wszystkich serwerów w pamięci. Zmiana zapisuje się w bazie razem
+    z nową wersją; pozostałe procesy shardów zauważają ją w `watch_guild_config`."""
+
+    def __init__(self):
+        self._configs = {}
+        self._default = GuildConfig()
+        self.version = None
+
+    def get(self, guild_id) -> GuildConfig:
+        return self._configs.get(guild_id, self._default)
+
+    async def reload(self):
+        raw, version = await asyncio.to_thread(lambda: (store.load_guild_configs(), store.get_meta("guild_config_version")))
+        self._configs = {guild_id: GuildConfig(data) for guild_id, data in raw.items()}
+        self.version = version
+        permissions.clear()
+
+    async def update(self, guild_id: int, field: str, value) -> GuildConfig:
+        """Ustawia (albo przy `value=None` przywraca domyślne) jedno pole i od razu zapisuje je w bazie."""
+        overrides = dict(self.get(guild_id).overrides)
+        if value is None:
+            overrides.pop(field, None)
+        else:
+            overrides[field] = value
+        config = GuildConfig(overrides)
+        version = str(time.time_ns())
+        await asyncio.to_thread(store.save_guild_config, guild_id, config.overrides, version)
+        self._configs[guild_id] = config
+        self.version = version
+        permissions.invalidate_guild(guild_id)
+        return config
+
+guild_configs = GuildConfigRegistry()
+
+class PermissionResolver:
+    """Efektywne uprawnienia członka jako zbiór nazw: "owner" (STATUS_ADMINS),
+    "admin", "pick" i "config". Liczone raz na członka i trzymane do zmiany jego ról,
+    ról serwera albo konfiguracji, więc samo sprawdzenie to dwa wyszukiwania w słownikach."""
+
+    def __init__(self):
+        self._cache = {}
+
+    @staticmethod
+    def compute(user, config: GuildConfig) -> frozenset:
+        role_ids = {role.id for role in getattr(user, "roles", ())}
+        perms = set()
+        if user.id in STATUS_ADMINS:
+            perms.update(("owner", "admin", "pick", "config"))
+        if user.id in config.admin_user_ids or not config.admin_role_ids.isdisjoint(role_ids):
+            perms.update(("admin", "pick"))
+        if not config.pick_role_ids.isdisjoint(role_ids):
+            perms.add("pick")
+        guild_permissions = getattr(user, "guild_permissions", None)
+        if guild_permissions is not None and guild_permissions.administrator:
+            perms.add("config")
+        return frozenset(perms)
+
+    def of(self, user, guild_id) -> frozenset:
+        by_guild = self._cache.get(guild_id)
+        if by_guild is None:
+            by_guild = self._cache[guild_id] = {}
+        perms = by_guild.get(user.id)
+        if perms is None:
+            perms = by_guild[user.id] = self.compute(user, guild_configs.get(guild_id))
+        return perms
+
+    def has(self, interaction: discord.Interaction, permission: str) -> bool:
+        return permission in self.of(interaction.user, interaction.guild_id)
+
+    def invalidate(self, guild_id: int, user_id: int):
+        by_guild = self._cache.get(guild_id)
+        if by_guild:
+            by_guild.pop(user_id, None)
+
+    def invalidate_guild(self, guild_id: int):
+        self._cache.pop(guild_id, None)
+
+    def clear(self):
+        self._cache.clear()
+
+permissions = PermissionResolver()
+
+@tasks.loop(seconds=CONFIG_POLL_SECONDS)
+async def watch_guild_config():
+    """Przeładowuje konfigurację, gdy inny proces podbił jej wersję w bazie."""
+    try:
+        version = await asyncio.to_thread(store.get_meta, "guild_config_version")
+        if version != guild_configs.version:
+            await guild_configs.reload()
+            print(f"🔄 Przeładowano konfigurację serwerów (wersja {guild_configs.version}).")
+    except Exception as e:
+        print(f"Błąd odczytu konfiguracji serwerów: {e}")
+
+# =====================
+#       METRYKI (format tekstowy Prometheusa)
+# =====================
+# Wszystko działa w wątku pętli zdarzeń, więc liczniki to zwykłe słowniki i listy - bez blokad.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+AUTOCOMPLETE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, value: float, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            # liczniki kubełków + [suma, liczba obserwacji]
+            series = self.values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), label_values + (repr(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels + ("le",), label_values + ("+Inf",))
+            yield f"{self.name}_bucket{labels} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]}"
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Gauge:
+    """Wartość liczona dopiero przy odczycie /metrics (funkcja zwraca liczbę albo słownik etykiety -> liczba)."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple, metric_type: str, func):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.type = metric_type
+        self.func = func
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+class Metrics:
+    """Rejestr metryk w kolejności rejestracji - /metrics renderuje wszystko, co w nim jest.
+    Nazwa musi być unikalna: dwa bloki `# TYPE` tej samej metryki unieważniają cały odczyt."""
+
+    def __init__(self):
+        self._registry = {}
+        self.interactions = self.counter("bot_interactions_total", "Obsłużone interakcje (komendy i komponenty).", ("name", "outcome"))
+        self.interaction_latency = self.histogram("bot_interaction_duration_seconds", "Czas obsługi interakcji.", ("name",))
+        self.edit_latency = self.histogram("bot_message_edit_latency_seconds", "Czas od pierwszej zmiany do wysłanej edycji.")
+        self.rate_limits = self.counter("bot_http_429_total", "Odpowiedzi 429 z API Discorda (route/global/webhook).", ("scope",))
+        self.scheduler_lag = self.histogram("bot_scheduler_lag_seconds", "Opóźnienie odpalenia terminu startu.", ("kind",))
+        self.ack_latency = self.histogram("bot_interaction_ack_seconds", "Czas od odebrania interakcji do potwierdzenia.", ("name", "mode"))
+        self.expired_interactions = self.counter("bot_interaction_expired_total", "Interakcje odrzucone jako wygasłe (10062).", ("name",))
+        self.autocomplete_latency = self.histogram("bot_autocomplete_seconds", "Czas odpowiedzi autouzupełniania.", ("option",), AUTOCOMPLETE_BUCKETS)
+        self.rest_requests = self.counter("bot_rest_requests_total", "Zapytania REST wg priorytetu (sent/superseded).", ("priority", "result"))
+        self.rest_wait = self.histogram("bot_rest_queue_wait_seconds", "Czas oczekiwania zapytania w kolejce REST.", ("priority",))
+
+    def _register(self, metric):
+        if metric.name in self._registry:
+            raise ValueError(f"Metryka {metric.name} jest już zarejestrowana.")
+        self._registry[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = (), metric_type: str = "gauge"):
+        """Rejestruje funkcję liczoną dopiero przy odczycie /metrics (nic nie kosztuje w gorącej ścieżce)."""
+        def decorator(func):
+            self._register(Gauge(name, help_text, labels, metric_type, func))
+            return func
+        return decorator
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._registry.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def instrumented(name: str):
+    """Mierzy liczbę i czas wywołań callbacku komendy/komponentu oraz pilnuje terminu
+    potwierdzenia: jeśli callback nie odpowie przed `ACK_DEADLINE_SECONDS - AUTO_DEFER_MARGIN`,
+    interakcja jest potwierdzana automatycznie, a stos callbacku trafia do logów."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            interaction = next((arg for arg in args if isinstance(arg, discord.Interaction)), None)
+            watchdog = None
+            if interaction is not None:
+                interaction.extras["name"] = name
+                interaction.extras["received_at"] = started_at
+                watchdog = asyncio.get_running_loop().call_later(
+                    max(0.0, ACK_DEADLINE_SECONDS - AUTO_DEFER_MARGIN), _auto_defer, interaction, asyncio.current_task()
+                )
+            outcome = "ok"
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                if watchdog:
+                    watchdog.cancel()
+                duration = time.perf_counter() - started_at
+                metrics.interactions.inc(name, outcome)
+                metrics.interaction_latency.observe(duration, name)
+                if duration >= SLOW_CALLBACK_SECONDS:
+                    print(f"🐢 Wolny callback {name}: {duration * 1000:.0f} ms (potwierdzenie: {interaction.extras.get('acked', 'brak') if interaction else '-'}).")
+        return wrapper
+    return decorator
+
+def _record_ack(interaction: discord.Interaction, mode: str):
+    received_at = interaction.extras.get("received_at")
+    if received_at is None or "acked" in interaction.extras:
+        return
+    interaction.extras["acked"] = mode
+    metrics.ack_latency.observe(time.perf_counter() - received_at, interaction.extras["name"], mode)
+
+def _coroutine_stack(task: asyncio.Task) -> str:
+    """Pełny łańcuch `await` zadania (Task.get_stack zwraca tylko jedną ramkę)."""
+    frames = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append((frame, frame.f_lineno))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return "".join(traceback.format_list(traceback.StackSummary.extract(frames)))
+
+def _auto_defer(interaction: discord.Interaction, task: asyncio.Task):
+    if interaction.response.is_done() or interaction.extras.get("acking"):
+        return
+    name = interaction.extras["name"]
+    stack = _coroutine_stack(task)
+    print(f"⏱️ Auto-defer {name}: brak potwierdzenia po {ACK_DEADLINE_SECONDS - AUTO_DEFER_MARGIN:.1f} s. Stos callbacku:\n{stack}")
+    if interaction.type == discord.InteractionType.application_command:
+        pending = interaction.response.defer(ephemeral=True, thinking=True)
+    else:
+        pending = interaction.response.defer()
+    interaction.extras["acking"] = True
+    interaction.extras["ack_task"] = asyncio.create_task(pending)
+    _record_ack(interaction, "auto")
+
+async def _wait_for_auto_defer(interaction: discord.Interaction):
+    interaction.extras["acking"] = True
+    pending = interaction.extras.get("ack_task")
+    if pending is not None:
+        try:
+            await pending
+        except discord.HTTPException as e:
+            print(f"Auto-defer {interaction.extras.get('name')} nie powiódł się: {e}")
+
+async def defer_once(interaction: discord.Interaction, **kwargs):
+    """`interaction.response.defer`, który nie koliduje z automatycznym potwierdzeniem."""
+    await _wait_for_auto_defer(interaction)
+    if not interaction.response.is_done():
+        await interaction.response.defer(**kwargs)
+        _record_ack(interaction, "callback")
+
+async def respond(interaction: discord.Interaction, *args, **kwargs):
+    """Odpowiedź na interakcję albo followup, jeśli została już potwierdzona."""
+    await _wait_for_auto_defer(interaction)
+    if interaction.response.is_done():
+        await interaction.followup.send(*args, **kwargs)
+    else:
+        await interaction.response.send_message(*args, **kwargs)
+        _record_ack(interaction, "callback")
+
+async def edit_origin(interaction: discord.Interaction, **kwargs):
+    """Edycja wiadomości z komponentem - przez odpowiedź albo (po defer) przez edit_original_response."""
+    await _wait_for_auto_defer(interaction)
+    if interaction.response.is_done():
+        await interaction.edit_original_response(**kwargs)
+    else:
+        await interaction.response.edit_message(**kwargs)
+        _record_ack(interaction, "callback")
+
+class RateLimitCounter(logging.Handler):
+    """Zlicza ostrzeżenia discord.py o 429 (biblioteka sama ponawia zapytania), każde raz:
+    "route" (REST bota), "global" albo "webhook" (odpowiedzi na interakcje i followupy).
+    Dopasowuje pełne formaty komunikatów discord.py 2.6.0; "Timeout ... erroring instead"
+    (429 bez ponowienia, kończy się RateLimited) nie jest liczone."""
+
+    ROUTE = "We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds."
+    GLOBAL = "Global rate limit has been hit. Retrying in %.2f seconds."
+    WEBHOOK = "Webhook ID %s is rate limited. Retrying in %.2f seconds."
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self._routes = 0
+
+    def emit(self, record: logging.LogRecord):
+        if record.msg == self.ROUTE:
+            # Globalne 429 discord.py loguje dwa razy pod rząd, bez await pomiędzy: najpierw jak
+            # zwykłe, potem GLOBAL. Zwykłe liczymy więc w następnej iteracji pętli, o ile nie
+            # okazało się globalnym - licznik nigdy nie maleje.
+            self._routes += 1
+            if self._routes == 1:
+                try:
+                    asyncio.get_running_loop().call_soon(self._count_routes)
+                except RuntimeError:
+                    self._count_routes()
+        elif record.msg == self.GLOBAL:
+            if self._routes:
+                self._routes -= 1
+            metrics.rate_limits.inc("global")
+        elif record.msg == self.WEBHOOK:
+            metrics.rate_limits.inc("webhook")
+
+    def _count_routes(self):
+        if self._routes:
+            metrics.rate_limits.inc("route", amount=self._routes)
+            self._routes = 0
+
+logging.getLogger("discord.http").addHandler(RateLimitCounter(logging.WARNING))
+logging.getLogger("discord.webhook.async_").addHandler(RateLimitCounter(logging.WARNING))
+
+class InteractionRecorder:
+    """Dopisuje każdą przychodzącą interakcję jako linię JSONL (INTERACTION_TRACE).
+    Plik służy do odtwarzania wieczoru zapisów na lokalnej atrapie Discorda
+    (benchmarks/replay.py)."""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self._file = None
+        self.recorded = 0
+
+    def open(self):
+        if self.path and self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            print(f"⏺️ Nagrywanie interakcji do {self.path}.")
+
+    def record(self, interaction: discord.Interaction):
+        if self._file is None:
+            return
+        data = interaction.data or {}
+        user = interaction.user
+        entry = {
+            "ts": round(time.time(), 4),
+            "id": str(interaction.id),
+            "type": interaction.type.value,
+            "name": data.get("custom_id") or data.get("name"),
+            "user_id": str(user.id),
+            "user_name": user.name,
+            "display_name": user.display_name,
+            "roles": [str(role.id) for role in getattr(user, "roles", [])[1:]],
+            "guild_id": str(interaction.guild_id) if interaction.guild_id else None,
+            "channel_id": str(interaction.channel_id) if interaction.channel_id else None,
+            "message_id": str(interaction.message.id) if interaction.message else None,
+            "data": data,
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.recorded += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            print(f"⏹️ Zapisano {self.recorded} interakcji do {self.path}.")
+
+recorder = InteractionRecorder(INTERACTION_TRACE)
+
+# =====================
+#       KOLEJKA ZAPYTAŃ REST (PRIORYTETY)
+# =====================
+MESSAGE_ROUTE = "/channels/{channel_id}/messages/{message_id}"
+
+class EditSuperseded(Exception):
+    """Edycja czekała w kolejce REST i została zastąpiona nowszą edycją tej samej wiadomości."""
+
+class _RestTicket:
+    __slots__ = ("priority", "seq", "route", "edit_key", "fields", "queued_at", "ready", "bucket", "dropped")
+
+    def __init__(self, priority: int, seq: int, route, queued_at: float):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.edit_key = None
+        self.fields = frozenset()
+        self.queued_at = queued_at
+        self.ready = None
+        self.bucket = None
+        self.dropped = False
+
+    def __lt__(self, other) -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class RestQueue:
+    """Wspólna kolejka wychodzących zapytań REST z priorytetami: odpowiedzi na interakcje >
+    edycje list > edycje kosmetyczne (start, zamknięcie, archiwizacja).
+
+    - Odpowiedzi na interakcje (callback i followup idą przez webhook interakcji) nie czekają,
+      ale zajmują miejsca z REST_CONCURRENCY - edycje ustępują im pasma. Kosmetyczne czekają,
+      aż żadna odpowiedź nie będzie w locie. Po REST_MAX_DELAY zapytanie przestaje ustępować.
+    - Pozostałe zapytania (`client.http.request`) wychodzą w kolejności priorytetu, gdy ich
+      kubełek ma zapas według stanu kubełków discord.py (z nagłówków X-RateLimit). Nieznany
+      kubełek (przed pierwszą odpowiedzią) przepuszcza jedno zapytanie naraz, a wszystkie
+      razem nie przekraczają REST_GLOBAL_RATE/s - dzięki temu nie dostajemy 429.
+    - Edycja wiadomości czekająca w kolejce jest porzucana (`EditSuperseded`), gdy przyjdzie
+      nowsza edycja tej wiadomości z tymi samymi albo szerszymi polami.
+
+    Priorytet bierze się z `rest_priority` zadania, które wysyła zapytanie."""
+
+    INTERACTION, ROSTER, COSMETIC = 0, 1, 2
+    NAMES = ("interaction", "roster", "cosmetic")
+
+    def __init__(self, concurrency: int, global_rate: int, max_delay: float):
+        self.concurrency = concurrency
+        self.global_rate = global_rate
+        self.max_delay = max_delay
+        self.http = None
+        self._heap = []
+        self._edits = {}
+        self._seq = itertools.count()
+        self._sent = deque()
+        self._bucket_flight = {}
+        self._wake = None
+        self.in_flight = 0
+        self.urgent = 0
+
+    def install(self, http, interactions: bool = True):
+        """Podpina kolejkę pod HTTPClient klienta i (`interactions`) pod własny egzemplarz
+        adaptera webhooków, którym discord.py wysyła odpowiedzi na interakcje (`async_context`
+        ustawiony tutaj dziedziczą zadania bota). Klasa adaptera i domyślny egzemplarz
+        zostają nietknięte; jako "interaction" liczone są tylko trasy interakcji aplikacji.
+        Zależy od prywatnych elementów discord.py (wersja przypięta w requirements.txt) -
+        jeśli któregoś brakuje, ostrzega i zostawia tę część bez kolejki (zapytania idą
+        prosto do discord.py, jak bez RestQueue)."""
+        missing = self.missing_http_internals(http)
+        if missing:
+            print(f"⚠️ Kolejka REST wyłączona, zapytania idą bez niej: brak {', '.join(missing)} w discord.py {discord.__version__}.")
+            return
+        self.http = http
+        send = http.request
+
+        async def request(route, **kwargs):
+            ticket = await self.acquire(route, kwargs.get("json") if "json" in kwargs else None)
+            try:
+                return await send(route, **kwargs)
+            finally:
+                self.release(ticket)
+
+        http.request = request
+        if not interactions:
+            return
+        missing = self.missing_webhook_internals()
+        if missing:
+            print(f"⚠️ Odpowiedzi na interakcje idą bez kolejki REST: brak {', '.join(missing)} w discord.py {discord.__version__}.")
+            return
+        adapter = discord.webhook.async_.AsyncWebhookAdapter()
+        webhook_request = adapter.request
+
+        async def interaction_request(route, session, **kwargs):
+            if not (route.path.startswith("/interactions/") or route.webhook_id == client.application_id):
+                return await webhook_request(route, session, **kwargs)
+            self.urgent += 1
+            metrics.rest_requests.inc("interaction", "sent")
+            try:
+                return await webhook_request(route, session, **kwargs)
+            finally:
+                self.urgent -= 1
+                self._pump()
+
+        adapter.request = interaction_request
+        discord.webhook.async_.async_context.set(adapter)
+
+    @staticmethod
+    def missing_http_internals(http) -> list:
+        """Prywatne elementy HTTPClient/Ratelimit, których używa kolejka, a których brakuje."""
+        missing = [f"HTTPClient.{name}" for name in ("_bucket_hashes", "_buckets") if not isinstance(getattr(http, name, None), dict)]
+        ratelimit = getattr(discord.http, "Ratelimit", None)
+        missing += [f"Ratelimit.{name}" for name in ("limit", "remaining", "outgoing", "expires", "dirty", "is_expired")
+                    if not hasattr(ratelimit, name)]
+        return missing
+
+    @staticmethod
+    def missing_webhook_internals() -> list:
+        """Prywatne elementy webhook.async_, przez które idą odpowiedzi na interakcje."""
+        webhook = discord.webhook.async_
+        missing = []
+        if not isinstance(getattr(webhook, "async_context", None), contextvars.ContextVar):
+            missing.append("webhook.async_.async_context")
+        if not callable(getattr(getattr(webhook, "AsyncWebhookAdapter", None), "request", None)):
+            missing.append("AsyncWebhookAdapter.request")
+        return missing
+
+    def bucket_key(self, route) -> str:
+        """Klucz kubełka tak, jak liczy go discord.py (hash z nagłówków albo trasa)."""
+        bucket_hash = self.http._bucket_hashes.get(route.key) if self.http else None
+        return f"{bucket_hash or route.key}:{route.major_parameters}"
+
+    async def acquire(self, route, payload) -> _RestTicket:
+        loop = asyncio.get_running_loop()
+        ticket = _RestTicket(rest_priority.get(), next(self._seq), route, loop.time())
+        if route.method == "PATCH" and route.path == MESSAGE_ROUTE and payload is not None:
+            ticket.edit_key = route.url
+            ticket.fields = frozenset(payload)
+            older = self._edits.get(ticket.edit_key)
+            if older is not None and older.fields <= ticket.fields:
+                older.dropped = True
+                # Anulowane oczekiwanie (zadanie przerwane, zanim obsłużyło CancelledError) już się nie wykona.
+                if not older.ready.done():
+                    older.ready.set_exception(EditSuperseded(route.url))
+                    metrics.rest_requests.inc(self.NAMES[older.priority], "superseded")
+            self._edits[ticket.edit_key] = ticket
+        if not self._heap and self._delay(ticket, ticket.queued_at) == 0:
+            self._start(ticket, ticket.queued_at)
+            return ticket
+        ticket.ready = loop.create_future()
+        heapq.heappush(self._heap, ticket)
+        self._pump()
+        try:
+            await ticket.ready
+        except asyncio.CancelledError:
+            if ticket.bucket is not None:
+                self.release(ticket)  # wystartował tuż przed anulowaniem
+            else:
+                self._discard(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket: _RestTicket):
+        self.in_flight -= 1
+        left = self._bucket_flight[ticket.bucket] - 1
+        if left:
+            self._bucket_flight[ticket.bucket] = left
+        else:
+            del self._bucket_flight[ticket.bucket]
+        self._pump()
+
+    def _forget_edit(self, ticket: _RestTicket):
+        if ticket.edit_key and self._edits.get(ticket.edit_key) is ticket:
+            del self._edits[ticket.edit_key]
+
+    def _discard(self, ticket: _RestTicket):
+        ticket.dropped = True
+        self._forget_edit(ticket)
+
+    def _start(self, ticket: _RestTicket, now: float):
+        self._forget_edit(ticket)
+        ticket.bucket = self.bucket_key(ticket.route)
+        self._bucket_flight[ticket.bucket] = self._bucket_flight.get(ticket.bucket, 0) + 1
+        self.in_flight += 1
+        self._sent.append(now)
+        name = self.NAMES[ticket.priority]
+        metrics.rest_requests.inc(name, "sent")
+        metrics.rest_wait.observe(now - ticket.queued_at, name)
+
+    def _delay(self, ticket: _RestTicket, now: float) -> float:
+        """0 - można wysłać; liczba - za ile sekund spróbować; inf - po zwolnieniu miejsca."""
+        yielding = now - ticket.queued_at < self.max_delay
+        if self.in_flight + (self.urgent if yielding else 0) >= self.concurrency:
+            return math.inf
+        if ticket.priority >= self.COSMETIC and self.urgent and yielding:
+            return ticket.queued_at + self.max_delay - now
+        while self._sent and now - self._sent[0] >= 1.0:
+            self._sent.popleft()
+        if len(self._sent) >= self.global_rate:
+            return self._sent[0] + 1.0 - now
+        if self.http is None:
+            return 0
+        key = self.bucket_key(ticket.route)
+        flying = self._bucket_flight.get(key, 0)
+        ratelimit = self.http._buckets.get(key)
+        if ratelimit is None or not ratelimit.dirty:
+            return 0 if flying == 0 else math.inf
+        if ratelimit.is_expired():
+            return 0 if flying < ratelimit.limit else math.inf
+        # `remaining` po odpowiedzi to wartość z nagłówka: nie obejmuje zapytań, które weszły
+        # do kubełka wcześniej, a jeszcze nie dotarły do Discorda. Każde zapytanie w locie
+        # liczymy więc tak, jakby dopiero miało zużyć miejsce w oknie.
+        if flying < ratelimit.remaining:
+            return 0
+        return max(ratelimit.expires - now, 0.001) if ratelimit.expires else math.inf
+
+    def _pump(self):
+        if not self._heap:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        waiting = []
+        wake = math.inf
+        while self._heap:
+            ticket = heapq.heappop(self._heap)
+            if ticket.dropped:
+                continue
+            if ticket.ready.cancelled():
+                self._discard(ticket)  # oczekujący został anulowany - nie zajmujemy miejsca
+                continue
+            delay = self._delay(ticket, now)
+            if delay:
+                waiting.append(ticket)
+                wake = min(wake, delay)
+                continue
+            self._start(ticket, now)
+            ticket.ready.set_result(None)
+        for ticket in waiting:
+            heapq.heappush(self._heap, ticket)
+        if self._wake is not None:
+            self._wake.cancel()
+            self._wake = None
+        if wake != math.inf:
+            self._wake = loop.call_later(wake, self._pump)
+
+    def queued(self) -> dict:
+        counts = dict.fromkeys(self.NAMES[1:], 0)
+        for ticket in self._heap:
+            if not ticket.dropped:
+                counts[self.NAMES[ticket.priority]] += 1
+        return counts
+
+rest_priority = contextvars.ContextVar("rest_priority", default=RestQueue.ROSTER)
+rest_queue = RestQueue(REST_CONCURRENCY, REST_GLOBAL_RATE, REST_MAX_DELAY)
+rest_queue.install(client.http)
+
+# =====================
+#       ŁĄCZENIE EDYCJI WIADOMOŚCI
+# =====================
+class EmbedEditCoalescer:
+    """Zbiera zmiany dla jednej wiadomości z krótkiego okna i wysyła jedną edycję
+    z najnowszym stanem. Edycja jest pomijana, gdy embed i przyciski się nie zmieniły."""
+
+    def __init__(self, window: float):
+        self.window = window
+        self._pending = {}
+        self._tasks = {}
+        self._last_sent = {}
+        self.requests = 0
+        self.edits = 0
+        self.skipped = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=1000)
+        self.on_missing = None
+
+    def schedule(self, message, render, priority: int = RestQueue.ROSTER, on_done=None):
+        """`render()` zwraca krotkę (embed, view) i jest wołane dopiero przy wysyłce.
+        Połączona edycja idzie do kolejki REST z najwyższym priorytetem ze zgłoszeń.
+        `on_done(result)` dostaje wynik edycji, która objęła to zgłoszenie: "sent",
+        "unchanged" (embed i przyciski już takie były), "superseded" albo "failed"
+        (także błąd `render()` i `forget()` wiadomości przed wysyłką)."""
+        self.requests += 1
+        previous = self._pending.get(message.id)
+        if previous:
+            first_request = previous[2]
+            priority = min(priority, previous[3])
+            callbacks = previous[4]
+        else:
+            first_request = time.perf_counter()
+            callbacks = []
+        if on_done is not None:
+            callbacks.append(on_done)
+        self._pending[message.id] = (message, render, first_request, priority, callbacks)
+        if message.id not in self._tasks:
+            self._tasks[message.id] = asyncio.create_task(self._run(message.id))
+
+    async def _run(self, message_id: int):
+        try:
+            while message_id in self._pending:
+                await asyncio.sleep(self.window)
+                entry = self._pending.pop(message_id, None)
+                if entry is None:
+                    return  # forget() w trakcie okna - wiadomość usunięta albo zarchiwizowana
+                message, render, first_request, priority, callbacks = entry
+                try:
+                    embed, view = render()
+                    rendered = (embed.to_dict(), view.to_components() if view is not None else None)
+                except Exception as e:
+                    self.failures += 1
+                    print(f"Błąd renderowania wiadomości {message_id}: {e}")
+                    traceback.print_exc()
+                    self._settle(callbacks, "failed")
+                    continue
+                if self._last_sent.get(message_id) == rendered:
+                    self.skipped += 1
+                    self._settle(callbacks, "unchanged")
+                    continue
+                rest_priority.set(priority)
+                try:
+                    await message.edit(embed=embed, view=view)
+                except EditSuperseded:
+                    self.skipped += 1
+                    self._settle(callbacks, "superseded")
+                    continue
+                except discord.NotFound:
+                    self.failures += 1
+                    self._last_sent.pop(message_id, None)
+                    print(f"Błąd: Nie znaleziono wiadomości {message_id} przy edycji. Pomijam.")
+                    self._settle(callbacks, "failed")
+                    if self.on_missing:
+                        self.on_missing(message_id)
+                    return
+                except discord.HTTPException as e:
+                    self.failures += 1
+                    print(f"Błąd edycji wiadomości {message_id}: {e}")
+                    self._settle(callbacks, "failed")
+                    continue
+                self._last_sent[message_id] = rendered
+                self._settle(callbacks, "sent")
+                self.edits += 1
+                latency = time.perf_counter() - first_request
+                self.latencies.append(latency)
+                metrics.edit_latency.observe(latency)
+        finally:
+            self._tasks.pop(message_id, None)
+
+    @staticmethod
+    def _settle(callbacks: list, result: str):
+        for callback in callbacks:
+            callback(result)
+
+    def forget(self, message_id: int):
+        entry = self._pending.pop(message_id, None)
+        self._last_sent.pop(message_id, None)
+        if entry is not None:
+            self._settle(entry[4], "failed")
+
+    def stats(self) -> dict:
+        ordered = sorted(self.latencies)
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 1) if ordered else 0.0
+        return {
+            "window_s": self.window,
+            "requests": self.requests,
+            "edits": self.edits,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "pending": len(self._pending),
+            "latency_p50_ms": percentile(0.50),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+        }
+
+edit_coalescer = EmbedEditCoalescer(EDIT_COALESCE_SECONDS)
+
+# =====================
+#       JEDEN PISARZ NA ZAPIS
+# =====================
+class MutationResult:
+    """Wynik jednej mutacji listy: kto faktycznie się zmienił, kto został pominięty
+    (był już zapisany / nie był zapisany, albo - `closed` - zapisy zamknęły się, zanim
+    partia doszła do skutku) i wersja listy po partii, w której ją zastosowano."""
+
+    __slots__ = ("changed", "skipped", "version", "dropped", "closed")
+
+    def __init__(self, changed: list, skipped: list, version: int, dropped: bool = False, closed: bool = False):
+        self.changed = changed
+        self.skipped = skipped
+        self.version = version
+        self.dropped = dropped
+        self.closed = closed
+
+class EnrollmentActor:
+    """Jedyny pisarz listy jednego zapisu. Zmiany ("add", "remove", "replace") trafiają do
+    skrzynki i są stosowane po kolei przez jedno zadanie: wszystko, co przyszło w tej samej
+    iteracji pętli, idzie jedną partią - jeden zapis do bazy na zmianę, jedno zlecenie
+    odświeżenia ogłoszenia na partię. Wersją jest `Roster.version`; ogłoszenie renderowane
+    jest leniwie przy wysyłce (EmbedEditCoalescer), więc zawsze pokazuje najnowszą wersję,
+    a starsze stany nigdy nie trafiają do Discorda.
+
+    Aktor istnieje tylko, gdy ma pracę - po opróżnieniu skrzynki znika z rejestru."""
+
+    __slots__ = ("record", "mailbox", "task")
+
+    registry = {}
+
+    def __init__(self, record: MessageRecord):
+        self.record = record
+        self.mailbox = deque()
+        self.task = None
+
+    @classmethod
+    def submit(cls, record: MessageRecord, op: str, user_ids, priority: int = RestQueue.ROSTER, refresh: bool = True,
+               open_only: bool = False):
+        """Zleca zmianę listy; zwraca future z `MutationResult`. `refresh=False` - wywołujący
+        sam edytuje wiadomość (edycja składu). `open_only` - zmiana użytkownika z przycisku:
+        zamknięcie zapisów sprawdzane jest ponownie w partii, bo mogło nastąpić, gdy
+        zgłoszenie czekało w skrzynce (zmiany adminów przechodzą i po zamknięciu)."""
+        actor = cls.registry.get(record.message_id)
+        if actor is None or actor.record is not record:
+            actor = cls.registry[record.message_id] = cls(record)
+        future = asyncio.get_running_loop().create_future()
+        actor.mailbox.append((op, tuple(user_ids), priority, refresh, open_only, future))
+        if actor.task is None:
+            actor.task = asyncio.create_task(actor._run())
+        return future
+
+    @classmethod
+    def forget(cls, message_id: int):
+        cls.registry.pop(message_id, None)
+
+    async def _run(self):
+        try:
+            while self.mailbox:
+                await asyncio.sleep(0)  # zbiera zgłoszenia z bieżącej iteracji pętli w jedną partię
+                batch = list(self.mailbox)
+                self.mailbox.clear()
+                try:
+                    self._apply(batch)
+                except Exception as e:
+                    # Lista mogła zmienić się w części - oczekujący dostają błąd zamiast czekać
+                    # do wygaśnięcia interakcji, a aktor obsługuje kolejne partie.
+                    print(f"Błąd partii zmian listy {self.record.message_id}: {e}")
+                    traceback.print_exc()
+                    for *_, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+        finally:
+            self.task = None
+            if self.registry.get(self.record.message_id) is self and not self.mailbox:
+                del self.registry[self.record.message_id]
+
+    def _live(self) -> bool:
+        record = self.record
+        enrollments = squads if record.kind == "squad" else ENROLLMENT_KINDS.get(record.kind)
+        return enrollments is not None and enrollments.get(record.message_id) is record
+
+    def _apply(self, batch: list):
+        record = self.record
+        if not self._live():
+            # Zapis zarchiwizowany albo usunięty, zanim partia doszła do skutku.
+            for op, user_ids, _, _, _, future in batch:
+                if not future.done():
+                    future.set_result(MutationResult([], list(user_ids), record.participants.version, dropped=True))
+            return
+        roster = record.participants
+        msg_id = record.message_id
+        tracked = record.kind != "squad"
+        results = []
+        render_priority = None
+        for op, user_ids, priority, refresh, open_only, future in batch:
+            changed, skipped = [], []
+            if open_only and getattr(record, "closed_at", None):
+                if not future.done():
+                    future.set_result(MutationResult([], list(user_ids), roster.version, closed=True))
+                continue
+            if op == "replace":
+                before = set(roster)
+                roster.replace(user_ids)
+                store.set_participants(msg_id, user_ids)
+                changed = [uid for uid in user_ids if uid not in before]
+                skipped = [uid for uid in user_ids if uid in before]
+            else:
+                joining = op == "add"
+                for uid in user_ids:
+                    if roster.add(uid) if joining else roster.discard(uid):
+                        changed.append(uid)
+                        if joining:
+                            store.add_participant(msg_id, uid)
+                        else:
+                            store.remove_participant(msg_id, uid)
+                        if tracked:
+                            attendance.record(AttendanceLog.JOIN if joining else AttendanceLog.LEAVE, record.kind, record.guild_id, msg_id, uid)
+                    else:
+                        skipped.append(uid)
+            if refresh and (changed or op == "replace"):
+                render_priority = priority if render_priority is None else min(render_priority, priority)
+            results.append((future, changed, skipped))
+        if render_priority is not None:
+            refresh_enrollment_message(record, render_priority)
+        for future, changed, skipped in results:
+            if not future.done():
+                future.set_result(MutationResult(changed, skipped, roster.version))
+
 class EnrollmentSelectMenu(ui.Select):
-    def __init__(self, action: str):
+    def __init__(self, action: str, guild: discord.Guild):
         self.action = action 
-        enrollments = get_all_active_enrollments()
         options = []
-        for name, msg_id, data in enrollments:
-            count = len(data.get("participants", []))
+        # Discord przyjmuje najwyżej 25 opcji - bierzemy najbliższe terminy z indeksu.
+        for entry in enrollment_index.search(guild, ""):
             options.append(
                 discord.SelectOption(
-                    label=f"{name} (ID: {msg_id}) - {count} os.", 
-                    value=f"{name.lower()}-{msg_id}"
+                    label=enrollment_index.label(entry, guild), 
+                    value=f"{entry.kind}-{entry.msg_id}"
                 )
             )
         super().__init__(
@@ -149,135 +2372,437 @@ class EnrollmentSelectMenu(ui.Select):
 # =====================
 #       AIRDROP & CAPTURES VIEWS
 # =====================
+class RosterPagesView(ui.View):
+    """Efemeryczna, stronicowana pełna lista zapisanych (gdy nie mieści się w ogłoszeniu)."""
+
+    def __init__(self, title: str, total: int, pages: list):
+        super().__init__(timeout=180)
+        self.title = title
+        self.total = total
+        self.pages = pages
+        self.page = 0
+        self._sync_buttons()
+
+    def make_embed(self):
+        embed = discord.Embed(title=f"{self.title} — zapisani ({self.total})", color=discord.Color(0xFFFFFF))
+        for chunk in self.pages[self.page]:
+            embed.add_field(name="\u200b", value=chunk, inline=False)
+        embed.set_footer(text=f"Strona {self.page + 1}/{len(self.pages)}")
+        return embed
+
+    def _sync_buttons(self):
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= len(self.pages) - 1
+
+    @ui.button(label="◀ Poprzednia", style=discord.ButtonStyle.gray)
+    @instrumented("roster_prev_page")
+    async def prev_page(self, interaction: discord.Interaction, button: ui.Button):
+        self.page = max(0, self.page - 1)
+        self._sync_buttons()
+        await edit_origin(interaction, embed=self.make_embed(), view=self)
+
+    @ui.button(label="Następna ▶", style=discord.ButtonStyle.gray)
+    @instrumented("roster_next_page")
+    async def next_page(self, interaction: discord.Interaction, button: ui.Button):
+        self.page = min(len(self.pages) - 1, self.page + 1)
+        self._sync_buttons()
+        await edit_origin(interaction, embed=self.make_embed(), view=self)
+
+async def send_roster_pages(interaction: discord.Interaction, title: str, roster: Roster):
+    if not roster:
+        await respond(interaction, "Nikt się jeszcze nie zapisał.", ephemeral=True)
+        return
+    view = RosterPagesView(title, len(roster), roster.pages(interaction.guild))
+    await respond(interaction, embed=view.make_embed(), view=view, ephemeral=True)
+
+CLOSED_ENROLLMENT_MESSAGE = "🔒 Zapisy są już zamknięte."
+
 class AirdropView(ui.View):
-    def __init__(self, message_id: int, description: str, voice_channel: discord.VoiceChannel, author_name: str, timestamp: int = None):
+    def __init__(self, message_id: int, description: str, voice_channel: discord.VoiceChannel, author_name: str, timestamp: int = None, started: bool = False):
         super().__init__(timeout=None) 
         self.message_id = message_id
         self.description = description
         self.voice_channel = voice_channel
-        self.participants: list[int] = [] 
         self.author_name = author_name
         self.timestamp = timestamp 
+        self.started = started 
         self.custom_id = f"airdrop_view:{message_id}" 
 
+    @property
+    def participants(self) -> Roster:
+        record = airdrops.get(self.message_id)
+        return record.participants if record else Roster()
+
     def make_embed(self, guild: discord.Guild):
         embed = discord.Embed(title="🎁 AirDrop!", description=self.description, color=discord.Color(0xFFFFFF))
-        embed.set_thumbnail(url=LOGO_URL)
-        embed.add_field(name="Kanał głosowy:", value=f"🔊 {self.voice_channel.mention}", inline=False)
+        embed.set_thumbnail(url=guild_configs.get(guild.id).logo_url)
+        # Kanał mógł zostać usunięty po utworzeniu zapisu - lista dalej ma się odświeżać.
+        channel = self.voice_channel.mention if self.voice_channel is not None else "brak kanału"
+        embed.add_field(name="Kanał głosowy:", value=f"🔊 {channel}", inline=False)
         
         if self.timestamp:
-            time_str = f"Rozpoczęcie AirDrop o <t:{self.timestamp}:t> (<t:{self.timestamp}:R>)"
+            record = airdrops.get(self.message_id)
+            if record and record.closed_at:
+                time_str = "**AirDrop zakończony - zapisy zamknięte**"
+            elif record.started if record else self.started:
+                time_str = "**AirDrop rozpoczął się**"
+            else:
+                time_str = f"Rozpoczęcie AirDrop o <t:{self.timestamp}:t> (<t:{self.timestamp}:R>)"
             embed.add_field(name="Czas rozpoczęcia:", value=time_str, inline=False)
             
-        if self.participants:
-            lines = []
-            for uid in self.participants:
-                member = guild.get_member(uid)
-                if member:
-                    lines.append(f"- {member.mention} | **{member.display_name}**")
-                else:
-                    lines.append(f"- <@{uid}> (Użytkownik opuścił serwer)")
-            embed.add_field(name=f"Zapisani ({len(self.participants)}):", value="\n".join(lines), inline=False)
+        embed.set_footer(text=f"Wystawione przez {self.author_name}")
+        participants = self.participants
+        if participants:
+            add_list_fields(embed, f"Zapisani ({len(participants)}):", participants.chunks(guild), FULL_LIST_NOTE)
         else:
             embed.add_field(name="Zapisani:", value="Brak uczestników", inline=False)
-        embed.set_footer(text=f"Wystawione przez {self.author_name}")
         return embed
 
     @ui.button(label="✅ Dołącz", style=discord.ButtonStyle.green, custom_id="airdrop_join")
+    @instrumented("airdrop_join")
     async def join(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer() 
-        
-        if interaction.user.id in self.participants:
-            await interaction.followup.send("Już jesteś zapisany(a).", ephemeral=True)
-            return
+        await defer_once(interaction) 
         
         if self.message_id not in airdrops:
              await interaction.followup.send("Błąd: Dane zapisu zaginęły po restarcie bota. Spróbuj utworzyć nowy zapis.", ephemeral=True)
              return
+        record = airdrops[self.message_id]
+        if record.closed_at:
+            await interaction.followup.send(CLOSED_ENROLLMENT_MESSAGE, ephemeral=True)
+            return
              
-        self.participants.append(interaction.user.id)
-        airdrops[self.message_id]["participants"].append(interaction.user.id) 
-        
-        await interaction.message.edit(embed=self.make_embed(interaction.guild), view=self)
+        result = await EnrollmentActor.submit(record, "add", (interaction.user.id,), open_only=True)
+        if result.closed or result.dropped:
+            await interaction.followup.send(CLOSED_ENROLLMENT_MESSAGE, ephemeral=True)
+            return
+        if not result.changed:
+            await interaction.followup.send("Już jesteś zapisany(a).", ephemeral=True)
+            return
         await interaction.followup.send("✅ Dołączyłeś(aś)!", ephemeral=True)
 
     @ui.button(label="❌ Opuść", style=discord.ButtonStyle.red, custom_id="airdrop_leave")
+    @instrumented("airdrop_leave")
     async def leave(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer() 
+        await defer_once(interaction) 
         
-        if interaction.user.id not in self.participants:
-            await interaction.followup.send("Nie jesteś zapisany(a).", ephemeral=True)
-            return
-            
         if self.message_id not in airdrops:
              await interaction.followup.send("Błąd: Dane zapisu zaginęły po restarcie bota. Spróbuj utworzyć nowy zapis.", ephemeral=True)
              return
+        record = airdrops[self.message_id]
+        if record.closed_at:
+            await interaction.followup.send(CLOSED_ENROLLMENT_MESSAGE, ephemeral=True)
+            return
              
-        self.participants.remove(interaction.user.id)
-        airdrops[self.message_id]["participants"].remove(interaction.user.id)
-        await interaction.message.edit(embed=self.make_embed(interaction.guild), view=self)
+        result = await EnrollmentActor.submit(record, "remove", (interaction.user.id,), open_only=True)
+        if result.closed or result.dropped:
+            await interaction.followup.send(CLOSED_ENROLLMENT_MESSAGE, ephemeral=True)
+            return
+        if not result.changed:
+            await interaction.followup.send("Nie jesteś zapisany(a).", ephemeral=True)
+            return
         await interaction.followup.send("❌ Opuściłeś(aś).", ephemeral=True)
 
-class PlayerSelectMenu(ui.Select):
-    def __init__(self, capture_id: int, guild: discord.Guild):
-        self.capture_id = capture_id
-        participant_ids = captures.get(self.capture_id, {}).get("participants", [])
-        options = []
-        for member_id in participant_ids:
-            member = guild.get_member(member_id)
-            if member:
-                options.append(
-                    discord.SelectOption(label=member.display_name, value=str(member.id))
-                )
+    @ui.button(label="📄 Pełna lista", style=discord.ButtonStyle.gray, custom_id="airdrop_list")
+    @instrumented("airdrop_list")
+    async def full_list(self, interaction: discord.Interaction, button: ui.Button):
+        await send_roster_pages(interaction, "🎁 AirDrop", self.participants)
+
+# --- Pickowanie graczy (stronicowany wybór, gdy zapisanych jest więcej niż 25) ---
+PICK_PAGE_SIZE = 25
+PICK_SORTS = {"join": "kolejność zapisu", "name": "nick", "role": "najwyższa rola", "attendance": "obecność", "score": "wynik auto-picku"}
+
+class PlayerIndex:
+    """Migawka zapisanych na capt z gotowymi kolejnościami sortowania i wynikami
+    auto-picku (cechy z `PickPolicy` z wagami serwera). Budowana raz (i ponownie tylko
+    po zmianie listy - `Roster.version`), więc zmiana strony, filtra czy sortowania,
+    a także sam auto-pick, to jedynie przejście po gotowej liście."""
+
+    __slots__ = ("version", "names", "folded", "roles", "positions", "history", "scores", "orders")
+
+    def __init__(self, guild: discord.Guild, roster: Roster, now: float = None):
+        self.version = roster.version
+        self.names = {}
+        self.folded = {}
+        self.roles = {}
+        join = list(roster)
+        weights = guild_configs.get(guild.id).autopick_weights
+        history = self.history = attendance.guilds.get(guild.id, {})
+        now = time.time() if now is None else now
+        role_rank, reliability, rest = {}, {}, {}
+        for uid in join:
+            member = member_cache.get(guild, uid)
+            if member is MemberCache.PENDING:
+                member, name = None, f"(wczytywanie…) {uid}"
+            else:
+                name = member.display_name if member else f"(opuścił serwer) {uid}"
+            role = member.top_role if member else None
+            stats = history.get(uid)
+            self.names[uid] = name
+            self.folded[uid] = fold(f"{name} {member.name}" if member else name)
+            role_rank[uid] = role.position if role else -1
+            reliability[uid] = stats.picks - 2 * stats.no_shows if stats else 0
+            rest[uid] = min(1.0, (now - stats.last_pick) / PickPolicy.REST_WINDOW) if stats and stats.last_pick else 1.0
+            self.roles[uid] = role.name if role and not role.is_default() else "brak roli"
+
+        last = max(1, len(join) - 1)
+        top_role = max(max(role_rank.values(), default=0), 1)
+        top_reliability = max(max(reliability.values(), default=0), 1)
+        self.scores = {}
+        for pos, uid in enumerate(join):
+            self.scores[uid] = (
+                weights["join"] * (1 - pos / last)
+                + weights["attendance"] * max(0, reliability[uid]) / top_reliability
+                + weights["rest"] * rest[uid]
+                + weights["role"] * max(0, role_rank[uid]) / top_role
+            )
+
+        by_name = sorted(join, key=lambda uid: self.folded[uid])
+        self.orders = {
+            "join": join,
+            "name": by_name,
+            # sorted jest stabilne - remisy zostają w kolejności alfabetycznej / zapisu
+            "role": sorted(by_name, key=lambda uid: -role_rank[uid]),
+            "attendance": sorted(join, key=lambda uid: -reliability[uid]),
+            "score": sorted(join, key=lambda uid: -self.scores[uid]),
+        }
+        self.positions = {uid: pos for pos, uid in enumerate(join)}
+
+    def detail(self, uid: int) -> str:
+        """Opis opcji - składany tylko dla 25 osób z wyświetlanej strony."""
+        stats = self.history.get(uid)
+        picks = f"picki {stats.picks}/{stats.signups}" if stats else "brak historii"
+        return f"#{self.positions[uid] + 1} • {self.roles[uid]} • {picks} • wynik {self.scores[uid]:.2f}"[:100]
+
+class PickSession:
+    """Stan jednej sesji pickowania (efemeryczna wiadomość jednego admina):
+    wybrani gracze (w kolejności wyboru) przetrwają zmianę strony, filtra i sortowania."""
+
+    __slots__ = ("capture_id", "guild", "index", "sort", "query", "page", "selected", "note", "_filtered")
+
+    def __init__(self, capture_id: int, guild: discord.Guild):
+        self.capture_id = capture_id
+        self.guild = guild
+        self.index = None
+        self.sort = "join"
+        self.query = ""
+        self.page = 0
+        self.selected = {}
+        self.note = None
+        self._filtered = None
+
+    @property
+    def roster(self) -> Roster:
+        record = captures.get(self.capture_id)
+        return record.participants if record else Roster()
+
+    def refresh(self):
+        roster = self.roster
+        if self.index is None or self.index.version != roster.version:
+            self.index = PlayerIndex(self.guild, roster)
+            self._filtered = None
+            # Kto się wypisał w trakcie pickowania, wypada z wyboru.
+            for uid in [uid for uid in self.selected if uid not in roster]:
+                del self.selected[uid]
+
+    def set_view(self, sort: str = None, query: str = None):
+        if sort is not None:
+            self.sort = sort
+        if query is not None:
+            self.query = fold(query.strip())
+        self.page = 0
+        self._filtered = None
+
+    def filtered(self) -> list:
+        if self._filtered is None:
+            order = self.index.orders[self.sort]
+            if self.query:
+                folded = self.index.folded
+                order = [uid for uid in order if self.query in folded[uid]]
+            self._filtered = order
+        return self._filtered
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.filtered()) // PICK_PAGE_SIZE))
+
+    def page_ids(self) -> list:
+        self.page = min(self.page, self.page_count - 1)
+        start = self.page * PICK_PAGE_SIZE
+        return self.filtered()[start:start + PICK_PAGE_SIZE]
+
+    def autopick(self, size: int = None):
+        """Zastępuje wybór najlepszymi wg wyniku (kolejność wybranych = ranking)."""
+        self.refresh()
+        config = guild_configs.get(self.guild.id)
+        size = size or config.autopick_size
+        self.selected = dict.fromkeys(self.index.orders["score"][:size])
+        self.set_view(sort="score", query="")
+        self.note = f"🤖 Auto-pick: {len(self.selected)} os. (wagi: `{PickPolicy.describe(config.autopick_weights)}`). Popraw wybór na stronach i potwierdź."
+
+    def apply_page(self, page_ids, chosen_ids):
+        chosen = set(chosen_ids)
+        for uid in page_ids:
+            if uid in chosen:
+                self.selected.setdefault(uid, None)
+            else:
+                self.selected.pop(uid, None)
+
+    def summary(self) -> str:
+        parts = [
+            f"Wybrano **{len(self.selected)}** z {len(self.index.orders['join'])}",
+            f"strona {self.page + 1}/{self.page_count}",
+            f"sortowanie: {PICK_SORTS[self.sort]}",
+        ]
+        if self.query:
+            parts.append(f"filtr: „{self.query}” ({len(self.filtered())})")
+        return " • ".join(parts)
 
+class PlayerSelectMenu(ui.Select):
+    def __init__(self, session: PickSession, page_ids: list):
+        self.session = session
+        self.page_ids = page_ids
+        index = session.index
+        options = [
+            discord.SelectOption(
+                label=index.names[uid][:100], value=str(uid), description=index.detail(uid),
+                default=uid in session.selected,
+            )
+            for uid in page_ids
+        ]
         super().__init__(
-            placeholder="Wybierz do 25 graczy",
-            max_values=min(25, len(options)),
+            placeholder="Zaznacz graczy na tej stronie",
+            min_values=0,
+            max_values=len(options),
             options=options,
-            custom_id=f"player_select:{capture_id}"
+            row=0,
+        )
+
+    @instrumented("player_select")
+    async def callback(self, interaction: discord.Interaction):
+        self.session.apply_page(self.page_ids, (int(v) for v in self.values))
+        await self.view.rerender(interaction)
+
+class PickSortMenu(ui.Select):
+    def __init__(self, session: PickSession):
+        self.session = session
+        super().__init__(
+            placeholder="Sortowanie",
+            options=[discord.SelectOption(label=f"Sortuj: {label}", value=key, default=key == session.sort) for key, label in PICK_SORTS.items()],
+            row=2,
         )
 
+    @instrumented("player_sort")
     async def callback(self, interaction: discord.Interaction):
-        await interaction.response.defer(ephemeral=True) 
-        await interaction.followup.send("Wybór graczy został zarejestrowany. Naciśnij 'Potwierdź wybór'.", ephemeral=True)
+        self.session.set_view(sort=self.values[0])
+        await self.view.rerender(interaction)
+
+class PlayerSearchModal(ui.Modal, title="Szukaj gracza"):
+    query = ui.TextInput(label="Fragment nicku (puste = wszyscy)", required=False, max_length=50)
+
+    def __init__(self, picker: "PickPlayersView"):
+        super().__init__()
+        self.picker = picker
+        self.query.default = picker.session.query
+
+    @instrumented("player_search_submit")
+    async def on_submit(self, interaction: discord.Interaction):
+        self.picker.session.set_view(query=self.query.value)
+        await self.picker.rerender(interaction)
 
 class PickPlayersView(ui.View):
-    def __init__(self, capture_id: int):
-        super().__init__(timeout=180) 
-        self.capture_id = capture_id
+    def __init__(self, session: PickSession):
+        super().__init__(timeout=600)
+        self.session = session
+        self.build()
 
-    @ui.button(label="Potwierdź wybór", style=discord.ButtonStyle.green, custom_id="confirm_pick_button")
-    async def confirm_pick(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        select_menu = next((item for item in self.children if item.custom_id == f"player_select:{self.capture_id}"), None)
-        if not select_menu or not select_menu.values:
-            await interaction.followup.send("⚠️ Najpierw wybierz graczy z menu rozwijanego (tuż nad tym przyciskiem) i poczekaj, aż bot zarejestruje wybór (otrzymaj wiadomość potwierdzającą). Następnie naciśnij 'Potwierdź wybór'.", ephemeral=True)
-            return
+    def build(self):
+        """Odświeża indeks (jeśli lista się zmieniła) i podmienia menu bieżącej strony."""
+        session = self.session
+        session.refresh()
+        for item in [item for item in self.children if isinstance(item, (PlayerSelectMenu, PickSortMenu))]:
+            self.remove_item(item)
+        page_ids = session.page_ids()
+        if page_ids:
+            self.add_item(PlayerSelectMenu(session, page_ids))
+        self.add_item(PickSortMenu(session))
+        self.prev_page.disabled = session.page == 0
+        self.next_page.disabled = session.page >= session.page_count - 1
+        self.clear_filter.disabled = not session.query
+        self.confirm_pick.disabled = not session.selected
+
+    def content(self) -> str:
+        text = self.session.summary()
+        if self.session.note:
+            text += f"\n{self.session.note}"
+        if not self.session.filtered():
+            text += "\nNikt nie pasuje do filtra."
+        return text
+
+    async def rerender(self, interaction: discord.Interaction):
+        self.build()
+        await edit_origin(interaction, content=self.content(), view=self)
+
+    @ui.button(label="◀", style=discord.ButtonStyle.gray, row=1)
+    @instrumented("player_prev_page")
+    async def prev_page(self, interaction: discord.Interaction, button: ui.Button):
+        self.session.page = max(0, self.session.page - 1)
+        await self.rerender(interaction)
 
-        selected_values = select_menu.values
-        if not selected_values:
-            await interaction.followup.send("Nie wybrano żadnych osób! Wybierz je w menu rozwijanym powyżej.", ephemeral=True)
+    @ui.button(label="▶", style=discord.ButtonStyle.gray, row=1)
+    @instrumented("player_next_page")
+    async def next_page(self, interaction: discord.Interaction, button: ui.Button):
+        self.session.page += 1
+        await self.rerender(interaction)
+
+    @ui.button(label="🔍 Szukaj", style=discord.ButtonStyle.gray, row=1)
+    @instrumented("player_search_open")
+    async def search(self, interaction: discord.Interaction, button: ui.Button):
+        await interaction.response.send_modal(PlayerSearchModal(self))
+        _record_ack(interaction, "callback")
+
+    @ui.button(label="✖ Wyczyść filtr", style=discord.ButtonStyle.gray, row=1)
+    @instrumented("player_clear_filter")
+    async def clear_filter(self, interaction: discord.Interaction, button: ui.Button):
+        self.session.set_view(query="")
+        await self.rerender(interaction)
+
+    @ui.button(label="Potwierdź wybór", style=discord.ButtonStyle.green, custom_id="confirm_pick_button", row=3)
+    @instrumented("confirm_pick_button")
+    async def confirm_pick(self, interaction: discord.Interaction, button: ui.Button):
+        await defer_once(interaction, ephemeral=True)
+        session = self.session
+        session.refresh()
+        if not session.selected:
+            await interaction.followup.send("Nie wybrano żadnych osób! Zaznacz je w menu powyżej.", ephemeral=True)
             return
 
-        selected_members = [
-            interaction.guild.get_member(int(mid))
-            for mid in selected_values if interaction.guild.get_member(int(mid))
-        ]
-        total_participants = len(captures.get(self.capture_id, {}).get("participants", []))
-        
+        guild = interaction.guild
+        attendance.record_pick(guild.id, session.capture_id, session.selected, session.roster)
         final_embed = discord.Embed(
             title="Lista osób na captures!",
-            description=f"Wybrano {len(selected_members)}/{total_participants} osób:",
+            description=f"Wybrano {len(session.selected)}/{len(session.roster)} osób:",
             color=discord.Color(0xFFFFFF)
         )
-        final_embed.add_field(
-            name="Wybrani gracze:",
-            value="\n".join(f"{i+1}. {m.mention} | **{m.display_name}**" for i, m in enumerate(selected_members)),
-            inline=False
-        )
         final_embed.set_footer(text=f"Wystawione przez {interaction.user.display_name} • {discord.utils.utcnow().strftime('%d.%m.%Y %H:%M')}")
+        add_list_fields(
+            final_embed,
+            "Wybrani gracze:",
+            pack_lines(f"{i+1}. {member_lines.get(guild, uid) or f'<@{uid}> (Nieznany/Opuścił serwer)'}" for i, uid in enumerate(session.selected)),
+        )
         await interaction.followup.send(embed=final_embed)
 
+    @ui.button(label="🤖 Auto-pick", style=discord.ButtonStyle.blurple, row=3)
+    @instrumented("player_autopick")
+    async def autopick(self, interaction: discord.Interaction, button: ui.Button):
+        self.session.autopick()
+        await self.rerender(interaction)
+
+    @ui.button(label="🗑️ Odznacz wszystkich", style=discord.ButtonStyle.red, row=3)
+    @instrumented("player_clear_selection")
+    async def clear_selection(self, interaction: discord.Interaction, button: ui.Button):
+        self.session.selected.clear()
+        await self.rerender(interaction)
+
 class CapturesView(ui.View):
     def __init__(self, capture_id: int, author_name: str, image_url: str = None, timestamp: int = None, started: bool = False): 
         super().__init__(timeout=None)
@@ -287,126 +2812,141 @@ class CapturesView(ui.View):
         self.timestamp = timestamp 
         self.custom_id = f"captures_view:{capture_id}"
         self.started = started 
+
+    @property
+    def participants(self) -> Roster:
+        record = captures.get(self.capture_id)
+        return record.participants if record else Roster()
         
     def make_embed(self, guild: discord.Guild):
-        participants_ids = captures.get(self.capture_id, {}).get("participants", [])
+        record = captures.get(self.capture_id)
+        participants_ids = record.participants if record else Roster()
         
         embed = discord.Embed(title="CAPTURES!", description="Kliknij przycisk, aby się zapisać!", color=discord.Color(0xFFFFFF))
-        embed.set_thumbnail(url=LOGO_URL) 
+        embed.set_thumbnail(url=guild_configs.get(guild.id).logo_url) 
         
         if self.image_url:
             embed.set_image(url=self.image_url)
 
         if self.timestamp:
-            if self.started:
+            if record and record.closed_at:
+                time_str = "**CAPT zakończony - zapisy zamknięte**"
+            elif record.started if record else self.started:
                 time_str = "**CAPT rozpoczął się**" 
             else:
                 time_str = f"Rozpoczęcie CAPT o <t:{self.timestamp}:t> (<t:{self.timestamp}:R>)" 
             
             embed.add_field(name="Czas rozpoczęcia:", value=time_str, inline=False)
         
+        embed.set_footer(text=f"Wystawione przez {self.author_name}")
         if participants_ids:
-            lines = []
-            for uid in participants_ids:
-                member = guild.get_member(uid)
-                if member:
-                    lines.append(f"- {member.mention} | **{member.display_name}**")
-                else:
-                    lines.append(f"- <@{uid}> (Użytkownik opuścił serwer)")
-            embed.add_field(name=f"Zapisani ({len(participants_ids)}):", value="\n".join(lines), inline=False)
+            add_list_fields(embed, f"Zapisani ({len(participants_ids)}):", participants_ids.chunks(guild), FULL_LIST_NOTE)
         else:
             embed.add_field(name="Zapisani:", value="Brak uczestników", inline=False)
-            
-        embed.set_footer(text=f"Wystawione przez {self.author_name}")
         return embed
 
     @ui.button(label="✅ Wpisz się", style=discord.ButtonStyle.green, custom_id="capt_join")
+    @instrumented("capt_join")
     async def join_button(self, interaction: discord.Interaction, button: ui.Button):
         user_id = interaction.user.id
-        participants = captures.get(self.capture_id, {}).get("participants", [])
         
-        if user_id not in participants:
-            await interaction.response.defer() 
+        if user_id not in self.participants:
+            await defer_once(interaction) 
             
-            if self.capture_id not in captures:
-                 captures[self.capture_id] = {"participants": [], "author_name": self.author_name, "image_url": self.image_url, "timestamp": self.timestamp, "started": self.started} 
+            # Brak rekordu = zapis zarchiwizowany (albo usunięty) - nie odtwarzamy go kliknięciem.
+            record = captures.get(self.capture_id)
+            if record is None or record.closed_at:
+                await interaction.followup.send(CLOSED_ENROLLMENT_MESSAGE, ephemeral=True)
+                return
                  
-            captures[self.capture_id]["participants"].append(user_id)
-            
-            data = captures.get(self.capture_id)
-            if data and data.get("message"):
-                await interaction.message.edit(embed=self.make_embed(interaction.guild), view=self)
-                await interaction.followup.send("Zostałeś(aś) zapisany(a)!", ephemeral=True)
-            else:
-                await interaction.followup.send("Zostałeś(aś) zapisany(a), ale wiadomość ogłoszenia mogła zaginąć po restarcie bota.", ephemeral=True)
+            result = await EnrollmentActor.submit(record, "add", (user_id,), open_only=True)
+            if result.closed or result.dropped:
+                await interaction.followup.send(CLOSED_ENROLLMENT_MESSAGE, ephemeral=True)
+                return
+            if not result.changed:
+                await interaction.followup.send("Już jesteś zapisany(a).", ephemeral=True)
+                return
+            await interaction.followup.send("Zostałeś(aś) zapisany(a)!", ephemeral=True)
         else:
-            await interaction.response.send_message("Już jesteś zapisany(a).", ephemeral=True)
+            await respond(interaction, "Już jesteś zapisany(a).", ephemeral=True)
 
     @ui.button(label="❌ Wypisz się", style=discord.ButtonStyle.red, custom_id="capt_leave")
+    @instrumented("capt_leave")
     async def leave_button(self, interaction: discord.Interaction, button: ui.Button):
         user_id = interaction.user.id
-        participants = captures.get(self.capture_id, {}).get("participants", [])
         
-        if user_id in participants:
-            await interaction.response.defer() 
+        if user_id in self.participants:
+            await defer_once(interaction) 
             
-            if self.capture_id not in captures:
-                 await interaction.followup.send("Błąd: Dane zapisu zaginęły po restarcie bota.", ephemeral=True)
-                 return
+            record = captures.get(self.capture_id)
+            if record is None or record.closed_at:
+                await interaction.followup.send(CLOSED_ENROLLMENT_MESSAGE, ephemeral=True)
+                return
                  
-            captures[self.capture_id]["participants"].remove(user_id)
-            
-            data = captures.get(self.capture_id)
-            if data and data.get("message"):
-                await interaction.message.edit(embed=self.make_embed(interaction.guild), view=self)
-                await interaction.followup.send("Zostałeś(aś) wypisany(a).", ephemeral=True)
-            else:
-                 await interaction.followup.send("Zostałeś(aś) wypisany(a).", ephemeral=True)
+            result = await EnrollmentActor.submit(record, "remove", (user_id,), open_only=True)
+            if result.closed or result.dropped:
+                await interaction.followup.send(CLOSED_ENROLLMENT_MESSAGE, ephemeral=True)
+                return
+            if not result.changed:
+                await interaction.followup.send("Nie jesteś zapisany(a).", ephemeral=True)
+                return
+            await interaction.followup.send("Zostałeś(aś) wypisany(a).", ephemeral=True)
         else:
-            await interaction.response.send_message("Nie jesteś zapisany(a).", ephemeral=True)
+            await respond(interaction, "Nie jesteś zapisany(a).", ephemeral=True)
+
+    @ui.button(label="📄 Pełna lista", style=discord.ButtonStyle.gray, custom_id="capt_list")
+    @instrumented("capt_list")
+    async def list_button(self, interaction: discord.Interaction, button: ui.Button):
+        await send_roster_pages(interaction, "CAPTURES", self.participants)
 
     @ui.button(label="🎯 Pickuj osoby", style=discord.ButtonStyle.blurple, custom_id="capt_pick")
+    @instrumented("capt_pick")
     async def pick_button(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        
-        guild_member = interaction.guild.get_member(interaction.user.id)
-        is_admin = interaction.user.id in ADMIN_ROLES
-        has_pick_role = PICK_ROLE_ID in [r.id for r in guild_member.roles]
+        await self.open_picker(interaction, auto=False)
+
+    @ui.button(label="🤖 Auto-pick", style=discord.ButtonStyle.blurple, custom_id="capt_autopick")
+    @instrumented("capt_autopick")
+    async def autopick_button(self, interaction: discord.Interaction, button: ui.Button):
+        await self.open_picker(interaction, auto=True)
+
+    async def open_picker(self, interaction: discord.Interaction, auto: bool):
+        await defer_once(interaction, ephemeral=True)
         
-        if not (is_admin or has_pick_role):
+        if not permissions.has(interaction, "pick"):
             await interaction.followup.send("⛔ Brak uprawnień! Wymagana jest rola do pickowania.", ephemeral=True)
             return
             
-        participants = captures.get(self.capture_id, {}).get("participants", [])
+        participants = self.participants
         if not participants:
             await interaction.followup.send("Nikt się nie zapisał!", ephemeral=True)
             return
             
-        pick_view = PickPlayersView(self.capture_id)
-        pick_view.add_item(PlayerSelectMenu(self.capture_id, interaction.guild))
-        
-        await interaction.followup.send("Wybierz do 25 graczy:", view=pick_view, ephemeral=True)
+        session = PickSession(self.capture_id, interaction.guild)
+        if auto:
+            session.autopick()
+        pick_view = PickPlayersView(session)
+        await interaction.followup.send(pick_view.content(), view=pick_view, ephemeral=True)
 
 # =======================================================
 # <<< FUNKCJE DLA SQUADÓW >>>
 # =======================================================
 
-def create_squad_embed(guild: discord.Guild, author_name: str, member_ids: list[int], title: str = "Main Squad"):
-    member_lines = []
+def create_squad_embed(guild: discord.Guild, author_name: str, member_ids: Roster, title: str = "Main Squad"):
+    lines = []
     for i, uid in enumerate(member_ids):
-        member = guild.get_member(uid)
-        if member:
-            member_lines.append(f"{i+1}- {member.mention} | **{member.display_name}**")
+        line = member_lines.get(guild, uid)
+        if line:
+            lines.append(f"{i+1}- {line}")
         else:
-            member_lines.append(f"{i+1}- <@{uid}> (Nieznany/Opuścił serwer)")
-    members_list_str = "\n".join(member_lines) if member_lines else "Brak członków składu."
+            lines.append(f"{i+1}- <@{uid}> (Nieznany/Opuścił serwer)")
+    members_list_str = "\n".join(lines) if lines else "Brak członków składu."
     count = len(member_ids)
     embed = discord.Embed(
         title=title, 
         description=f"Oto aktualny skład:\n\n{members_list_str}", 
         color=discord.Color(0xFFFFFF)
     )
-    embed.set_thumbnail(url=LOGO_URL)
+    embed.set_thumbnail(url=guild_configs.get(guild.id).logo_url)
     embed.add_field(name="Liczba członków:", value=f"**{count}**", inline=False)
     embed.set_footer(text=f"Aktywowane przez {author_name}")
     return embed
@@ -422,32 +2962,38 @@ class EditSquadView(ui.View):
         ))
 
     @ui.button(label="✅ Potwierdź edycję", style=discord.ButtonStyle.green, custom_id="confirm_edit_squad")
+    @instrumented("confirm_edit_squad")
     async def confirm_edit(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer(ephemeral=True)
+        await defer_once(interaction, ephemeral=True)
         select_menu = next((item for item in self.children if item.custom_id == "squad_member_picker"), None)
         selected_ids = []
         if select_menu and select_menu.values:
             selected_ids = [user.id for user in select_menu.values]
+            for user in select_menu.values:
+                member_cache.remember(user)
         squad_data = squads.get(self.message_id)
         if not squad_data:
             await interaction.followup.send("Błąd: Nie znaleziono danych tego składu. Być może widok wygasł.", ephemeral=True)
             return
-        squad_data["member_ids"] = selected_ids
-        message = squad_data.get("message")
-        author_name = squad_data.get("author_name", "Bot")
-        title = "Main Squad"
-        if message and message.embeds:
-            if message.embeds:
-                title = message.embeds[0].title
-        new_embed = create_squad_embed(interaction.guild, author_name, selected_ids, title)
-        if message and hasattr(message, 'edit'):
-            new_squad_view = SquadView(self.message_id, squad_data.get("role_id"))
-            role_id = squad_data.get("role_id")
-            content = f"<@&{role_id}> **Zaktualizowano Skład!**" if role_id else ""
-            await message.edit(content=content, embed=new_embed, view=new_squad_view)
-            await interaction.followup.send(content="✅ Skład został pomyślnie zaktualizowany! Wróć do głównej wiadomości składu.", ephemeral=True)
-        else:
-            await interaction.followup.send(content="Błąd: Nie można odświeżyć wiadomości składu. Być może bot został zrestartowany lub wiadomość usunięta.", ephemeral=True)
+        result = await EnrollmentActor.submit(squad_data, "replace", selected_ids, refresh=False)
+        if result.dropped:
+            await interaction.followup.send("Błąd: Nie znaleziono danych tego składu. Być może widok wygasł.", ephemeral=True)
+            return
+        author_name = squad_data.author_name or "Bot"
+        title = squad_data.title or "Main Squad"
+        new_embed = create_squad_embed(interaction.guild, author_name, squad_data.participants, title)
+        new_squad_view = SquadView(self.message_id, squad_data.role_id)
+        role_id = squad_data.role_id
+        content = f"<@&{role_id}> **Zaktualizowano Skład!**" if role_id else ""
+        try:
+            await squad_data.message.edit(content=content, embed=new_embed, view=new_squad_view)
+        except EditSuperseded:
+            pass  # kolejna edycja tego składu (nowszy stan) jest już w kolejce
+        except discord.NotFound:
+            forget_enrollment(self.message_id)
+            await interaction.followup.send(content="Błąd: Nie można odświeżyć wiadomości składu - wiadomość została usunięta.", ephemeral=True)
+            return
+        await interaction.followup.send(content="✅ Skład został pomyślnie zaktualizowany! Wróć do głównej wiadomości składu.", ephemeral=True)
 
 class SquadView(ui.View):
     def __init__(self, message_id: int, role_id: int):
@@ -457,13 +3003,12 @@ class SquadView(ui.View):
         self.custom_id = f"squad_view:{message_id}"
 
     @ui.button(label="Zarządzaj składem (ADMIN)", style=discord.ButtonStyle.blurple, custom_id="manage_squad_button")
+    @instrumented("manage_squad_button")
     async def manage_squad_button(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer(ephemeral=True) 
-        guild_member = interaction.guild.get_member(interaction.user.id)
-        if not guild_member or BOT_ADMIN_ROLE_ID not in [r.id for r in guild_member.roles]:
-            if interaction.user.id not in STATUS_ADMINS:
-                await interaction.followup.send("⛔ Brak uprawnień do zarządzania składem! Wymagana rola administracyjna.", ephemeral=True)
-                return
+        await defer_once(interaction, ephemeral=True) 
+        if not permissions.has(interaction, "admin"):
+            await interaction.followup.send("⛔ Brak uprawnień do zarządzania składem! Wymagana rola administracyjna.", ephemeral=True)
+            return
         squad_data = squads.get(self.message_id)
         if not squad_data:
             await interaction.followup.send("Błąd: Nie znaleziono danych tego składu.", ephemeral=True)
@@ -480,135 +3025,430 @@ class SquadView(ui.View):
 # =======================================================
 
 # =====================
-#       FUNKCJONALNOŚĆ TIMERA CAPTURES
+#       FUNKCJONALNOŚĆ TIMERA (CAPTURES + AIRDROP)
 # =====================
 
-@tasks.loop(minutes=1.0) 
-async def check_captures_end_time():
-    now_utc = discord.utils.utcnow().timestamp()
-    for msg_id, data in list(captures.items()):
-        timestamp = data.get("timestamp")
-        started = data.get("started", False)
-        message = data.get("message")
-        if timestamp and not started and now_utc >= timestamp:
-            captures[msg_id]["started"] = True
-            if message:
+class DeadlineScheduler:
+    """Kopiec terminów startu. Zadanie śpi dokładnie do najbliższego terminu
+    (albo do wybudzenia, gdy pojawi się wcześniejszy). Anulowane wpisy są
+    pomijane przy zdejmowaniu z kopca."""
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._seq = itertools.count()
+        self._handlers = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.lag = deque(maxlen=500)
+
+    def register(self, kind: str, handler):
+        self._handlers[kind] = handler
+
+    def schedule(self, kind: str, message_id: int, deadline: float):
+        key = (kind, message_id)
+        seq = next(self._seq)
+        self._entries[key] = seq
+        heapq.heappush(self._heap, (deadline, seq, key))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, kind: str, message_id: int):
+        self._entries.pop((kind, message_id), None)
+
+    def pending(self) -> int:
+        return len(self._entries)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _next_deadline(self):
+        while self._heap:
+            deadline, seq, key = self._heap[0]
+            if self._entries.get(key) == seq:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            deadline = self._next_deadline()
+            delay = None if deadline is None else deadline - time.time()
+            if delay is None or delay > 0:
                 try:
-                    view_obj = CapturesView(
-                        msg_id, 
-                        data["author_name"], 
-                        data.get("image_url"), 
-                        timestamp, 
-                        started=True
-                    )
-                    new_embed = view_obj.make_embed(message.guild)
-                    await message.edit(embed=new_embed, view=view_obj)
-                    print(f"✅ Wiadomość Captures (ID: {msg_id}) zaktualizowana: START.")
-                except discord.NotFound:
-                    print(f"Błąd: Nie znaleziono wiadomości Captures (ID: {msg_id}). Pomijam.")
-                    captures[msg_id]["message"] = None 
-                except Exception as e:
-                    print(f"Błąd edycji wiadomości Captures (ID: {msg_id}): {e}")
-                    traceback.print_exc()
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, seq, key = heapq.heappop(self._heap)
+            del self._entries[key]
+            self.lag.append(time.time() - deadline)
+            kind, message_id = key
+            metrics.scheduler_lag.observe(self.lag[-1], kind)
+            try:
+                await self._handlers[kind](message_id)
+            except Exception as e:
+                print(f"Błąd obsługi terminu {kind} (ID: {message_id}): {e}")
+                traceback.print_exc()
+
+start_scheduler = DeadlineScheduler()
+
+def log_start_edit(label: str, msg_id: int, result: str):
+    """Log po faktycznym wyniku edycji START (a nie po samym zgłoszeniu do kolejki)."""
+    if result in ("sent", "unchanged"):
+        print(f"✅ Wiadomość {label} (ID: {msg_id}) zaktualizowana: START.")
+    elif result == "superseded":
+        print(f"✅ Wiadomość {label} (ID: {msg_id}): START wyjdzie z nowszą edycją.")
+    else:
+        print(f"⚠️ Wiadomość {label} (ID: {msg_id}) nie została zaktualizowana: START (edycja nieudana).")
+
+async def on_capture_start(msg_id: int):
+    record = captures.get(msg_id)
+    if not record or record.started:
+        return
+    record.started = True
+    store.upsert(record)
+    message = record.message
+    view_obj = CapturesView(msg_id, record.author_name, record.image_url, record.timestamp, started=True)
+    edit_coalescer.schedule(message, lambda: (view_obj.make_embed(message.guild), view_obj), RestQueue.COSMETIC,
+                            functools.partial(log_start_edit, "Captures", msg_id))
+
+async def on_airdrop_start(msg_id: int):
+    record = airdrops.get(msg_id)
+    if not record or record.started:
+        return
+    record.started = True
+    store.upsert(record)
+    message = record.message
+    voice_channel = message.guild.get_channel(record.voice_channel_id) if message.guild else None
+    if not voice_channel:
+        return
+    view_obj = AirdropView(msg_id, record.description, voice_channel, record.author_name, record.timestamp, started=True)
+    edit_coalescer.schedule(message, lambda: (view_obj.make_embed(message.guild), view_obj), RestQueue.COSMETIC,
+                            functools.partial(log_start_edit, "AirDrop", msg_id))
+
+start_scheduler.register("captures", on_capture_start)
+start_scheduler.register("airdrop", on_airdrop_start)
+
+class EnrollmentLifecycle:
+    """Cykl życia zapisu: open -> started -> closed -> archived.
+
+    - started: termin startu (planista startów, jak dotąd),
+    - closed: `ENROLLMENT_CLOSE_HOURS` po starcie (eventy bez terminu - po utworzeniu);
+      przyciski zapisu/wypisu odmawiają, admini i pickowanie działają dalej. Przy 0
+      (domyślnie) zapisy nie zamykają się same i zostają otwarte jak dotąd,
+    - archived: `ENROLLMENT_RETENTION_HOURS` po zamknięciu zapis trafia do tabeli
+      archive, znika ze wszystkich struktur w pamięci, a ogłoszenie dostaje jedną
+      edycję z wyłączonymi przyciskami.
+
+    Terminy zamknięcia i archiwizacji siedzą w tym samym kopcu co starty, więc w pamięci
+    jest po jednym wpisie na żywy zapis. Edycja archiwizacji idzie przez `edit_coalescer`
+    jak każda edycja listy: edycja już w locie wychodzi przed nią (nie przywróci aktywnych
+    przycisków), a zaległa fala po restarcie nie blokuje planisty."""
+
+    def __init__(self):
+        self.archived = 0
+
+    @staticmethod
+    def lookup(msg_id: int):
+        for enrollments in ENROLLMENT_KINDS.values():
+            record = enrollments.get(msg_id)
+            if record is not None:
+                return record
+        return None
+
+    @staticmethod
+    def state(record: EnrollmentRecord) -> str:
+        if record.closed_at:
+            return "closed"
+        return "started" if record.started else "open"
+
+    def track(self, record: EnrollmentRecord):
+        """Planuje następny krok (zamknięcie albo archiwizację) dla żywego zapisu."""
+        if record.closed_at:
+            start_scheduler.schedule("archive", record.message_id, record.closed_at + ENROLLMENT_RETENTION_HOURS * 3600)
+        elif ENROLLMENT_CLOSE_HOURS > 0:
+            start = record.timestamp or snowflake_seconds(record.message_id)
+            start_scheduler.schedule("close", record.message_id, start + ENROLLMENT_CLOSE_HOURS * 3600)
+
+    async def on_close(self, msg_id: int):
+        record = self.lookup(msg_id)
+        if record is None or record.closed_at:
+            return
+        record.started = True
+        record.closed_at = int(time.time())
+        store.upsert(record)
+        refresh_enrollment_message(record, RestQueue.COSMETIC)
+        self.track(record)
+
+    async def on_archive(self, msg_id: int):
+        record = self.lookup(msg_id)
+        if record is None or not record.closed_at:
+            return
+        # Embed i widok liczone przed zdjęciem zapisu z pamięci (czytają listę uczestników).
+        final = self.render_final(record)
+        store.archive(record)
+        drop_enrollment(msg_id)
+        self.archived += 1
+        if final is not None:
+            message, embed, view = final
+            # Edycja zarejestruje ten widok w miejsce poprzedniego - stop() po niej wypisuje go
+            # z magazynu widoków discord.py, więc nic po zapisie nie zostaje w pamięci.
+            edit_coalescer.schedule(message, lambda: (embed, view), RestQueue.ROSTER, on_done=lambda _: view.stop())
+
+    @staticmethod
+    def render_final(record: EnrollmentRecord):
+        guild = client.get_guild(record.guild_id)
+        if guild is None:
+            return None
+        if record.kind == "captures":
+            view = CapturesView(record.message_id, record.author_name, record.image_url, record.timestamp, True)
+        elif record.kind == "airdrop":
+            voice_channel = guild.get_channel(record.voice_channel_id)
+            if voice_channel is None:
+                return None
+            view = AirdropView(record.message_id, record.description, voice_channel, record.author_name, record.timestamp, True)
+        else:
+            return None  # eventy nie mają przycisków
+        embed = view.make_embed(guild)
+        for item in view.children:
+            item.disabled = True
+        return record.message, embed, view
+
+    def counts(self) -> dict:
+        counts = {}
+        for enrollments in ENROLLMENT_KINDS.values():
+            for data in enrollments.values():
+                state = self.state(data)
+                counts[state] = counts.get(state, 0) + 1
+        return counts
+
+lifecycle = EnrollmentLifecycle()
+start_scheduler.register("close", lifecycle.on_close)
+start_scheduler.register("archive", lifecycle.on_archive)
+
+def schedule_pending_starts():
+    """Po starcie procesu: terminy liczone od zapisanych znaczników czasu.
+    Te, które minęły podczas przerwy, odpalą się od razu po uruchomieniu planisty."""
+    for kind, enrollments in (("captures", captures), ("airdrop", airdrops)):
+        for msg_id, record in enrollments.items():
+            if record.timestamp and not record.started:
+                start_scheduler.schedule(kind, msg_id, record.timestamp)
+    for enrollments in ENROLLMENT_KINDS.values():
+        for record in enrollments.values():
+            lifecycle.track(record)
 
 # =====================
 #       KOMENDY
 # =====================
+# =====================
+#       PRZYWRACANIE WIDOKÓW
+# =====================
+RESTORE_CONCURRENCY = int(os.getenv("RESTORE_CONCURRENCY", "5"))
+views_restored = False
+startup_seconds = None  # od startu procesu do pierwszego on_ready (łącznie z pobraniem członków)
+
+def partial_message(record: MessageRecord):
+    channel = client.get_partial_messageable(record.channel_id, guild_id=record.guild_id)
+    return channel.get_partial_message(record.message_id)
+
+def drop_enrollment(msg_id: int):
+    """Zdejmuje zapis/skład ze wszystkich struktur w pamięci (słowniki, indeks, planista,
+    kolejka edycji, stan picków). Zwraca usunięte dane albo None."""
+    removed = squads.pop(msg_id, None) or captures.pop(msg_id, None) or airdrops.pop(msg_id, None)
+    for msgs in events.values():
+        removed = msgs.pop(msg_id, None) or removed
+    if removed is None:
+        return None
+    for kind in ("captures", "airdrop", "close", "archive"):
+        start_scheduler.cancel(kind, msg_id)
+    edit_coalescer.forget(msg_id)
+    EnrollmentActor.forget(msg_id)
+    attendance.close_enrollment(removed.guild_id, msg_id)
+    member_cache.sweep(removed.guild_id)
+    return removed
+
+def forget_enrollment(msg_id: int):
+    """Usuwa zapis/skład, którego wiadomość zniknęła (z pamięci, bazy i planisty)."""
+    if drop_enrollment(msg_id) is None:
+        return
+    store.delete(msg_id)
+    print(f"Ostrzeżenie: Wiadomość {msg_id} nie istnieje. Usunięto zapis z pamięci.")
+
+edit_coalescer.on_missing = forget_enrollment
+
+def restore_views() -> int:
+    """Rejestruje widoki trwałe od razu, bez zapytań REST - wiadomości to `PartialMessage`,
+    które wystarczają do edycji. Zwraca liczbę zarejestrowanych widoków."""
+    restored = 0
+    for msg_id, record in squads.items():
+        client.add_view(SquadView(msg_id, record.role_id), message_id=msg_id)
+        restored += 1
+    for msg_id, record in captures.items():
+        view = CapturesView(msg_id, record.author_name, record.image_url, record.timestamp, record.started)
+        client.add_view(view, message_id=msg_id)
+        restored += 1
+    for msg_id, record in airdrops.items():
+        voice_channel = client.get_channel(record.voice_channel_id)
+        if not voice_channel:
+            print(f"Ostrzeżenie: Nie znaleziono kanału głosowego dla AirDrop {msg_id}. Pomijam przywracanie widoku.")
+            continue
+        view = AirdropView(msg_id, record.description, voice_channel, record.author_name, record.timestamp, record.started)
+        client.add_view(view, message_id=msg_id)
+        restored += 1
+    return restored
+
+async def fetch_missing_details():
+    """Jedyne pobrania przy starcie: tytuły starszych składów, których nie ma w bazie.
+    Wykonywane równolegle, z limitem jednoczesnych zapytań."""
+    semaphore = asyncio.Semaphore(RESTORE_CONCURRENCY)
+
+    async def fetch_title(msg_id: int, record: SquadRecord):
+        async with semaphore:
+            try:
+                message = await record.message.fetch()
+            except discord.NotFound:
+                forget_enrollment(msg_id)
+                return
+            except discord.HTTPException as e:
+                print(f"Błąd przy pobieraniu wiadomości Squad {msg_id}: {e}")
+                return
+        record.title = message.embeds[0].title if message.embeds else "Main Squad"
+        store.upsert(record)
+
+    pending = [fetch_title(msg_id, record) for msg_id, record in list(squads.items()) if not record.title]
+    if pending:
+        await asyncio.gather(*pending)
+
+def process_rss_bytes() -> int:
+    """Bieżące RSS procesu (Linux: /proc/self/statm); gdzie indziej szczytowe z getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# =====================
+#       SYNCHRONIZACJA DRZEWA KOMEND
+# =====================
+def command_tree_fingerprint() -> str:
+    """Stabilny skrót sygnatur wszystkich zarejestrowanych komend (i aplikacji)."""
+    payload = sorted((cmd.to_dict(tree) for cmd in tree.get_commands()), key=lambda c: c["name"])
+    raw = json.dumps({"application_id": client.application_id, "commands": payload}, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+async def sync_command_tree(force: bool = False) -> bool:
+    """Wysyła komendy do Discorda tylko, gdy zmienił się ich skrót. Zwraca True przy synchronizacji."""
+    started_at = time.perf_counter()
+    fingerprint = command_tree_fingerprint()
+    stored = await asyncio.to_thread(store.get_meta, "command_tree_fingerprint")
+    if not force and stored == fingerprint:
+        print(f"⏭️ Pominięto tree.sync() - komendy bez zmian ({fingerprint[:12]}, {(time.perf_counter() - started_at) * 1000:.1f} ms).")
+        return False
+    synced = await tree.sync()
+    await asyncio.to_thread(store.set_meta, "command_tree_fingerprint", fingerprint)
+    reason = "wymuszona" if force else "zmiana komend"
+    print(f"✅ tree.sync() ({reason}): {len(synced)} komend w {(time.perf_counter() - started_at) * 1000:.1f} ms ({fingerprint[:12]}).")
+    return True
+
 @client.event
 async def on_ready():
-    if not check_captures_end_time.is_running():
-        check_captures_end_time.start()
-        print("✅ Rozpoczęto zadanie cykliczne Captures Time Tracker.")
-
-    if squads:
-        print(f"Próba przywrócenia {len(squads)} widoków Squad.")
-        for msg_id, data in list(squads.items()):
-             try:
-                 channel = client.get_channel(data["channel_id"])
-                 if channel:
-                     data["message"] = await channel.fetch_message(msg_id)
-                     client.add_view(SquadView(msg_id, data["role_id"]))
-             except discord.NotFound:
-                  print(f"Ostrzeżenie: Wiadomość Squad {msg_id} nie została znaleziona. Usuwam z pamięci.")
-                  del squads[msg_id]
-             except Exception as e:
-                 print(f"Błąd przy przywracaniu widoku Squad {msg_id}: {e}")
-                 
-    if captures:
-        print(f"Próba przywrócenia {len(captures)} widoków Captures.")
-        for msg_id, data in list(captures.items()):
-             try:
-                 channel = client.get_channel(data["channel_id"])
-                 if channel:
-                     data["message"] = await channel.fetch_message(msg_id)
-                     image_url = data.get("image_url")
-                     timestamp = data.get("timestamp")
-                     started = data.get("started", False)
-                     client.add_view(CapturesView(msg_id, data["author_name"], image_url, timestamp, started))
-             except discord.NotFound:
-                  print(f"Ostrzeżenie: Wiadomość Captures {msg_id} nie została znaleziona. Usuwam z pamięci.")
-                  del captures[msg_id]
-             except Exception as e:
-                 print(f"Błąd przy przywracaniu widoku Captures {msg_id}: {e}")
-                 
-    if airdrops:
-        print(f"Próba przywrócenia {len(airdrops)} widoków AirDrop.")
-        for msg_id, data in list(airdrops.items()):
-             try:
-                 channel = client.get_channel(data["channel_id"])
-                 if channel:
-                     data["message"] = await channel.fetch_message(msg_id)
-                     voice_channel = client.get_channel(data["voice_channel_id"])
-                     if voice_channel:
-                         timestamp = data.get("timestamp")
-                         view = AirdropView(msg_id, data["description"], voice_channel, data["author_name"], timestamp)
-                         view.participants = data.get("participants", []) 
-                         client.add_view(view)
-                     else:
-                         print(f"Ostrzeżenie: Nie znaleziono kanału głosowego dla AirDrop {msg_id}. Pomijam przywracanie widoku.")
-             except discord.NotFound:
-                  print(f"Ostrzeżenie: Wiadomość AirDrop {msg_id} nie została znaleziona. Usuwam z pamięci.")
-                  del airdrops[msg_id]
-             except Exception as e:
-                 print(f"Błąd przy przywracaniu widoku AirDrop {msg_id}: {e}")
-                 
-    await tree.sync()
-    print(f"✅ Zalogowano jako {client.user}")
+    global views_restored, startup_seconds
+    start_scheduler.start()
+    if not flush_store.is_running():
+        flush_store.start()
+    if not watch_guild_config.is_running():
+        watch_guild_config.start()
+
+    if views_restored:
+        print(f"🔁 Ponowne połączenie jako {client.user} - widoki już przywrócone.")
+        return
+    startup_seconds = time.perf_counter() - PROCESS_STARTED
+    print(f"⏱️ Gotowy po {startup_seconds:.2f} s od startu procesu (pamięć członków: {MEMBER_CACHE}, "
+          f"{member_cache.count()} członków, RSS {process_rss_bytes() / 2**20:.1f} MiB).")
+    started_at = time.perf_counter()
+    restored = restore_views()
+    views_restored = True
+    print(f"✅ Przywrócono {restored} widoków w {(time.perf_counter() - started_at) * 1000:.1f} ms.")
+    asyncio.create_task(fetch_missing_details())
+
+    if owns_guild(None):  # komendy globalne synchronizuje tylko proces z shardem 0
+        await sync_command_tree(force=FORCE_COMMAND_SYNC)
+    print(f"✅ Zalogowano jako {client.user} (shardy: {sorted(client.shards)} z {client.shard_count}).")
+
+# --- Unieważnianie linii uczestników ---
+@client.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if before.display_name != after.display_name:
+        member_lines.invalidate(after.guild.id, after.id)
+    if before.roles != after.roles:
+        permissions.invalidate(after.guild.id, after.id)
+
+@client.event
+async def on_user_update(before: discord.User, after: discord.User):
+    if before.display_name != after.display_name:
+        member_lines.invalidate_user(after.id)
+
+@client.event
+async def on_member_remove(member: discord.Member):
+    member_lines.invalidate(member.guild.id, member.id)
+    permissions.invalidate(member.guild.id, member.id)
+
+@client.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    permissions.invalidate_guild(after.guild.id)
+
+@client.event
+async def on_guild_role_delete(role: discord.Role):
+    permissions.invalidate_guild(role.guild.id)
+
+@client.event
+async def on_member_join(member: discord.Member):
+    member_lines.invalidate(member.guild.id, member.id)
+
+@client.event
+async def on_interaction(interaction: discord.Interaction):
+    recorder.record(interaction)
+    member_cache.remember(interaction.user)
+
+@client.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    forget_enrollment(payload.message_id)
 
 # Komenda SQUAD
 @tree.command(name="create-squad", description="Tworzy ogłoszenie o składzie z możliwością edycji.")
+@instrumented("create-squad")
 async def create_squad(interaction: discord.Interaction, rola: discord.Role, tytul: str = "Main Squad"):
-    await interaction.response.defer(ephemeral=True) 
-    guild_member = interaction.guild.get_member(interaction.user.id)
-    if BOT_ADMIN_ROLE_ID not in [r.id for r in guild_member.roles] and interaction.user.id not in STATUS_ADMINS:
+    await defer_once(interaction, ephemeral=True) 
+    if not permissions.has(interaction, "admin"):
         await interaction.followup.send("⛔ Brak uprawnień!", ephemeral=True)
         return
     author_name = interaction.user.display_name
     role_id = rola.id
-    initial_member_ids = []
-    embed = create_squad_embed(interaction.guild, author_name, initial_member_ids, tytul) 
+    embed = create_squad_embed(interaction.guild, author_name, Roster(), tytul) 
     view = SquadView(0, role_id) 
     content = f"{rola.mention}"
     sent = await interaction.channel.send(content=content, embed=embed, view=view)
-    squads[sent.id] = {
-        "role_id": role_id, 
-        "member_ids": initial_member_ids, 
-        "message": sent, 
-        "channel_id": sent.channel.id,
-        "author_name": author_name,
-    }
+    squads[sent.id] = SquadRecord(sent.id, sent.guild.id, sent.channel.id, role_id=role_id, author_name=author_name, title=tytul)
+    store.upsert(squads[sent.id])
     view.message_id = sent.id
     view.custom_id = f"squad_view:{sent.id}"
-    client.add_view(view) 
+    client.add_view(view, message_id=sent.id) 
     await interaction.followup.send(f"✅ Ogłoszenie o składzie '{tytul}' dla roli {rola.mention} wysłane!", ephemeral=True)
 
 # Komenda CAPTURES (Z TIMMEREM)
 @tree.command(name="create-capt", description="Tworzy ogłoszenie o captures z opcjonalnym timerem i zdjęciem.")
+@instrumented("create-capt")
 async def create_capt(interaction: discord.Interaction, czas_zakonczenia: str, data_zakonczenia: str = None, link_do_zdjecia: str = None):
-    await interaction.response.defer(ephemeral=True) 
-    guild_member = interaction.guild.get_member(interaction.user.id)
-    if BOT_ADMIN_ROLE_ID not in [r.id for r in guild_member.roles] and interaction.user.id not in STATUS_ADMINS:
-        pass 
+    await defer_once(interaction, ephemeral=True) 
     try:
         timestamp = create_timestamp(czas_zakonczenia, data_zakonczenia)
     except ValueError as e:
@@ -619,26 +3459,29 @@ async def create_capt(interaction: discord.Interaction, czas_zakonczenia: str, d
     view = CapturesView(0, author_name, link_do_zdjecia, timestamp, started) 
     embed = view.make_embed(interaction.guild)
     sent = await interaction.channel.send(content="@everyone", embed=embed, view=view)
-    captures[sent.id] = {
-        "participants": [], 
-        "message": sent, 
-        "channel_id": sent.channel.id, 
-        "author_name": author_name,
-        "image_url": link_do_zdjecia, 
-        "timestamp": timestamp,
-        "started": started 
-    }
+    record = CaptureRecord(
+        sent.id, sent.guild.id, sent.channel.id,
+        author_name=author_name,
+        image_url=link_do_zdjecia,
+        timestamp=timestamp,
+        started=started,
+    )
+    captures[sent.id] = record
+    store.upsert(record)
+    if not started:
+        start_scheduler.schedule("captures", sent.id, timestamp)
+    lifecycle.track(record)
     view.capture_id = sent.id 
     view.custom_id = f"captures_view:{sent.id}"
-    client.add_view(view) 
+    client.add_view(view, message_id=sent.id) 
     await interaction.followup.send("Ogłoszenie o captures wysłane!", ephemeral=True)
 
 # Komenda AirDrop (Z TIMMEREM)
 @tree.command(name="airdrop", description="Tworzy ogłoszenie o AirDropie z timerem.")
+@instrumented("airdrop")
 async def airdrop_command(interaction: discord.Interaction, channel: discord.TextChannel, voice: discord.VoiceChannel, role: discord.Role, opis: str, czas_zakonczenia: str, data_zakonczenia: str = None):
-    await interaction.response.defer(ephemeral=True) 
-    guild_member = interaction.guild.get_member(interaction.user.id)
-    if BOT_ADMIN_ROLE_ID not in [r.id for r in guild_member.roles] and interaction.user.id not in STATUS_ADMINS:
+    await defer_once(interaction, ephemeral=True) 
+    if not permissions.has(interaction, "admin"):
         await interaction.followup.send("⛔ Brak uprawnień!", ephemeral=True)
         return
     try:
@@ -649,71 +3492,227 @@ async def airdrop_command(interaction: discord.Interaction, channel: discord.Tex
     view = AirdropView(0, opis, voice, interaction.user.display_name, timestamp) 
     embed = view.make_embed(interaction.guild)
     sent = await channel.send(content=f"{role.mention}", embed=embed, view=view)
-    airdrops[sent.id] = {
-        "participants": [], 
-        "message": sent, 
-        "channel_id": sent.channel.id, 
-        "description": opis, 
-        "voice_channel_id": voice.id, 
-        "author_name": interaction.user.display_name,
-        "timestamp": timestamp 
-    }
+    record = AirdropRecord(
+        sent.id, sent.guild.id, sent.channel.id,
+        description=opis,
+        voice_channel_id=voice.id,
+        author_name=interaction.user.display_name,
+        timestamp=timestamp,
+    )
+    airdrops[sent.id] = record
+    store.upsert(record)
+    start_scheduler.schedule("airdrop", sent.id, timestamp)
+    lifecycle.track(record)
     view.message_id = sent.id
     view.custom_id = f"airdrop_view:{sent.id}"
-    client.add_view(view) 
+    client.add_view(view, message_id=sent.id) 
     await interaction.followup.send("✅ AirDrop utworzony!", ephemeral=True)
 
 @tree.command(name="ping-zancudo", description="Wysyła ogłoszenie o ataku na Fort Zancudo.")
+@instrumented("ping-zancudo")
 async def ping_zancudo(interaction: discord.Interaction, role: discord.Role, channel: discord.VoiceChannel):
-    await interaction.response.defer(ephemeral=True) 
-    guild_member = interaction.guild.get_member(interaction.user.id)
-    if BOT_ADMIN_ROLE_ID not in [r.id for r in guild_member.roles] and interaction.user.id not in STATUS_ADMINS:
+    await defer_once(interaction, ephemeral=True) 
+    if not permissions.has(interaction, "admin"):
         await interaction.followup.send("⛔ Brak uprawnień!", ephemeral=True)
         return
     embed = discord.Embed(title="Atak na FORT ZANCUDO!", description=f"Zapraszamy na {channel.mention}!", color=discord.Color(0xFF0000))
-    embed.set_image(url=ZANCUDO_IMAGE_URL)
-    embed.set_thumbnail(url=LOGO_URL) 
+    config = guild_configs.get(interaction.guild_id)
+    embed.set_image(url=config.zancudo_image_url)
+    embed.set_thumbnail(url=config.logo_url)
     sent = await interaction.channel.send(content=f"{role.mention}", embed=embed)
-    events["zancudo"][sent.id] = {"participants": [], "message": sent, "channel_id": sent.channel.id}
+    record = EventRecord("zancudo", sent.id, sent.guild.id, sent.channel.id)
+    events["zancudo"][sent.id] = record
+    store.upsert(record)
+    lifecycle.track(record)
     await interaction.followup.send("✅ Ogłoszenie o ataku wysłane!", ephemeral=True)
 
 @tree.command(name="ping-cayo", description="Wysyła ogłoszenie o ataku na Cayo Perico.")
+@instrumented("ping-cayo")
 async def ping_cayo(interaction: discord.Interaction, role: discord.Role, channel: discord.VoiceChannel):
-    await interaction.response.defer(ephemeral=True) 
-    guild_member = interaction.guild.get_member(interaction.user.id)
-    if BOT_ADMIN_ROLE_ID not in [r.id for r in guild_member.roles] and interaction.user.id not in STATUS_ADMINS:
+    await defer_once(interaction, ephemeral=True) 
+    if not permissions.has(interaction, "admin"):
         await interaction.followup.send("⛔ Brak uprawnień!", ephemeral=True)
         return
     embed = discord.Embed(title="Atak na CAYO PERICO!", description=f"Zapraszamy na {channel.mention}!", color=discord.Color(0xFFAA00))
-    embed.set_image(url=CAYO_IMAGE_URL)
-    embed.set_thumbnail(url=LOGO_URL) 
+    config = guild_configs.get(interaction.guild_id)
+    embed.set_image(url=config.cayo_image_url)
+    embed.set_thumbnail(url=config.logo_url)
     sent = await interaction.channel.send(content=f"{role.mention}", embed=embed)
-    events["cayo"][sent.id] = {"participants": [], "message": sent, "channel_id": sent.channel.id}
+    record = EventRecord("cayo", sent.id, sent.guild.id, sent.channel.id)
+    events["cayo"][sent.id] = record
+    store.upsert(record)
+    lifecycle.track(record)
     await interaction.followup.send("✅ Ogłoszenie o ataku wysłane!", ephemeral=True)
 
 @tree.command(name="list-all", description="Pokazuje listę wszystkich zapisanych")
+@instrumented("list-all")
 async def list_all(interaction: discord.Interaction):
-    await interaction.response.defer(ephemeral=True) 
-    guild_member = interaction.guild.get_member(interaction.user.id)
-    if BOT_ADMIN_ROLE_ID not in [r.id for r in guild_member.roles] and interaction.user.id not in STATUS_ADMINS:
+    await defer_once(interaction, ephemeral=True) 
+    if not permissions.has(interaction, "admin"):
         await interaction.followup.send("⛔ Brak uprawnień do użycia tej komendy!", ephemeral=True)
         return
     desc = ""
-    for name, mid, data in get_all_active_enrollments():
-        desc += f"\n**{name} (msg {mid})**: {len(data['participants'])} osób"
-    for mid, data in squads.items():
-        count = len(data.get('member_ids', []))
-        title = data.get('message').embeds[0].title if data.get('message') and data.get('message').embeds else "Squad"
+    for name, mid, data in get_all_active_enrollments(interaction.guild_id):
+        desc += f"\n**{name} (msg {mid})**: {len(data.participants)} osób"
+    for mid, data in squads.in_guild(interaction.guild_id).items():
+        count = len(data.participants)
+        title = data.title or "Squad"
         desc += f"\n**{title} (msg {mid})**: {count} osób"
     if not desc:
         desc = "Brak aktywnych zapisów i składów."
     embed = discord.Embed(title="📋 Lista wszystkich zapisanych i składów", description=desc, color=discord.Color(0xFFFFFF))
     await interaction.followup.send(embed=embed, ephemeral=True)
 
+@tree.command(name="edit-stats", description="Statystyki łączenia edycji wiadomości (tylko admini)")
+@instrumented("edit-stats")
+async def edit_stats(interaction: discord.Interaction):
+    await defer_once(interaction, ephemeral=True)
+    if not permissions.has(interaction, "owner"):
+        await interaction.followup.send("⛔ Brak uprawnień!", ephemeral=True)
+        return
+    stats = edit_coalescer.stats()
+    desc = "\n".join(f"**{key}**: `{value}`" for key, value in stats.items())
+    embed = discord.Embed(title="✏️ Łączenie edycji wiadomości", description=desc, color=discord.Color(0xFFFFFF))
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+STATS_RANKINGS = {"picks": "Picki", "signups": "Zapisy", "streak": "Aktualna seria picków", "best_streak": "Najdłuższa seria picków", "no_shows": "No-show"}
+HISTORY_ACTIONS = {
+    AttendanceLog.JOIN: "✅ zapis", AttendanceLog.LEAVE: "❌ wypis", AttendanceLog.PICK: "🎯 pick",
+    AttendanceLog.PASS: "⏭️ bez picku", -AttendanceLog.PICK: "🚫 no-show (wypis po picku)",
+}
+
+def format_member_stats(stats: MemberStats) -> str:
+    return (
+        f"Zapisy: **{stats.signups}** • wypisy: **{stats.leaves}**\n"
+        f"Picki: **{stats.picks}** • bez picku: **{stats.passes}** • no-show: **{stats.no_shows}**\n"
+        f"Seria picków: **{stats.streak}** (najdłuższa: **{stats.best_streak}**)"
+    )
+
+@tree.command(name="stats", description="Statystyki obecności: ranking serwera albo historia członka")
+@app_commands.describe(czlonek="Pokaż historię tej osoby (puste = ranking)", ranking="Według czego ułożyć ranking")
+@app_commands.choices(ranking=[app_commands.Choice(name=label, value=field) for field, label in STATS_RANKINGS.items()])
+@instrumented("stats")
+async def attendance_stats(interaction: discord.Interaction, czlonek: discord.Member = None, ranking: app_commands.Choice[str] = None):
+    await defer_once(interaction, ephemeral=True)
+    guild = interaction.guild
+    if czlonek is not None:
+        stats = attendance.member(guild.id, czlonek.id)
+        if stats is None:
+            await interaction.followup.send(f"Brak historii dla **{czlonek.display_name}**.", ephemeral=True)
+            return
+        embed = discord.Embed(title=f"📊 {czlonek.display_name}", description=format_member_stats(stats), color=discord.Color(0xFFFFFF))
+        lines = [
+            f"<t:{ts}:d> <t:{ts}:t> • {HISTORY_ACTIONS.get(action, '?')} • {AttendanceLog.KINDS[kind].capitalize() if kind < len(AttendanceLog.KINDS) else '-'}"
+            for ts, action, kind, _ in reversed(stats.history)
+        ]
+        add_list_fields(embed, "Ostatnie zdarzenia:", pack_lines(lines), "… i jeszcze **{hidden}** starszych zdarzeń.")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        return
+
+    field = ranking.value if ranking else "picks"
+    top = attendance.leaderboard(guild.id, field)
+    lines = [
+        f"{i+1}. {member_lines.get(guild, uid) or f'<@{uid}>'} — **{getattr(stats, field)}**"
+        for i, (uid, stats) in enumerate(top) if getattr(stats, field)
+    ]
+    embed = discord.Embed(
+        title=f"🏆 Ranking: {STATS_RANKINGS[field]}",
+        description="\n".join(lines) or "Brak danych.",
+        color=discord.Color(0xFFFFFF),
+    )
+    embed.set_footer(text=f"Członków z historią: {len(attendance.guilds.get(guild.id, {}))}")
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@tree.command(name="sync-komend", description="Wymusza synchronizację komend z Discordem (tylko admini)")
+@instrumented("sync-komend")
+async def sync_commands(interaction: discord.Interaction):
+    await defer_once(interaction, ephemeral=True)
+    if not permissions.has(interaction, "owner"):
+        await interaction.followup.send("⛔ Brak uprawnień!", ephemeral=True)
+        return
+    await sync_command_tree(force=True)
+    await interaction.followup.send("✅ Komendy zsynchronizowane.", ephemeral=True)
+
+CONFIG_LABELS = {
+    "admin_role_ids": "Role administracyjne",
+    "pick_role_ids": "Role do pickowania",
+    "admin_user_ids": "Administratorzy (użytkownicy)",
+    "zancudo_image_url": "Obrazek Zancudo",
+    "cayo_image_url": "Obrazek Cayo",
+    "logo_url": "Logo",
+    "autopick_weights": "Wagi auto-picku",
+    "autopick_size": "Rozmiar składu auto-picku",
+}
+
+def format_config_value(field: str, value) -> str:
+    if field in GuildConfig.ID_FIELDS:
+        fmt = "<@{}>" if field == "admin_user_ids" else "<@&{}>"
+        return ", ".join(fmt.format(v) for v in sorted(value)) or "brak"
+    if field == "autopick_weights":
+        return f"`{PickPolicy.describe(value)}`"
+    return value
+
+@tree.command(name="konfiguracja", description="Pokazuje lub zmienia konfigurację bota na tym serwerze")
+@app_commands.describe(pole="Ustawienie do zmiany (puste = tylko podgląd)", wartosc="Role/użytkownicy (wzmianki lub ID), link, wagi (zapis=1 obecnosc=2) lub liczba; '-' przywraca domyślne")
+@app_commands.choices(pole=[app_commands.Choice(name=label, value=field) for field, label in CONFIG_LABELS.items()])
+@instrumented("konfiguracja")
+async def configure_guild(interaction: discord.Interaction, pole: app_commands.Choice[str] = None, wartosc: str = None):
+    await defer_once(interaction, ephemeral=True)
+    if not permissions.has(interaction, "config"):
+        await interaction.followup.send("⛔ Brak uprawnień! Wymagane uprawnienie Administratora serwera.", ephemeral=True)
+        return
+    config = guild_configs.get(interaction.guild_id)
+    if pole is not None:
+        field = pole.value
+        if wartosc is None:
+            await interaction.followup.send("⚠️ Podaj wartość (albo `-`, aby przywrócić domyślną).", ephemeral=True)
+            return
+        if wartosc.strip() in ("-", "domyślne"):
+            value = None
+        elif field in GuildConfig.ID_FIELDS:
+            value = [int(v) for v in re.findall(r"\d{15,21}", wartosc)]
+            if not value:
+                await interaction.followup.send("❌ Nie znaleziono żadnego ID ani wzmianki.", ephemeral=True)
+                return
+        elif field == "autopick_weights":
+            try:
+                value = PickPolicy.parse(wartosc)
+            except ValueError as e:
+                await interaction.followup.send(f"❌ {e}", ephemeral=True)
+                return
+        elif field == "autopick_size":
+            if not wartosc.strip().isdigit() or not 1 <= int(wartosc) <= 100:
+                await interaction.followup.send("❌ Podaj liczbę od 1 do 100.", ephemeral=True)
+                return
+            value = int(wartosc)
+        elif re.match(r"https?://\S+$", wartosc.strip()):
+            value = wartosc.strip()
+        else:
+            await interaction.followup.send("❌ Podaj poprawny link (http/https).", ephemeral=True)
+            return
+        config = await guild_configs.update(interaction.guild_id, field, value)
+    desc = "\n".join(
+        f"**{label}**: {format_config_value(field, getattr(config, field))}{'' if field in config.overrides else ' *(domyślne)*'}"
+        for field, label in CONFIG_LABELS.items()
+    )
+    embed = discord.Embed(title="⚙️ Konfiguracja serwera", description=desc, color=discord.Color(0xFFFFFF))
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@tree.command(name="konfiguracja-przeladuj", description="Wczytuje ponownie konfigurację serwerów z bazy (bez restartu)")
+@instrumented("konfiguracja-przeladuj")
+async def reload_guild_config(interaction: discord.Interaction):
+    await defer_once(interaction, ephemeral=True)
+    if not permissions.has(interaction, "config"):
+        await interaction.followup.send("⛔ Brak uprawnień!", ephemeral=True)
+        return
+    await guild_configs.reload()
+    await interaction.followup.send("✅ Konfiguracja serwerów przeładowana.", ephemeral=True)
+
 @tree.command(name="set-status", description="Zmienia status i aktywność bota (tylko admini)")
+@instrumented("set-status")
 async def set_status(interaction: discord.Interaction, status: str, opis_aktywnosci: str = None, typ_aktywnosci: str = None, url_stream: str = None):
-    await interaction.response.defer(ephemeral=True, thinking=True) 
-    if interaction.user.id not in STATUS_ADMINS:
+    await defer_once(interaction, ephemeral=True, thinking=True) 
+    if not permissions.has(interaction, "owner"):
         await interaction.followup.send("⛔ Brak uprawnień!", ephemeral=True)
         return
     status_map = {
@@ -767,206 +3766,376 @@ async def set_status(interaction: discord.Interaction, status: str, opis_aktywno
     await interaction.followup.send(response_msg, ephemeral=True)
 
 # Wypisz z capt
+def find_enrollment(guild_id: int, value: str):
+    """`value` to "typ-id_wiadomości" (z listy wyboru albo autouzupełniania). Zwraca (typ, id, dane) albo None."""
+    type_str, _, msg_id_str = value.partition("-")
+    if type_str not in ENROLLMENT_KINDS or not msg_id_str.isdigit():
+        return None
+    msg_id = int(msg_id_str)
+    record = ENROLLMENT_KINDS[type_str].in_guild(guild_id).get(msg_id)
+    return (type_str, msg_id, record) if record else None
+
+def refresh_enrollment_message(record: EnrollmentRecord, priority: int = RestQueue.ROSTER):
+    """Zleca (łączoną) edycję ogłoszenia po zmianie listy; eventy nie pokazują listy."""
+    message = record.message
+    if record.kind == "airdrop":
+        voice_channel = message.guild.get_channel(record.voice_channel_id) if message.guild else None
+        view_obj = AirdropView(record.message_id, record.description, voice_channel, record.author_name, record.timestamp, record.started)
+        edit_coalescer.schedule(message, lambda: (view_obj.make_embed(message.guild), view_obj), priority)
+    elif record.kind == "captures":
+        view_obj = CapturesView(record.message_id, record.author_name, record.image_url, record.timestamp, record.started)
+        edit_coalescer.schedule(message, lambda: (view_obj.make_embed(message.guild), view_obj), priority)
+
+def member_name(guild: discord.Guild, user_id: int) -> str:
+    member = member_cache.get(guild, user_id)
+    return member.display_name if isinstance(member, discord.Member) else f"<@{user_id}>"
+
+def format_names(guild: discord.Guild, user_ids: list, limit: int = BULK_SUMMARY_NAMES) -> str:
+    names = ", ".join(member_name(guild, uid) for uid in user_ids[:limit])
+    return names + (f" i {len(user_ids) - limit} innych" if len(user_ids) > limit else "")
+
+async def change_enrollment(guild: discord.Guild, action: str, value: str, user_ids) -> str:
+    """Wpisuje ("add") albo wypisuje ("remove") użytkowników jedną mutacją (jedno odświeżenie
+    ogłoszenia) i zwraca komunikat dla admina - dla grupy podsumowanie dodanych i pominiętych."""
+    found = find_enrollment(guild.id, value)
+    if not found:
+        return "❌ Błąd: Nie znaleziono aktywnego zapisu o tym ID."
+    type_str, msg_id, record = found
+    if action == "add":
+        member_cache.prefetch(guild, user_ids)  # nicki dojdą, zanim edycja ogłoszenia wyjdzie z kolejki
+    result = await EnrollmentActor.submit(record, action, user_ids)
+    if result.dropped:
+        return "❌ Błąd: Nie znaleziono aktywnego zapisu o tym ID."
+    adding = action == "add"
+    if len(user_ids) == 1:
+        name = member_name(guild, user_ids[0])
+        if adding:
+            if not result.changed:
+                return f"⚠️ **{name}** jest już zapisany(a) na ten **{type_str.capitalize()}**."
+            return f"✅ Pomyślnie wpisano **{name}** na **{type_str.capitalize()}** (ID: `{msg_id}`)."
+        if not result.changed:
+            return f"⚠️ **{name}** nie jest zapisany(a) na ten **{type_str.capitalize()}**."
+        return f"✅ Pomyślnie wypisano **{name}** z **{type_str.capitalize()}** (ID: `{msg_id}`)."
+    verb, preposition = ("Wpisano", "na") if adding else ("Wypisano", "z")
+    lines = [f"✅ {verb} **{len(result.changed)}** z {len(user_ids)} os. {preposition} **{type_str.capitalize()}** (ID: `{msg_id}`)."]
+    if result.changed:
+        lines.append(f"➕ {format_names(guild, result.changed)}" if adding else f"➖ {format_names(guild, result.changed)}")
+    if result.skipped:
+        reason = "już zapisani" if adding else "nie byli zapisani"
+        lines.append(f"⚠️ Pominięto **{len(result.skipped)}** ({reason}): {format_names(guild, result.skipped)}")
+    return "\n".join(lines)[:2000]
+
+async def enrollment_autocomplete(interaction: discord.Interaction, current: str):
+    """Podpowiedzi zapisów z indeksu (bez potwierdzenia - autouzupełnianie nie wymaga ack)."""
+    started_at = time.perf_counter()
+    if not permissions.has(interaction, "admin"):
+        return []
+    entries = enrollment_index.search(interaction.guild, current)
+    choices = [
+        app_commands.Choice(name=enrollment_index.label(entry, interaction.guild), value=f"{entry.kind}-{entry.msg_id}")
+        for entry in entries
+    ]
+    metrics.autocomplete_latency.observe(time.perf_counter() - started_at, "zapis")
+    return choices
+
 class RemoveEnrollmentView(ui.View):
-    def __init__(self, member_to_remove: discord.Member):
+    def __init__(self, guild: discord.Guild, user_ids: list):
         super().__init__(timeout=180)
-        self.member_to_remove = member_to_remove
-        self.custom_id = f"remove_enrollment_view:{member_to_remove.id}"
-        self.add_item(EnrollmentSelectMenu("remove"))
+        self.user_ids = user_ids
+        self.custom_id = f"remove_enrollment_view:{user_ids[0]}"
+        self.add_item(EnrollmentSelectMenu("remove", guild))
 
     @ui.button(label="Potwierdź usunięcie", style=discord.ButtonStyle.red, custom_id="confirm_remove_button")
+    @instrumented("confirm_remove_button")
     async def confirm_remove(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer() 
+        await defer_once(interaction) 
         
         select_menu = next((item for item in self.children if isinstance(item, ui.Select)), None)
         if not select_menu or not select_menu.values:
             await interaction.followup.send("⚠️ Najpierw wybierz zapis z listy!", ephemeral=True)
             return
 
-        type_str, msg_id_str = select_menu.values[0].split('-')
-        msg_id = int(msg_id_str)
-        user_id = self.member_to_remove.id
-        
-        data_dict = None
-        if type_str == "captures":
-            data_dict = captures.get(msg_id)
-        elif type_str == "airdrop":
-            data_dict = airdrops.get(msg_id)
-        elif type_str in events:
-            data_dict = events[type_str].get(msg_id)
-
-        if not data_dict:
-            await interaction.followup.edit_message(
-                interaction.message.id,
-                content="❌ Błąd: Nie znaleziono aktywnego zapisu o tym ID.",
-                view=None
-            )
-            return
-
-        participants = data_dict.get("participants", [])
-        
-        if user_id not in participants:
-            await interaction.followup.edit_message(
-                interaction.message.id,
-                content=f"⚠️ **{self.member_to_remove.display_name}** nie jest zapisany(a) na ten **{type_str.capitalize()}**.",
-                view=None
-            )
-            return
-
-        participants.remove(user_id)
-        
-        message = data_dict.get("message")
-        if message and hasattr(message, 'edit'):
-            if type_str == "airdrop":
-                voice_channel = message.guild.get_channel(data_dict["voice_channel_id"])
-                description = data_dict["description"]
-                author_name = data_dict["author_name"]
-                timestamp = data_dict.get("timestamp")
-                
-                view_obj = AirdropView(msg_id, description, voice_channel, author_name, timestamp) 
-                view_obj.participants = participants
-                airdrops[msg_id]["participants"] = participants
-                await message.edit(embed=view_obj.make_embed(message.guild), view=view_obj)
-            elif type_str == "captures":
-                 captures[msg_id]["participants"] = participants
-                 author_name = data_dict["author_name"]
-                 image_url = data_dict.get("image_url") 
-                 timestamp = data_dict.get("timestamp")
-                 started = data_dict.get("started", False)
-                 view_obj = CapturesView(msg_id, author_name, image_url, timestamp, started) 
-                 new_embed = view_obj.make_embed(message.guild)
-                 await message.edit(embed=new_embed, view=view_obj)
-            elif type_str in events:
-                 events[type_str][msg_id]["participants"] = participants
-
-        await interaction.followup.edit_message(
-            interaction.message.id,
-            content=f"✅ Pomyślnie wypisano **{self.member_to_remove.display_name}** z **{type_str.capitalize()}** (ID: `{msg_id}`).",
-            view=None
-        )
+        content = await change_enrollment(interaction.guild, "remove", select_menu.values[0], self.user_ids)
+        await interaction.followup.edit_message(interaction.message.id, content=content, view=None)
 
 @tree.command(name="wypisz-z-capt", description="Wypisuje użytkownika z dowolnego aktywnego zapisu (Captures, AirDrop, Event).")
-async def remove_from_enrollment(interaction: discord.Interaction, członek: discord.Member):
-    await interaction.response.defer(ephemeral=True) 
-    guild_member = interaction.guild.get_member(interaction.user.id)
-    if BOT_ADMIN_ROLE_ID not in [r.id for r in guild_member.roles] and interaction.user.id not in STATUS_ADMINS:
+@app_commands.describe(zapis="Szukaj: typ, dzień (dziś/jutro/DD.MM), godzina (21:), kanał lub tytuł; puste = lista")
+@app_commands.autocomplete(zapis=enrollment_autocomplete)
+@instrumented("wypisz-z-capt")
+async def remove_from_enrollment(interaction: discord.Interaction, członek: discord.Member, zapis: str = None):
+    await defer_once(interaction, ephemeral=True) 
+    if not permissions.has(interaction, "admin"):
         await interaction.followup.send("⛔ Brak uprawnień do użycia tej komendy!", ephemeral=True)
         return
-    enrollments = get_all_active_enrollments()
-    if not enrollments:
+    if zapis:
+        await interaction.followup.send(await change_enrollment(interaction.guild, "remove", zapis, [członek.id]), ephemeral=True)
+        return
+    if not enrollment_index.count(interaction.guild_id):
         await interaction.followup.send("⚠️ Brak aktywnych zapisów, z których można wypisać użytkownika.", ephemeral=True)
         return
     await interaction.followup.send(
         f"Wybierz zapis, z którego usunąć **{członek.display_name}**:", 
-        view=RemoveEnrollmentView(członek), 
+        view=RemoveEnrollmentView(interaction.guild, [członek.id]), 
         ephemeral=True
     )
 
 # Wpisz na capt
 class AddEnrollmentView(ui.View):
-    def __init__(self, member_to_add: discord.Member):
+    def __init__(self, guild: discord.Guild, user_ids: list):
         super().__init__(timeout=180)
-        self.member_to_add = member_to_add
-        self.custom_id = f"add_enrollment_view:{member_to_add.id}"
-        self.add_item(EnrollmentSelectMenu("add"))
+        self.user_ids = user_ids
+        self.custom_id = f"add_enrollment_view:{user_ids[0]}"
+        self.add_item(EnrollmentSelectMenu("add", guild))
 
     @ui.button(label="Potwierdź dodanie", style=discord.ButtonStyle.green, custom_id="confirm_add_button")
+    @instrumented("confirm_add_button")
     async def confirm_add(self, interaction: discord.Interaction, button: ui.Button):
-        await interaction.response.defer() 
+        await defer_once(interaction) 
         
         select_menu = next((item for item in self.children if isinstance(item, ui.Select)), None)
         if not select_menu or not select_menu.values:
             await interaction.followup.send("⚠️ Najpierw wybierz zapis z listy!", ephemeral=True)
             return
 
-        type_str, msg_id_str = select_menu.values[0].split('-')
-        msg_id = int(msg_id_str)
-        user_id = self.member_to_add.id
-        
-        data_dict = None
-        if type_str == "captures":
-            data_dict = captures.get(msg_id)
-        elif type_str == "airdrop":
-            data_dict = airdrops.get(msg_id)
-        elif type_str in events:
-            data_dict = events[type_str].get(msg_id)
-
-        if not data_dict:
-            await interaction.followup.edit_message(
-                interaction.message.id,
-                content="❌ Błąd: Nie znaleziono aktywnego zapisu o tym ID.",
-                view=None
-            )
-            return
-
-        participants = data_dict.get("participants", [])
-        
-        if user_id in participants:
-            await interaction.followup.edit_message(
-                interaction.message.id,
-                content=f"⚠️ **{self.member_to_add.display_name}** jest już zapisany(a) na ten **{type_str.capitalize()}**.",
-                view=None
-            )
-            return
-
-        participants.append(user_id)
-        
-        message = data_dict.get("message")
-        if message and hasattr(message, 'edit'):
-             if type_str == "airdrop":
-                voice_channel = message.guild.get_channel(data_dict["voice_channel_id"])
-                description = data_dict["description"]
-                author_name = data_dict["author_name"]
-                timestamp = data_dict.get("timestamp")
-
-                view_obj = AirdropView(msg_id, description, voice_channel, author_name, timestamp) 
-                view_obj.participants = participants
-                airdrops[msg_id]["participants"] = participants
-                await message.edit(embed=view_obj.make_embed(message.guild), view=view_obj)
-             elif type_str == "captures":
-                 captures[msg_id]["participants"] = participants
-                 author_name = data_dict["author_name"]
-                 image_url = data_dict.get("image_url") 
-                 timestamp = data_dict.get("timestamp")
-                 started = data_dict.get("started", False)
-                 view_obj = CapturesView(msg_id, author_name, image_url, timestamp, started) 
-                 new_embed = view_obj.make_embed(message.guild)
-                 await message.edit(embed=new_embed, view=view_obj)
-             elif type_str in events:
-                 events[type_str][msg_id]["participants"] = participants
-
-        await interaction.followup.edit_message(
-            interaction.message.id,
-            content=f"✅ Pomyślnie wpisano **{self.member_to_add.display_name}** na **{type_str.capitalize()}** (ID: `{msg_id}`).",
-            view=None
-        )
+        content = await change_enrollment(interaction.guild, "add", select_menu.values[0], self.user_ids)
+        await interaction.followup.edit_message(interaction.message.id, content=content, view=None)
 
 @tree.command(name="wpisz-na-capt", description="Wpisuje użytkownika na dowolny aktywny zapis (Captures, AirDrop, Event).")
-async def add_to_enrollment(interaction: discord.Interaction, członek: discord.Member):
-    await interaction.response.defer(ephemeral=True) 
-    guild_member = interaction.guild.get_member(interaction.user.id)
-    if BOT_ADMIN_ROLE_ID not in [r.id for r in guild_member.roles] and interaction.user.id not in STATUS_ADMINS:
+@app_commands.describe(zapis="Szukaj: typ, dzień (dziś/jutro/DD.MM), godzina (21:), kanał lub tytuł; puste = lista")
+@app_commands.autocomplete(zapis=enrollment_autocomplete)
+@instrumented("wpisz-na-capt")
+async def add_to_enrollment(interaction: discord.Interaction, członek: discord.Member, zapis: str = None):
+    await defer_once(interaction, ephemeral=True) 
+    if not permissions.has(interaction, "admin"):
         await interaction.followup.send("⛔ Brak uprawnień do użycia tej komendy!", ephemeral=True)
         return
-    enrollments = get_all_active_enrollments()
-    if not enrollments:
+    member_cache.remember(członek)
+    if zapis:
+        await interaction.followup.send(await change_enrollment(interaction.guild, "add", zapis, [członek.id]), ephemeral=True)
+        return
+    if not enrollment_index.count(interaction.guild_id):
         await interaction.followup.send("⚠️ Brak aktywnych zapisów, na które można wpisać użytkownika.", ephemeral=True)
         return
     await interaction.followup.send(
         f"Wybierz zapis, na który wpisać **{członek.display_name}**:", 
-        view=AddEnrollmentView(członek), 
+        view=AddEnrollmentView(interaction.guild, [członek.id]), 
         ephemeral=True
     )
 
+# Grupowe wpisywanie / wypisywanie (rola, skład albo lista użytkowników)
+USER_MENTION_RE = re.compile(r"<@!?(\d+)>|\b(\d{15,20})\b")
+
+async def squad_autocomplete(interaction: discord.Interaction, current: str):
+    if not permissions.has(interaction, "admin"):
+        return []
+    needle = fold(current.strip())
+    choices = []
+    for msg_id, record in squads.in_guild(interaction.guild_id).items():
+        label = f"{record.title or 'Main Squad'} ({len(record.participants)} os.)"
+        if needle and needle not in fold(label) and needle not in str(msg_id):
+            continue
+        choices.append(app_commands.Choice(name=label[:100], value=str(msg_id)))
+        if len(choices) == 25:
+            break
+    return choices
+
+def collect_user_ids(guild: discord.Guild, rola: discord.Role = None, sklad: str = None, uzytkownicy: str = None):
+    """Id użytkowników z roli (bez botów), listy składu i wzmianek/id w tekście - bez powtórzeń,
+    w tej kolejności. Zwraca (lista id, komunikat błędu albo None)."""
+    user_ids = {}
+    if rola is not None:
+        user_ids.update(dict.fromkeys(m.id for m in member_cache.role_members(rola) if not getattr(m, "bot", False)))
+    if sklad:
+        record = squads.in_guild(guild.id).get(int(sklad)) if sklad.isdigit() else None
+        if record is None:
+            return [], "❌ Błąd: Nie znaleziono składu o tym ID."
+        user_ids.update(dict.fromkeys(record.participants))
+    if uzytkownicy:
+        user_ids.update(dict.fromkeys(int(mention or raw) for mention, raw in USER_MENTION_RE.findall(uzytkownicy)))
+    if rola is None and not sklad and not uzytkownicy:
+        return [], "⚠️ Podaj rolę, skład albo użytkowników (wzmianki lub id)."
+    if not user_ids:
+        return [], "⚠️ Nie znaleziono żadnych użytkowników do zmiany."
+    return list(user_ids), None
+
+async def change_enrollment_group(interaction: discord.Interaction, action: str, zapis: str, rola: discord.Role, sklad: str, uzytkownicy: str):
+    await defer_once(interaction, ephemeral=True)
+    if not permissions.has(interaction, "admin"):
+        await interaction.followup.send("⛔ Brak uprawnień do użycia tej komendy!", ephemeral=True)
+        return
+    user_ids, error = collect_user_ids(interaction.guild, rola, sklad, uzytkownicy)
+    # Bez intencji members bot nie zna całego serwera - rola to tylko członkowie z jego pamięci.
+    note = "\n-# Tryb MEMBER_CACHE=lazy: rola obejmuje tylko członków znanych botu (zapisani, składy, admini)." if rola is not None and member_cache.lazy else ""
+    if error:
+        await interaction.followup.send(error + note, ephemeral=True)
+        return
+    if zapis:
+        await interaction.followup.send((await change_enrollment(interaction.guild, action, zapis, user_ids))[:2000 - len(note)] + note, ephemeral=True)
+        return
+    if not enrollment_index.count(interaction.guild_id):
+        await interaction.followup.send("⚠️ Brak aktywnych zapisów.", ephemeral=True)
+        return
+    if action == "add":
+        prompt, view = f"Wybierz zapis, na który wpisać **{len(user_ids)}** os.:", AddEnrollmentView(interaction.guild, user_ids)
+    else:
+        prompt, view = f"Wybierz zapis, z którego wypisać **{len(user_ids)}** os.:", RemoveEnrollmentView(interaction.guild, user_ids)
+    await interaction.followup.send(prompt + note, view=view, ephemeral=True)
+
+GROUP_DESCRIBE = {
+    "zapis": "Szukaj: typ, dzień (dziś/jutro/DD.MM), godzina (21:), kanał lub tytuł; puste = lista",
+    "rola": "Wszyscy członkowie roli",
+    "sklad": "Członkowie składu (z /create-squad)",
+    "uzytkownicy": "Wzmianki lub id użytkowników, np. @gracz1 @gracz2",
+}
+
+@tree.command(name="wpisz-grupe-na-capt", description="Wpisuje wielu użytkowników naraz (rola, skład, lista) na aktywny zapis.")
+@app_commands.describe(**GROUP_DESCRIBE)
+@app_commands.autocomplete(zapis=enrollment_autocomplete, sklad=squad_autocomplete)
+@instrumented("wpisz-grupe-na-capt")
+async def add_group_to_enrollment(interaction: discord.Interaction, zapis: str = None, rola: discord.Role = None, sklad: str = None, uzytkownicy: str = None):
+    await change_enrollment_group(interaction, "add", zapis, rola, sklad, uzytkownicy)
+
+@tree.command(name="wypisz-grupe-z-capt", description="Wypisuje wielu użytkowników naraz (rola, skład, lista) z aktywnego zapisu.")
+@app_commands.describe(**GROUP_DESCRIBE)
+@app_commands.autocomplete(zapis=enrollment_autocomplete, sklad=squad_autocomplete)
+@instrumented("wypisz-grupe-z-capt")
+async def remove_group_from_enrollment(interaction: discord.Interaction, zapis: str = None, rola: discord.Role = None, sklad: str = None, uzytkownicy: str = None):
+    await change_enrollment_group(interaction, "remove", zapis, rola, sklad, uzytkownicy)
+
+# =====================
+#       SERWER HTTP (health/readiness dla Render)
+# =====================
+async def home(request: web.Request):
+    return web.Response(text="Bot działa!")
+
+async def readiness(request: web.Request):
+    checks = {
+        "gateway": client.is_ready() and not client.is_closed(),
+        "views_restored": views_restored,
+    }
+    status = 200 if all(checks.values()) else 503
+    return web.json_response(checks, status=status)
+
+async def metrics_endpoint(request: web.Request):
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+@metrics.gauge("bot_gateway_latency_seconds", "Opóźnienie heartbeatu bramki (client.latency).")
+def _gateway_latency():
+    latency = client.latency
+    return latency if math.isfinite(latency) else -1
+
+@metrics.gauge("bot_enrollments", "Aktywne zapisy w pamięci.", ("kind",))
+def _enrollment_counts():
+    counts = {("captures",): len(captures), ("airdrop",): len(airdrops), ("squad",): len(squads)}
+    for etype, msgs in events.items():
+        counts[(etype,)] = len(msgs)
+    return counts
+
+@metrics.gauge("bot_participants", "Zapisani uczestnicy we wszystkich aktywnych zapisach.", ("kind",))
+def _participant_counts():
+    counts = {
+        ("captures",): sum(len(data.participants) for data in captures.values()),
+        ("airdrop",): sum(len(data.participants) for data in airdrops.values()),
+        ("squad",): sum(len(data.participants) for data in squads.values()),
+    }
+    for etype, msgs in events.items():
+        counts[(etype,)] = sum(len(data.participants) for data in msgs.values())
+    return counts
+
+@metrics.gauge("bot_message_edits_total", "Edycje wiadomości z kolejki łączenia edycji.", ("result",), "counter")
+def _edit_counts():
+    return {("sent",): edit_coalescer.edits, ("skipped",): edit_coalescer.skipped, ("failed",): edit_coalescer.failures}
+
+@metrics.gauge("bot_message_edit_requests_total", "Zgłoszone zmiany embedów (przed łączeniem).", metric_type="counter")
+def _edit_requests():
+    return edit_coalescer.requests
+
+@metrics.gauge("bot_rest_queued", "Zapytania REST czekające w kolejce.", ("priority",))
+def _rest_queued():
+    return {(name,): count for name, count in rest_queue.queued().items()}
+
+@metrics.gauge("bot_scheduler_pending", "Terminy startu czekające w planiście.")
+def _scheduler_pending():
+    return start_scheduler.pending()
+
+@metrics.gauge("bot_enrollment_states", "Żywe zapisy wg etapu cyklu życia.", ("state",))
+def _enrollment_states():
+    return {(state,): count for state, count in lifecycle.counts().items()}
+
+@metrics.gauge("bot_enrollments_archived_total", "Zapisy przeniesione do archiwum od startu procesu.", metric_type="counter")
+def _enrollments_archived():
+    return lifecycle.archived
+
+@metrics.gauge("bot_store_pending_writes", "Mutacje czekające na zapis do bazy.")
+def _store_pending():
+    return len(store._pending)
+
+@metrics.gauge("bot_store_dead_letters", "Mutacje pominięte po STORE_MAX_RETRIES nieudanych zapisach.")
+def _store_dead_letters():
+    return len(store.dead_letters)
+
+@metrics.gauge("bot_startup_seconds", "Czas od startu procesu do pierwszego on_ready (-1 przed gotowością).", ("member_cache",))
+def _startup_seconds():
+    return {(MEMBER_CACHE,): -1 if startup_seconds is None else round(startup_seconds, 3)}
+
+@metrics.gauge("bot_process_rss_bytes", "Pamięć rezydentna procesu (RSS).", ("member_cache",))
+def _process_rss():
+    return {(MEMBER_CACHE,): process_rss_bytes()}
+
+@metrics.gauge("bot_member_cache", "Członkowie w pamięci (full: discord.py, lazy: tylko potrzebni botu).", ("member_cache",))
+def _member_cache_size():
+    return {(MEMBER_CACHE,): member_cache.count()}
+
+@metrics.gauge("bot_member_cache_lookups_total", "Wyszukania w leniwej pamięci członków.", ("result",), "counter")
+def _member_cache_lookups():
+    return {("hit",): member_cache.hits, ("miss",): member_cache.misses}
+
+@metrics.gauge("bot_member_queries_total", "Zapytania query_members (queries/failed) i ich wynik w członkach (found/not_found).", ("result",), "counter")
+def _member_queries():
+    return {
+        ("queries",): member_cache.queries, ("failed",): member_cache.failures,
+        ("found",): member_cache.found, ("not_found",): member_cache.not_found,
+    }
+
+web_app = web.Application()
+web_app.router.add_get("/", home)
+web_app.router.add_get("/ready", readiness)
+web_app.router.add_get("/metrics", metrics_endpoint)
+
 # --- Start bota ---
-def run_discord_bot():
+async def run_bot():
+    discord.utils.setup_logging(root=False)
+    store.open()
+    await guild_configs.reload()
+    attendance.open()
+    recorder.open()
+    load_enrollments_from_store()
+    schedule_pending_starts()
+
+    port = int(os.environ.get("PORT", 10000))
+    runner = web.AppRunner(web_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    print(f"✅ Serwer HTTP nasłuchuje na porcie {port}.")
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.create_task(client.close()))
+        except NotImplementedError:
+            pass  # Windows - zostaje KeyboardInterrupt
+
     try:
-        client.run(token)
+        async with client:
+            await client.start(token)
     except Exception as e:
         print(f"Błąd uruchomienia bota: {e}")
-
-threading.Thread(target=run_discord_bot).start()
+    finally:
+        print("⏹️ Zamykanie bota...")
+        await runner.cleanup()
+        recorder.close()
+        attendance.close()
+        store.close()
 
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port, debug=False)
+    asyncio.run(run_bot())
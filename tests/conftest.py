@@ -0,0 +1,11 @@
+"""Testy jednostkowe czystej logiki z main.py (bez sieci i bez bramki Discorda).
+
+Uruchomienie z katalogu repozytorium:
+
+    python -m pytest
+"""
+import os
+import sys
+
+os.environ.setdefault("DISCORD_BOT_TOKEN", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,90 @@
+import asyncio
+
+import main
+from main import AttendanceLog
+
+GUILD, CAPTURE = 1, 100
+
+
+def stats(log: AttendanceLog) -> dict:
+    return {uid: s.dump() for uid, s in log.guilds.get(GUILD, {}).items()}
+
+
+def record_evening(log: AttendanceLog):
+    for uid in (10, 11, 12):
+        log.record(AttendanceLog.JOIN, "captures", GUILD, CAPTURE, uid, ts=1000 + uid)
+    log.record_pick(GUILD, CAPTURE, [10, 11], [10, 11, 12])
+    log.record(AttendanceLog.LEAVE, "captures", GUILD, CAPTURE, 11, ts=2000)  # no-show
+
+
+def reopen(tmp_path) -> AttendanceLog:
+    log = AttendanceLog(str(tmp_path / "obecnosc.log"))
+    log.open()
+    return log
+
+
+def test_aggregates_survive_append_and_reopen(tmp_path):
+    log = reopen(tmp_path)
+    record_evening(log)
+    expected = stats(log)
+    asyncio.run(log.flush())
+    log.close()
+
+    restored = reopen(tmp_path)
+    assert stats(restored) == expected
+    assert restored.member(GUILD, 11).no_shows == 1
+    assert restored.member(GUILD, 10).streak == 1
+    assert restored.member(GUILD, 12).passes == 1
+    assert restored.decided == {CAPTURE: {10: AttendanceLog.PICK, 11: AttendanceLog.PICK, 12: AttendanceLog.PASS}}
+    restored.close()
+
+
+def test_compaction_moves_events_into_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "ATTENDANCE_COMPACT_BYTES", AttendanceLog.HEADER.size + AttendanceLog.RECORD.size * 4)
+    log = reopen(tmp_path)
+    record_evening(log)
+    expected = stats(log)
+    asyncio.run(log.flush())
+    assert log.generation == 1
+    assert log.log_bytes == AttendanceLog.HEADER.size
+
+    log.record(AttendanceLog.JOIN, "captures", GUILD, CAPTURE + 1, 13, ts=3000)
+    expected = stats(log)
+    log.close()
+
+    restored = reopen(tmp_path)
+    assert restored.generation == 1
+    assert stats(restored) == expected
+    restored.close()
+
+
+def test_log_from_an_older_generation_is_ignored(tmp_path, monkeypatch):
+    log = reopen(tmp_path)
+    record_evening(log)
+    log.close()
+    old_log = (tmp_path / "obecnosc.log").read_bytes()
+
+    monkeypatch.setattr(main, "ATTENDANCE_COMPACT_BYTES", 0)
+    log = reopen(tmp_path)
+    expected = stats(log)
+    asyncio.run(log.flush())  # pusty bufor, ale próg 0 - migawka generacji 1
+    log.close()
+
+    # Awaria w trakcie kompaktowania: migawka już nowa, dziennik jeszcze stary.
+    (tmp_path / "obecnosc.log").write_bytes(old_log)
+    restored = reopen(tmp_path)
+    assert stats(restored) == expected
+    restored.close()
+
+
+def test_torn_last_record_is_dropped(tmp_path):
+    log = reopen(tmp_path)
+    record_evening(log)
+    log.close()
+    path = tmp_path / "obecnosc.log"
+    path.write_bytes(path.read_bytes() + b"\x01\x02\x03")
+
+    restored = reopen(tmp_path)
+    assert restored.member(GUILD, 11).no_shows == 1
+    assert restored.log_bytes == path.stat().st_size
+    restored.close()
@@ -0,0 +1,121 @@
+import asyncio
+
+import discord
+
+from main import EditSuperseded, EmbedEditCoalescer
+
+WINDOW = 0.01
+
+
+class FakeMessage:
+    def __init__(self, message_id: int = 1, error: Exception = None):
+        self.id = message_id
+        self.error = error
+        self.edits = []
+
+    async def edit(self, embed, view):
+        if self.error:
+            raise self.error
+        self.edits.append(embed.title)
+
+
+def render(title: str, view=None):
+    return lambda: (discord.Embed(title=title), view)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle(coalescer: EmbedEditCoalescer):
+    while coalescer._tasks:
+        await asyncio.sleep(WINDOW)
+
+
+def test_requests_in_one_window_become_one_edit_with_the_latest_state():
+    async def scenario():
+        coalescer, message, results = EmbedEditCoalescer(WINDOW), FakeMessage(), []
+        for title in ("a", "b", "c"):
+            coalescer.schedule(message, render(title), on_done=results.append)
+        await settle(coalescer)
+        return message.edits, results, coalescer.requests, coalescer.edits
+
+    edits, results, requests, sent = run(scenario())
+    assert edits == ["c"]
+    assert results == ["sent", "sent", "sent"]
+    assert (requests, sent) == (3, 1)
+
+
+def test_unchanged_embed_and_view_are_skipped_but_a_view_change_is_sent():
+    async def scenario():
+        coalescer, message, results = EmbedEditCoalescer(WINDOW), FakeMessage(), []
+        view = discord.ui.View()
+        button = discord.ui.Button(label="Zapisz")
+        view.add_item(button)
+        coalescer.schedule(message, render("a", view), on_done=results.append)
+        await settle(coalescer)
+        coalescer.schedule(message, render("a", view), on_done=results.append)
+        await settle(coalescer)
+        button.disabled = True
+        coalescer.schedule(message, render("a", view), on_done=results.append)
+        await settle(coalescer)
+        return message.edits, results
+
+    edits, results = run(scenario())
+    assert edits == ["a", "a"]
+    assert results == ["sent", "unchanged", "sent"]
+
+
+def test_superseded_edit_settles_its_callbacks():
+    async def scenario():
+        coalescer, results = EmbedEditCoalescer(WINDOW), []
+        coalescer.schedule(FakeMessage(error=EditSuperseded("x")), render("a"), on_done=results.append)
+        await settle(coalescer)
+        return results, coalescer.skipped
+
+    assert run(scenario()) == (["superseded"], 1)
+
+
+def test_forget_during_the_window_drops_the_edit_without_killing_the_task():
+    async def scenario():
+        coalescer, message, results = EmbedEditCoalescer(WINDOW), FakeMessage(), []
+        coalescer.schedule(message, render("a"), on_done=results.append)
+        await asyncio.sleep(WINDOW / 2)
+        coalescer.forget(message.id)
+        task = coalescer._tasks[message.id]
+        await task  # KeyError tutaj zabiłby zadanie
+        coalescer.schedule(message, render("b"), on_done=results.append)
+        await settle(coalescer)
+        return message.edits, results
+
+    edits, results = run(scenario())
+    assert edits == ["b"]
+    assert results == ["failed", "sent"]
+
+
+def test_render_error_fails_only_that_edit():
+    async def scenario():
+        coalescer, message, results = EmbedEditCoalescer(WINDOW), FakeMessage(), []
+
+        def broken():
+            raise AttributeError("mention")
+
+        coalescer.schedule(message, broken, on_done=results.append)
+        await settle(coalescer)
+        coalescer.schedule(message, render("a"), on_done=results.append)
+        await settle(coalescer)
+        return message.edits, results, coalescer.failures
+
+    assert run(scenario()) == (["a"], ["failed", "sent"], 1)
+
+
+def test_missing_message_calls_on_missing():
+    async def scenario():
+        coalescer, missing, results = EmbedEditCoalescer(WINDOW), [], []
+        coalescer.on_missing = missing.append
+        response = type("Response", (), {"status": 404, "reason": "Not Found"})()
+        coalescer.schedule(FakeMessage(5, discord.NotFound(response, "Unknown Message")), render("a"), on_done=results.append)
+        await settle(coalescer)
+        return missing, results
+
+    assert run(scenario()) == ([5], ["failed"])
@@ -0,0 +1,61 @@
+from main import Roster
+
+
+def test_add_keeps_signup_order_and_ignores_duplicates():
+    roster = Roster([3, 1, 2])
+    assert roster.add(1) is False
+    assert roster.add(4) is True
+    assert list(roster) == [3, 1, 2, 4]
+    assert len(roster) == 4
+    assert 4 in roster and 5 not in roster
+
+
+def test_discard_removes_only_present_ids():
+    roster = Roster([1, 2, 3])
+    assert roster.discard(2) is True
+    assert roster.discard(2) is False
+    assert list(roster) == [1, 3]
+    assert 2 not in roster
+
+
+def test_readding_after_discard_moves_to_the_end():
+    roster = Roster([1, 2, 3])
+    roster.discard(1)
+    roster.add(1)
+    assert list(roster) == [2, 3, 1]
+
+
+def test_version_changes_only_on_real_changes():
+    roster = Roster()
+    assert roster.version == 0
+    roster.add(1)
+    roster.add(1)
+    assert roster.version == 1
+    roster.discard(2)
+    assert roster.version == 1
+    roster.discard(1)
+    assert roster.version == 2
+    roster.replace([1])
+    assert roster.version > 2
+
+
+def test_replace_resets_contents_and_order():
+    roster = Roster([1, 2, 3])
+    roster.discard(2)
+    roster.replace([5, 4, 5])
+    assert list(roster) == [5, 4]
+    assert 1 not in roster and len(roster) == 2
+    assert roster.add(1) is True
+    assert list(roster) == [5, 4, 1]
+
+
+def test_compaction_keeps_order_and_membership():
+    roster = Roster(range(1, 101))
+    for uid in range(1, 61):
+        roster.discard(uid)
+    assert roster._holes < 60  # zwinięte, gdy dziury przekroczyły połowę tablicy
+    assert list(roster) == list(range(61, 101))
+    assert all(uid in roster for uid in range(61, 101))
+    roster.discard(61)
+    roster.add(1)
+    assert list(roster)[0] == 62 and list(roster)[-1] == 1
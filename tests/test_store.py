@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import main
+from main import EnrollmentStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EnrollmentStore(str(tmp_path / "zapisy.db"))
+    store.open()
+    yield store
+    store.close()
+
+
+def participants(store: EnrollmentStore, message_id: int) -> list:
+    rows = store._conn.execute("SELECT user_id FROM participants WHERE message_id = ? ORDER BY position", (message_id,))
+    return [row[0] for row in rows]
+
+
+def test_flush_writes_queued_mutations_in_order(store):
+    for uid in (3, 1, 2):
+        store.add_participant(7, uid)
+    store.remove_participant(7, 1)
+    assert asyncio.run(store.flush()) == 4
+    assert participants(store, 7) == [3, 2]
+    assert store._pending == []
+
+
+def test_failed_batch_goes_back_before_newer_mutations(store, monkeypatch):
+    store.add_participant(7, 1)
+    apply = store._apply
+
+    def failing(batch):
+        store.add_participant(7, 2)  # mutacja zgłoszona w trakcie zapisu
+        raise RuntimeError("dysk")
+
+    monkeypatch.setattr(store, "_apply", failing)
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.flush())
+    assert [op[2] for op in store._pending] == [1, 2]
+
+    monkeypatch.setattr(store, "_apply", apply)
+    asyncio.run(store.flush())
+    assert participants(store, 7) == [1, 2]
+
+
+def test_poison_op_is_set_aside_after_max_retries(store):
+    store.add_participant(7, 1)
+    store._pending.append(("add", 7, 2))  # brakuje pozycji - SQLite odrzuci
+    store.add_participant(7, 3)
+    for _ in range(main.STORE_MAX_RETRIES):
+        with pytest.raises(Exception):
+            asyncio.run(store.flush())
+        assert len(store._pending) == 3
+    assert asyncio.run(store.flush()) == 2
+    assert store.dead_letters == [("add", 7, 2)]
+    assert participants(store, 7) == [1, 3]
+
+    store.add_participant(7, 4)  # kolejne zapisy znowu idą paczką
+    assert asyncio.run(store.flush()) == 1
+    assert participants(store, 7) == [1, 3, 4]
+
+
+def test_enrollments_round_trip_through_load_all(store):
+    record = main.CaptureRecord(7, 1, 2, (5, 6), author_name="Admin", image_url="", timestamp=123)
+    store.upsert(record)
+    store.set_participants(7, [6, 5])
+    store.flush_sync()
+    [(kind, message_id, guild_id, channel_id, data, user_ids)] = store.load_all()
+    assert (kind, message_id, guild_id, channel_id) == ("captures", 7, 1, 2)
+    assert data["author_name"] == "Admin" and data["timestamp"] == 123
+    assert user_ids == [6, 5]
+
+    store.archive(record)
+    store.flush_sync()
+    assert store.load_all() == []
+    assert store._conn.execute("SELECT COUNT(*) FROM archive").fetchone()[0] == 1